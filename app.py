@@ -1,40 +1,94 @@
-from flask import Flask, render_template, flash, redirect, url_for, request, jsonify
-from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from flask import Flask, render_template, flash, redirect, url_for, request, jsonify, session, current_app
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user, user_logged_out
 from werkzeug.security import generate_password_hash
 from datetime import datetime
-import markdown
 import os
+import time
 from dotenv import load_dotenv
 
-from firebase_config import db, auth_instance, storage_instance
+from firebase_config import get_auth
 from models import User, Post, Category
 from forms import LoginForm, RegistrationForm, PostForm, CategoryForm
 from routes.admin import admin_bp
 from routes.blog import blog_bp
 from routes.auth import auth_bp
+import instrumentation
 
 # Load environment variables
 load_dotenv()
 
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key')
-
 # Initialize Flask-Login
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'auth.login'
 
-# Register blueprints
-app.register_blueprint(admin_bp)
-app.register_blueprint(blog_bp)
-app.register_blueprint(auth_bp)
+def create_app(config=None):
+    """Build the application.
+
+    Firebase clients are not created here; each worker builds its own on
+    the first request that needs one.
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key')
+    # Sign username/is_admin into the session so most requests skip the user read.
+    # Role changes reach other sessions once their claims are older than MAX_AGE.
+    app.config['USER_SESSION_CLAIMS'] = os.getenv('USER_SESSION_CLAIMS', 'false').lower() == 'true'
+    app.config['USER_SESSION_CLAIMS_MAX_AGE'] = int(os.getenv('USER_SESSION_CLAIMS_MAX_AGE', 300))
+    if config:
+        app.config.update(config)
+
+    instrumentation.init_app(app)
+    login_manager.init_app(app)
+    user_logged_out.connect(clear_user_claims, app)
+
+    # Register blueprints
+    app.register_blueprint(admin_bp)
+    app.register_blueprint(blog_bp)
+    app.register_blueprint(auth_bp)
+
+    # Routes from before the blueprints; the blueprints take precedence
+    app.add_url_rule('/login', 'login', login, methods=['GET', 'POST'])
+    app.add_url_rule('/register', 'register', register, methods=['GET', 'POST'])
+    app.add_url_rule('/logout', 'logout', logout)
+    app.add_url_rule('/', 'index', index)
+    app.add_url_rule('/post/<post_id>', 'view_post', view_post)
+    app.add_url_rule('/post/new', 'new_post', new_post, methods=['GET', 'POST'])
+    app.add_url_rule('/post/<post_id>/edit', 'edit_post', edit_post, methods=['GET', 'POST'])
+    app.add_url_rule('/post/<post_id>/delete', 'delete_post', delete_post, methods=['POST'])
+    app.add_url_rule('/categories', 'list_categories', list_categories)
+    app.add_url_rule('/category/new', 'new_category', new_category, methods=['GET', 'POST'])
+    app.add_url_rule('/category/<category_id>/delete', 'delete_category', delete_category, methods=['POST'])
+
+    app.register_error_handler(404, not_found_error)
+    app.register_error_handler(500, internal_error)
+    return app
+
+SESSION_CLAIMS_KEY = '_user_claims'
+
+def user_from_session(user_id):
+    """Rebuild the user from signed session claims if they are fresh enough."""
+    claims = session.get(SESSION_CLAIMS_KEY)
+    if not claims or claims.get('id') != user_id:
+        return None
+    if time.time() - claims.get('issued_at', 0) > current_app.config['USER_SESSION_CLAIMS_MAX_AGE']:
+        return None
+    return User.from_claims(claims)
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.get(user_id)
+    if current_app.config['USER_SESSION_CLAIMS']:
+        user = user_from_session(user_id)
+        if user:
+            return user
+    
+    user = User.get(user_id)
+    if user and current_app.config['USER_SESSION_CLAIMS']:
+        session[SESSION_CLAIMS_KEY] = dict(user.to_claims(), issued_at=time.time())
+    return user
+
+def clear_user_claims(sender, user=None):
+    session.pop(SESSION_CLAIMS_KEY, None)
 
 # Authentication routes
-@app.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -43,8 +97,8 @@ def login():
     if form.validate_on_submit():
         try:
             # Authenticate with Firebase
-            user = auth_instance.sign_in_with_email_and_password(form.email.data, form.password.data)
-            user_obj = User.get(user['localId'])
+            user = get_auth().sign_in_with_email_and_password(form.email.data, form.password.data)
+            user_obj = User.get(user['localId'], use_cache=False)
             if user_obj:
                 login_user(user_obj)
                 flash('Logged in successfully.', 'success')
@@ -55,7 +109,6 @@ def login():
     
     return render_template('login.html', form=form)
 
-@app.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -79,7 +132,6 @@ def register():
     
     return render_template('register.html', form=form)
 
-@app.route('/logout')
 @login_required
 def logout():
     logout_user()
@@ -87,28 +139,24 @@ def logout():
     return redirect(url_for('index'))
 
 # Blog routes
-@app.route('/')
 def index():
     page = request.args.get('page', 1, type=int)
     posts = Post.get_all(limit=10, offset=(page-1)*10)
     return render_template('index.html', posts=posts, page=page)
 
-@app.route('/post/<post_id>')
 def view_post(post_id):
     post = Post.get(post_id)
     if post is None:
         flash('Post not found.', 'error')
         return redirect(url_for('index'))
     
-    # Convert markdown to HTML
-    post.content = markdown.markdown(post.content)
+    # Serve the HTML rendered when the post was saved
+    post.content = post.html
     return render_template('post.html', post=post)
 
-@app.route('/post/new', methods=['GET', 'POST'])
 @login_required
 def new_post():
     form = PostForm()
-    form.categories.choices = [(c.id, c.name) for c in Category.get_all()]
     
     if form.validate_on_submit():
         try:
@@ -129,7 +177,6 @@ def new_post():
     
     return render_template('post_form.html', form=form, title='New Post')
 
-@app.route('/post/<post_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_post(post_id):
     post = Post.get(post_id)
@@ -142,7 +189,6 @@ def edit_post(post_id):
         return redirect(url_for('index'))
     
     form = PostForm(obj=post)
-    form.categories.choices = [(c.id, c.name) for c in Category.get_all()]
     
     if form.validate_on_submit():
         try:
@@ -161,7 +207,6 @@ def edit_post(post_id):
     
     return render_template('post_form.html', form=form, title='Edit Post')
 
-@app.route('/post/<post_id>/delete', methods=['POST'])
 @login_required
 def delete_post(post_id):
     post = Post.get(post_id)
@@ -181,7 +226,6 @@ def delete_post(post_id):
     return redirect(url_for('index'))
 
 # Category routes
-@app.route('/categories')
 @login_required
 def list_categories():
     if not current_user.is_admin:
@@ -191,7 +235,6 @@ def list_categories():
     categories = Category.get_all()
     return render_template('categories.html', categories=categories)
 
-@app.route('/category/new', methods=['GET', 'POST'])
 @login_required
 def new_category():
     if not current_user.is_admin:
@@ -212,7 +255,6 @@ def new_category():
     
     return render_template('category_form.html', form=form, title='New Category')
 
-@app.route('/category/<category_id>/delete', methods=['POST'])
 @login_required
 def delete_category(category_id):
     if not current_user.is_admin:
@@ -232,14 +274,12 @@ def delete_category(category_id):
     return redirect(url_for('list_categories'))
 
 # Error handlers
-@app.errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
 def internal_error(error):
     return render_template('errors/500.html'), 500
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
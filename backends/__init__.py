@@ -0,0 +1,35 @@
+"""Storage backends the models read and write through.
+
+``STORAGE_BACKEND`` selects ``firestore`` (the default) or ``sqlite``; the
+SQLite database lives at ``SQLITE_PATH``. Calls are timed and counted per
+request by ``instrumentation``.
+"""
+import os
+
+from backends.base import Backend
+from instrumentation import InstrumentedBackend
+
+_backend = None
+
+
+def get_backend():
+    """The storage backend selected by ``STORAGE_BACKEND``."""
+    global _backend
+    if _backend is None:
+        name = os.getenv('STORAGE_BACKEND', 'firestore')
+        if name == 'sqlite':
+            from backends.sqlite_backend import SQLiteBackend
+            default_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                        'instance', 'blog.db')
+            _backend = SQLiteBackend(os.getenv('SQLITE_PATH', default_path))
+        elif name == 'firestore':
+            from firebase_config import get_db
+            from backends.firestore_backend import FirestoreBackend
+            _backend = FirestoreBackend(get_db)
+        else:
+            raise ValueError(f"Unknown STORAGE_BACKEND: {name}")
+        _backend = InstrumentedBackend(_backend)
+    return _backend
+
+
+__all__ = ['Backend', 'get_backend']
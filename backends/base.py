@@ -0,0 +1,156 @@
+class Backend:
+    """Storage interface used by the models.
+
+    Records are plain dicts of document fields and are passed around as
+    ``(id, data)`` pairs. Post listings are ordered newest first by
+    ``timestamp`` and then by id, and ``after`` is the ``(timestamp, id)``
+    of the last record of the previous page.
+
+    Writes that change posts also keep the dashboard counters in step:
+    backends apply ``stats.diff(before, after)`` in the same transaction.
+    """
+
+    # Users
+
+    def get_user(self, user_id):
+        raise NotImplementedError
+
+    def get_users(self, user_ids):
+        """``{id: data}`` for those of ``user_ids`` that exist, read in one batch."""
+        raise NotImplementedError
+
+    def put_user(self, user_id, data):
+        raise NotImplementedError
+
+    def update_user(self, user_id, fields):
+        raise NotImplementedError
+
+    def find_user(self, field, value):
+        """First ``(id, data)`` whose ``field`` equals ``value``, or None."""
+        raise NotImplementedError
+
+    def list_users(self):
+        raise NotImplementedError
+
+    def count_users(self):
+        raise NotImplementedError
+
+    # Posts
+
+    def get_post(self, post_id):
+        raise NotImplementedError
+
+    def get_posts(self, post_ids, fields=None):
+        """``{id: data}`` for those of ``post_ids`` that exist, read in one batch."""
+        raise NotImplementedError
+
+    def create_post(self, post_id, data):
+        raise NotImplementedError
+
+    def create_posts(self, posts):
+        """Write ``(id, data)`` posts, claim their slugs and bump the counters in one batch.
+
+        Posts whose id already exists are skipped. If any slug is taken the
+        whole batch fails. Returns the ids that were written.
+        """
+        raise NotImplementedError
+
+    def update_post(self, post_id, fields):
+        """Update a post and return its fields from before the update."""
+        raise NotImplementedError
+
+    def update_post_if(self, post_id, fields, field, expected):
+        """Update a post only while ``field`` still equals ``expected``.
+
+        Returns True if the update was applied.
+        """
+        raise NotImplementedError
+
+    def delete_post(self, post_id):
+        """Delete a post and return its fields from before the delete."""
+        raise NotImplementedError
+
+    def list_posts(self, limit, after=None, published_only=False, category_id=None, fields=None, offset=0):
+        """One page of ``(id, data)`` posts.
+
+        ``fields`` restricts the returned data to those fields when given.
+        """
+        raise NotImplementedError
+
+    def stream_posts(self, fields=None):
+        """Iterate over every post as ``(id, data)``, in no particular order."""
+        raise NotImplementedError
+
+    def post_uses_category(self, category_id):
+        raise NotImplementedError
+
+    def watch_posts(self, on_change):
+        """Call ``on_change(post_id)`` after any process updates or deletes a post.
+
+        Returns a function that stops watching, or None if the backend
+        cannot watch for changes.
+        """
+        return None
+
+    # Slugs
+
+    def get_slug(self, slug):
+        """Id of the post that owns ``slug`` (current or former), or None."""
+        raise NotImplementedError
+
+    def get_slugs(self, slugs):
+        """``{slug: post_id}`` for those of ``slugs`` that are taken."""
+        raise NotImplementedError
+
+    def claim_slug(self, slug, post_id):
+        """Reserve ``slug`` for ``post_id`` unless another post owns it.
+
+        Returns True if ``post_id`` owns the slug afterwards.
+        """
+        raise NotImplementedError
+
+    def release_slugs(self, post_id):
+        """Free every slug owned by ``post_id`` and return them."""
+        raise NotImplementedError
+
+    # Categories
+
+    def list_categories(self):
+        raise NotImplementedError
+
+    def put_category(self, category_id, data):
+        raise NotImplementedError
+
+    def delete_category(self, category_id):
+        raise NotImplementedError
+
+    # Media metadata
+
+    def get_media(self, filename):
+        raise NotImplementedError
+
+    def put_media(self, filename, data):
+        raise NotImplementedError
+
+    def update_media(self, filename, fields):
+        raise NotImplementedError
+
+    def delete_media(self, filename):
+        raise NotImplementedError
+
+    def list_media(self, limit, sort_field='created_at', descending=True, after=None,
+                   content_type=None, since=None, until=None, fields=None):
+        """One page of ``(filename, data)`` media, with ``after`` = ``(sort value, filename)``."""
+        raise NotImplementedError
+
+    def stream_media(self, fields=None):
+        raise NotImplementedError
+
+    # Dashboard counters
+
+    def get_stats(self):
+        """The stored counters, or None if none have been recorded."""
+        raise NotImplementedError
+
+    def set_stats(self, totals):
+        raise NotImplementedError
@@ -0,0 +1,313 @@
+from datetime import datetime, timedelta, timezone
+
+from firebase_admin import firestore
+from google.api_core.exceptions import Conflict
+
+import stats
+from backends.base import Backend
+
+DOCUMENT_ID = firestore.FieldPath.document_id()
+
+# Allowance for clock skew between this host and Firestore when a watch starts
+WATCH_MARGIN = timedelta(seconds=30)
+
+
+class FirestoreBackend(Backend):
+    """Stores everything in Cloud Firestore.
+
+    ``get_db`` is called for every operation rather than once, so a worker
+    forked after the backend was created still gets its own client.
+    """
+
+    def __init__(self, get_db):
+        self._get_db = get_db
+
+    @property
+    def db(self):
+        return self._get_db()
+
+    # Users
+
+    def get_user(self, user_id):
+        user_doc = self.db.collection('users').document(user_id).get()
+        return user_doc.to_dict() if user_doc.exists else None
+
+    def get_users(self, user_ids):
+        refs = [self.db.collection('users').document(user_id) for user_id in user_ids]
+        if not refs:
+            return {}
+        return {user_doc.id: user_doc.to_dict() for user_doc in self.db.get_all(refs) if user_doc.exists}
+
+    def put_user(self, user_id, data):
+        self.db.collection('users').document(user_id).set(data)
+
+    def update_user(self, user_id, fields):
+        self.db.collection('users').document(user_id).update(fields)
+
+    def find_user(self, field, value):
+        for user_doc in self.db.collection('users').where(field, '==', value).limit(1).stream():
+            return user_doc.id, user_doc.to_dict()
+        return None
+
+    def list_users(self):
+        return [(user_doc.id, user_doc.to_dict()) for user_doc in self.db.collection('users').stream()]
+
+    def count_users(self):
+        # Server-side count() aggregation; no documents are transferred
+        result = self.db.collection('users').count().get()
+        return result[0][0].value
+
+    # Posts
+
+    def get_post(self, post_id):
+        post_doc = self.db.collection('posts').document(post_id).get()
+        return post_doc.to_dict() if post_doc.exists else None
+
+    def get_posts(self, post_ids, fields=None):
+        refs = [self.db.collection('posts').document(post_id) for post_id in post_ids]
+        if not refs:
+            return {}
+        # One BatchGetDocuments call, however many ids
+        return {post_doc.id: post_doc.to_dict()
+                for post_doc in self.db.get_all(refs, field_paths=fields) if post_doc.exists}
+
+    def create_post(self, post_id, data):
+        # Save the post and bump the counters atomically
+        batch = self.db.batch()
+        batch.set(self.db.collection('posts').document(post_id), data)
+        self._apply_stats(batch, stats.diff(None, data))
+        batch.commit()
+
+    def create_posts(self, posts):
+        posts_ref = self.db.collection('posts')
+        refs = [posts_ref.document(post_id) for post_id, _ in posts]
+        existing = {post_doc.id for post_doc in self.db.get_all(refs, field_paths=['timestamp'])
+                    if post_doc.exists}
+
+        batch = self.db.batch()
+        delta = stats.diff(None, None)
+        written = []
+        for (post_id, data), post_ref in zip(posts, refs):
+            if post_id in existing:
+                continue
+            batch.set(post_ref, data)
+            if data.get('slug'):
+                # create() fails the commit if the slug was claimed meanwhile
+                batch.create(self.db.collection('slugs').document(data['slug']),
+                             {'post_id': post_id, 'created_at': firestore.SERVER_TIMESTAMP})
+            stats.apply(delta, stats.diff(None, data))
+            written.append(post_id)
+        if written:
+            # One increment for the whole batch
+            self._apply_stats(batch, delta)
+            batch.commit()
+        return written
+
+    def update_post(self, post_id, fields):
+        post_ref = self.db.collection('posts').document(post_id)
+
+        @firestore.transactional
+        def write(transaction):
+            # Read the stored version so the counters move from what is
+            # actually in Firestore, not from a possibly stale model object
+            before = post_ref.get(transaction=transaction).to_dict() or {}
+            transaction.update(post_ref, fields)
+            self._apply_stats(transaction, stats.diff(before, dict(before, **fields)))
+            self._mark_changed(transaction, post_id)
+            return before
+
+        return write(self.db.transaction())
+
+    def update_post_if(self, post_id, fields, field, expected):
+        post_ref = self.db.collection('posts').document(post_id)
+
+        @firestore.transactional
+        def write(transaction):
+            snapshot = post_ref.get(transaction=transaction)
+            if not snapshot.exists or (snapshot.to_dict() or {}).get(field) != expected:
+                return False
+            transaction.update(post_ref, fields)
+            self._mark_changed(transaction, post_id)
+            return True
+
+        return write(self.db.transaction())
+
+    def delete_post(self, post_id):
+        post_ref = self.db.collection('posts').document(post_id)
+
+        @firestore.transactional
+        def remove(transaction):
+            before = post_ref.get(transaction=transaction).to_dict()
+            transaction.delete(post_ref)
+            self._apply_stats(transaction, stats.diff(before, None))
+            self._mark_changed(transaction, post_id)
+            return before
+
+        return remove(self.db.transaction())
+
+    def list_posts(self, limit, after=None, published_only=False, category_id=None, fields=None, offset=0):
+        # Needs the composite indexes in firestore.indexes.json
+        query = self.db.collection('posts')
+        if category_id:
+            query = query.where('categories', 'array_contains', category_id)
+        if published_only:
+            query = query.where('is_published', '==', True)
+        # Order by document id as well so posts sharing a timestamp still
+        # have a stable position for cursors.
+        query = query.order_by('timestamp', direction=firestore.Query.DESCENDING) \
+                     .order_by(DOCUMENT_ID, direction=firestore.Query.DESCENDING)
+        if fields is not None:
+            query = query.select(fields)
+        if after is not None:
+            timestamp, post_id = after
+            query = query.start_after({
+                'timestamp': timestamp,
+                DOCUMENT_ID: self.db.collection('posts').document(post_id)
+            })
+        if offset:
+            query = query.offset(offset)
+        return [(post_doc.id, post_doc.to_dict()) for post_doc in query.limit(limit).stream()]
+
+    def stream_posts(self, fields=None):
+        query = self.db.collection('posts')
+        if fields is not None:
+            query = query.select(fields)
+        for post_doc in query.stream():
+            yield post_doc.id, post_doc.to_dict()
+
+    def post_uses_category(self, category_id):
+        query = self.db.collection('posts').where('categories', 'array_contains', category_id)
+        return len(query.select([]).limit(1).get()) > 0
+
+    def _mark_changed(self, writer, post_id):
+        # One small document per post, so watchers never stream post bodies
+        writer.set(self.db.collection('post_changes').document(post_id),
+                   {'changed_at': firestore.SERVER_TIMESTAMP})
+
+    def watch_posts(self, on_change):
+        since = datetime.now(timezone.utc) - WATCH_MARGIN
+        query = self.db.collection('post_changes').where('changed_at', '>', since)
+
+        def on_snapshot(snapshots, changes, read_time):
+            for change in changes:
+                on_change(change.document.id)
+
+        return query.on_snapshot(on_snapshot).unsubscribe
+
+    # Slugs
+
+    def get_slug(self, slug):
+        slug_doc = self.db.collection('slugs').document(slug).get()
+        return slug_doc.get('post_id') if slug_doc.exists else None
+
+    def get_slugs(self, slugs):
+        refs = [self.db.collection('slugs').document(slug) for slug in slugs]
+        return {slug_doc.id: slug_doc.get('post_id')
+                for slug_doc in self.db.get_all(refs, field_paths=['post_id']) if slug_doc.exists}
+
+    def claim_slug(self, slug, post_id):
+        slug_ref = self.db.collection('slugs').document(slug)
+        try:
+            # create() fails if the document exists, so two posts can never
+            # claim the same slug
+            slug_ref.create({'post_id': post_id, 'created_at': firestore.SERVER_TIMESTAMP})
+            return True
+        except Conflict:
+            slug_doc = slug_ref.get()
+            return slug_doc.exists and slug_doc.get('post_id') == post_id
+
+    def release_slugs(self, post_id):
+        batch = self.db.batch()
+        released = []
+        for slug_doc in self.db.collection('slugs').where('post_id', '==', post_id).select([]).stream():
+            batch.delete(slug_doc.reference)
+            released.append(slug_doc.id)
+        batch.commit()
+        return released
+
+    # Categories
+
+    def list_categories(self):
+        return [(doc.id, doc.to_dict()) for doc in self.db.collection('categories').stream()]
+
+    def put_category(self, category_id, data):
+        self.db.collection('categories').document(category_id).set(data)
+
+    def delete_category(self, category_id):
+        self.db.collection('categories').document(category_id).delete()
+
+    # Media metadata
+
+    def get_media(self, filename):
+        media_doc = self.db.collection('images').document(filename).get()
+        return self._media_data(media_doc) if media_doc.exists else None
+
+    def put_media(self, filename, data):
+        self.db.collection('images').document(filename).set(data)
+
+    def update_media(self, filename, fields):
+        self.db.collection('images').document(filename).update(fields)
+
+    def delete_media(self, filename):
+        self.db.collection('images').document(filename).delete()
+
+    def list_media(self, limit, sort_field='created_at', descending=True, after=None,
+                   content_type=None, since=None, until=None, fields=None):
+        direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+        query = self.db.collection('images')
+        if fields is not None:
+            query = query.select(fields)
+        if content_type:
+            query = query.where('content_type', '==', content_type)
+        if since:
+            query = query.where('created_at', '>=', since)
+        if until:
+            query = query.where('created_at', '<', until)
+        query = query.order_by(sort_field, direction=direction).order_by(DOCUMENT_ID, direction=direction)
+        if after is not None:
+            value, filename = after
+            query = query.start_after({
+                sort_field: value,
+                DOCUMENT_ID: self.db.collection('images').document(filename)
+            })
+        return [(media_doc.id, self._media_data(media_doc)) for media_doc in query.limit(limit).stream()]
+
+    def stream_media(self, fields=None):
+        query = self.db.collection('images')
+        if fields is not None:
+            query = query.select(fields)
+        for media_doc in query.stream():
+            yield media_doc.id, self._media_data(media_doc)
+
+    @staticmethod
+    def _media_data(media_doc):
+        media_data = media_doc.to_dict() or {}
+        # Images uploaded before metadata was recorded have no created_at
+        media_data.setdefault('created_at', media_doc.update_time)
+        return media_data
+
+    # Dashboard counters
+
+    def _stats_ref(self):
+        return self.db.collection('stats').document('posts')
+
+    def get_stats(self):
+        stats_doc = self._stats_ref().get()
+        return stats_doc.to_dict() if stats_doc.exists else None
+
+    def set_stats(self, totals):
+        self._stats_ref().set(totals)
+
+    def _apply_stats(self, writer, delta):
+        """Queue increments for ``delta`` on a WriteBatch or Transaction."""
+        increments = {}
+        for field in stats.COUNTER_FIELDS:
+            if delta[field]:
+                increments[field] = firestore.Increment(delta[field])
+        for group in stats.GROUPS:
+            changed = {key: firestore.Increment(value) for key, value in delta[group].items() if value}
+            if changed:
+                increments[group] = changed
+        if increments:
+            # merge=True merges nested maps, so only the touched keys change
+            writer.set(self._stats_ref(), increments, merge=True)
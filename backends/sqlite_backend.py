@@ -0,0 +1,475 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import stats
+from backends.base import Backend
+
+# Fixed-width UTC timestamps sort the same as strings and as datetimes
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    username TEXT,
+    email TEXT,
+    is_admin INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_username ON users (username);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+
+-- The markdown source and rendered HTML are kept out of ``data`` so that
+-- listings can skip them
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    is_published INTEGER NOT NULL DEFAULT 0,
+    content TEXT,
+    content_html TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS posts_listing ON posts (timestamp DESC, id DESC);
+CREATE INDEX IF NOT EXISTS posts_published ON posts (is_published, timestamp DESC, id DESC);
+
+-- One row per (category, post), mirroring the posts they point at
+CREATE TABLE IF NOT EXISTS post_categories (
+    category_id TEXT NOT NULL,
+    post_id TEXT NOT NULL REFERENCES posts (id) ON DELETE CASCADE,
+    timestamp TEXT NOT NULL,
+    is_published INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (category_id, post_id)
+);
+CREATE INDEX IF NOT EXISTS post_categories_listing
+    ON post_categories (category_id, is_published, timestamp DESC, post_id DESC);
+CREATE INDEX IF NOT EXISTS post_categories_post ON post_categories (post_id);
+
+-- Every slug a post has had; the post row holds the current one
+CREATE TABLE IF NOT EXISTS slugs (
+    slug TEXT PRIMARY KEY,
+    post_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS slugs_post ON slugs (post_id);
+
+CREATE TABLE IF NOT EXISTS categories (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS media (
+    id TEXT PRIMARY KEY,
+    filename TEXT,
+    content_type TEXT,
+    size INTEGER,
+    created_at TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS media_created_at ON media (created_at, id);
+CREATE INDEX IF NOT EXISTS media_size ON media (size, id);
+CREATE INDEX IF NOT EXISTS media_filename ON media (filename, id);
+CREATE INDEX IF NOT EXISTS media_type ON media (content_type, created_at, id);
+
+CREATE TABLE IF NOT EXISTS stats (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+# Post fields stored in their own columns rather than in ``data``
+POST_COLUMNS = ('content', 'content_html')
+
+# Columns the media library can sort and filter on
+MEDIA_COLUMNS = ('filename', 'content_type', 'size', 'created_at')
+
+# SQLite's default limit on bound parameters is 999 in older builds
+_CHUNK = 900
+
+
+def _utc(value):
+    """Naive UTC datetime for ``value``, which may carry a timezone."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _column(value):
+    """SQL value of a field, with datetimes as sortable strings."""
+    if isinstance(value, datetime):
+        return _utc(value).strftime(TIMESTAMP_FORMAT)
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'$dt': _column(value)}
+    raise TypeError(f"Cannot store {type(value).__name__}")
+
+
+def _decode_object(obj):
+    if len(obj) == 1 and '$dt' in obj:
+        return datetime.strptime(obj['$dt'], TIMESTAMP_FORMAT)
+    return obj
+
+
+def dumps(data):
+    return json.dumps(data, default=_encode_value, separators=(',', ':'))
+
+
+def loads(text):
+    return json.loads(text, object_hook=_decode_object) if text else {}
+
+
+def _project(data, fields):
+    """Keep only the top-level fields named in ``fields`` (``author.id`` keeps ``author``)."""
+    if fields is None:
+        return data
+    keep = {field.split('.', 1)[0] for field in fields}
+    return {key: value for key, value in data.items() if key in keep}
+
+
+class SQLiteBackend(Backend):
+    """Stores everything in a local SQLite database.
+
+    Each thread gets its own connection. The database runs in WAL mode so
+    readers never wait for the writer, and writes that touch several tables
+    run in one ``BEGIN IMMEDIATE`` transaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # Connections are not shared across a fork
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _query(self, sql, params=()):
+        return self._connection().execute(sql, params).fetchall()
+
+    def _query_in(self, sql, ids):
+        """Rows of ``sql`` whose id is one of ``ids``, in chunks under the parameter limit."""
+        ids = list(ids)
+        rows = []
+        for start in range(0, len(ids), _CHUNK):
+            chunk = ids[start:start + _CHUNK]
+            rows.extend(self._query(f"{sql} WHERE id IN ({', '.join('?' * len(chunk))})", chunk))
+        return rows
+
+    # Users
+
+    def get_user(self, user_id):
+        rows = self._query('SELECT data FROM users WHERE id = ?', (user_id,))
+        return loads(rows[0][0]) if rows else None
+
+    def get_users(self, user_ids):
+        return {user_id: loads(data) for user_id, data in self._query_in('SELECT id, data FROM users', user_ids)}
+
+    def put_user(self, user_id, data):
+        with self._transaction() as conn:
+            self._write_user(conn, user_id, data)
+
+    def update_user(self, user_id, fields):
+        with self._transaction() as conn:
+            row = conn.execute('SELECT data FROM users WHERE id = ?', (user_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"No user {user_id}")
+            self._write_user(conn, user_id, dict(loads(row[0]), **fields))
+
+    @staticmethod
+    def _write_user(conn, user_id, data):
+        conn.execute(
+            'INSERT OR REPLACE INTO users (id, username, email, is_admin, data) VALUES (?, ?, ?, ?, ?)',
+            (user_id, data.get('username'), data.get('email'), int(bool(data.get('is_admin'))), dumps(data))
+        )
+
+    def find_user(self, field, value):
+        if field in ('username', 'email'):
+            rows = self._query(f'SELECT id, data FROM users WHERE {field} = ? LIMIT 1', (value,))
+            return (rows[0][0], loads(rows[0][1])) if rows else None
+        for user_id, data in self.list_users():
+            if data.get(field) == value:
+                return user_id, data
+        return None
+
+    def list_users(self):
+        return [(user_id, loads(data)) for user_id, data in self._query('SELECT id, data FROM users')]
+
+    def count_users(self):
+        return self._query('SELECT COUNT(*) FROM users')[0][0]
+
+    # Posts
+
+    def get_post(self, post_id):
+        rows = self._query('SELECT content, content_html, data FROM posts WHERE id = ?', (post_id,))
+        return self._post_data(rows[0]) if rows else None
+
+    def get_posts(self, post_ids, fields=None):
+        rows = self._query_in('SELECT id, content, content_html, data FROM posts', post_ids)
+        return {row[0]: _project(self._post_data(row[1:]), fields) for row in rows}
+
+    @staticmethod
+    def _post_data(row):
+        content, content_html, data = row
+        post_data = loads(data)
+        post_data['content'] = content
+        post_data['content_html'] = content_html
+        return post_data
+
+    def _read_post(self, conn, post_id):
+        row = conn.execute('SELECT content, content_html, data FROM posts WHERE id = ?', (post_id,)).fetchone()
+        return self._post_data(row) if row else None
+
+    @staticmethod
+    def _write_post(conn, post_id, post_data):
+        timestamp = _column(post_data.get('timestamp') or datetime.utcnow())
+        is_published = int(bool(post_data.get('is_published')))
+        data = {key: value for key, value in post_data.items() if key not in POST_COLUMNS}
+        conn.execute(
+            'INSERT OR REPLACE INTO posts (id, timestamp, is_published, content, content_html, data) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (post_id, timestamp, is_published, post_data.get('content'), post_data.get('content_html'), dumps(data))
+        )
+        conn.execute('DELETE FROM post_categories WHERE post_id = ?', (post_id,))
+        conn.executemany(
+            'INSERT OR IGNORE INTO post_categories (category_id, post_id, timestamp, is_published) '
+            'VALUES (?, ?, ?, ?)',
+            [(category_id, post_id, timestamp, is_published)
+             for category_id in post_data.get('categories') or []]
+        )
+
+    def create_post(self, post_id, data):
+        with self._transaction() as conn:
+            self._write_post(conn, post_id, data)
+            self._apply_stats(conn, stats.diff(None, data))
+
+    def create_posts(self, posts):
+        written = []
+        delta = stats.diff(None, None)
+        with self._transaction() as conn:
+            for post_id, data in posts:
+                if conn.execute('SELECT 1 FROM posts WHERE id = ?', (post_id,)).fetchone():
+                    continue
+                if data.get('slug'):
+                    # Raises IntegrityError, rolling back the batch, if the slug is taken
+                    conn.execute('INSERT INTO slugs (slug, post_id) VALUES (?, ?)', (data['slug'], post_id))
+                self._write_post(conn, post_id, data)
+                stats.apply(delta, stats.diff(None, data))
+                written.append(post_id)
+            if written:
+                self._apply_stats(conn, delta)
+        return written
+
+    def update_post(self, post_id, fields):
+        with self._transaction() as conn:
+            before = self._read_post(conn, post_id)
+            if before is None:
+                raise KeyError(f"No post {post_id}")
+            after = dict(before, **fields)
+            self._write_post(conn, post_id, after)
+            self._apply_stats(conn, stats.diff(before, after))
+            return before
+
+    def update_post_if(self, post_id, fields, field, expected):
+        with self._transaction() as conn:
+            before = self._read_post(conn, post_id)
+            if before is None or before.get(field) != expected:
+                return False
+            self._write_post(conn, post_id, dict(before, **fields))
+            return True
+
+    def delete_post(self, post_id):
+        with self._transaction() as conn:
+            before = self._read_post(conn, post_id)
+            conn.execute('DELETE FROM post_categories WHERE post_id = ?', (post_id,))
+            conn.execute('DELETE FROM posts WHERE id = ?', (post_id,))
+            self._apply_stats(conn, stats.diff(before, None))
+            return before
+
+    @staticmethod
+    def _post_columns(fields):
+        """Whether ``fields`` needs the body columns, and the column list that reads them (or not)."""
+        with_body = fields is None or any(field in POST_COLUMNS for field in fields)
+        return with_body, 'p.content, p.content_html, p.data' if with_body else 'NULL, NULL, p.data'
+
+    def _listed_post(self, row, with_body, fields):
+        post_data = self._post_data(row)
+        if not with_body:
+            for column in POST_COLUMNS:
+                post_data.pop(column)
+        return _project(post_data, fields)
+
+    def list_posts(self, limit, after=None, published_only=False, category_id=None, fields=None, offset=0):
+        with_body, columns = self._post_columns(fields)
+        params = []
+        if category_id:
+            # Served from post_categories_listing; posts is only joined for the data
+            sql = f'SELECT p.id, {columns} FROM post_categories c JOIN posts p ON p.id = c.post_id ' \
+                  'WHERE c.category_id = ?'
+            params.append(category_id)
+            prefix = 'c.'
+            order_id = 'c.post_id'
+        else:
+            sql = f'SELECT p.id, {columns} FROM posts p WHERE 1 = 1'
+            prefix = 'p.'
+            order_id = 'p.id'
+        if published_only:
+            sql += f' AND {prefix}is_published = 1'
+        if after is not None:
+            timestamp, post_id = after
+            sql += f' AND ({prefix}timestamp, {order_id}) < (?, ?)'
+            params.extend([_column(timestamp), post_id])
+        sql += f' ORDER BY {prefix}timestamp DESC, {order_id} DESC LIMIT ? OFFSET ?'
+        params.extend([limit, offset])
+
+        return [(row[0], self._listed_post(row[1:], with_body, fields)) for row in self._query(sql, params)]
+
+    def stream_posts(self, fields=None):
+        with_body, columns = self._post_columns(fields)
+        for row in self._query(f'SELECT p.id, {columns} FROM posts p'):
+            yield row[0], self._listed_post(row[1:], with_body, fields)
+
+    def post_uses_category(self, category_id):
+        return bool(self._query('SELECT 1 FROM post_categories WHERE category_id = ? LIMIT 1', (category_id,)))
+
+    # Slugs
+
+    def get_slug(self, slug):
+        rows = self._query('SELECT post_id FROM slugs WHERE slug = ?', (slug,))
+        return rows[0][0] if rows else None
+
+    def get_slugs(self, slugs):
+        slugs = list(slugs)
+        taken = {}
+        for start in range(0, len(slugs), _CHUNK):
+            chunk = slugs[start:start + _CHUNK]
+            placeholders = ', '.join('?' * len(chunk))
+            taken.update(self._query(f'SELECT slug, post_id FROM slugs WHERE slug IN ({placeholders})', chunk))
+        return taken
+
+    def claim_slug(self, slug, post_id):
+        with self._transaction() as conn:
+            conn.execute('INSERT OR IGNORE INTO slugs (slug, post_id) VALUES (?, ?)', (slug, post_id))
+            owner = conn.execute('SELECT post_id FROM slugs WHERE slug = ?', (slug,)).fetchone()[0]
+        return owner == post_id
+
+    def release_slugs(self, post_id):
+        with self._transaction() as conn:
+            released = [slug for slug, in conn.execute('SELECT slug FROM slugs WHERE post_id = ?', (post_id,))]
+            conn.execute('DELETE FROM slugs WHERE post_id = ?', (post_id,))
+            return released
+
+    # Categories
+
+    def list_categories(self):
+        return [(category_id, loads(data)) for category_id, data in self._query('SELECT id, data FROM categories')]
+
+    def put_category(self, category_id, data):
+        with self._transaction() as conn:
+            conn.execute('INSERT OR REPLACE INTO categories (id, data) VALUES (?, ?)', (category_id, dumps(data)))
+
+    def delete_category(self, category_id):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM categories WHERE id = ?', (category_id,))
+
+    # Media metadata
+
+    def get_media(self, filename):
+        rows = self._query('SELECT data FROM media WHERE id = ?', (filename,))
+        return loads(rows[0][0]) if rows else None
+
+    def put_media(self, filename, data):
+        with self._transaction() as conn:
+            self._write_media(conn, filename, data)
+
+    def update_media(self, filename, fields):
+        with self._transaction() as conn:
+            row = conn.execute('SELECT data FROM media WHERE id = ?', (filename,)).fetchone()
+            if row is None:
+                raise KeyError(f"No media {filename}")
+            self._write_media(conn, filename, dict(loads(row[0]), **fields))
+
+    @staticmethod
+    def _write_media(conn, filename, data):
+        data = dict(data)
+        data.setdefault('created_at', datetime.utcnow())
+        conn.execute(
+            'INSERT OR REPLACE INTO media (id, filename, content_type, size, created_at, data) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (filename, data.get('filename'), data.get('content_type'), data.get('size'),
+             _column(data['created_at']), dumps(data))
+        )
+
+    def delete_media(self, filename):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM media WHERE id = ?', (filename,))
+
+    def list_media(self, limit, sort_field='created_at', descending=True, after=None,
+                   content_type=None, since=None, until=None, fields=None):
+        if sort_field not in MEDIA_COLUMNS:
+            raise ValueError(f"Cannot sort media by {sort_field}")
+        sql = 'SELECT id, data FROM media WHERE 1 = 1'
+        params = []
+        if content_type:
+            sql += ' AND content_type = ?'
+            params.append(content_type)
+        if since:
+            sql += ' AND created_at >= ?'
+            params.append(_column(since))
+        if until:
+            sql += ' AND created_at < ?'
+            params.append(_column(until))
+        if after is not None:
+            value, filename = after
+            sql += f" AND ({sort_field}, id) {'<' if descending else '>'} (?, ?)"
+            params.extend([_column(value), filename])
+        direction = 'DESC' if descending else 'ASC'
+        sql += f' ORDER BY {sort_field} {direction}, id {direction} LIMIT ?'
+        params.append(limit)
+        return [(filename, _project(loads(data), fields)) for filename, data in self._query(sql, params)]
+
+    def stream_media(self, fields=None):
+        for filename, data in self._query('SELECT id, data FROM media'):
+            yield filename, _project(loads(data), fields)
+
+    # Dashboard counters
+
+    def get_stats(self):
+        rows = self._query("SELECT data FROM stats WHERE id = 'posts'")
+        return loads(rows[0][0]) if rows else None
+
+    def set_stats(self, totals):
+        with self._transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO stats (id, data) VALUES ('posts', ?)", (dumps(totals),))
+
+    @staticmethod
+    def _apply_stats(conn, delta):
+        row = conn.execute("SELECT data FROM stats WHERE id = 'posts'").fetchone()
+        totals = stats.apply(loads(row[0]) if row else {}, delta)
+        conn.execute("INSERT OR REPLACE INTO stats (id, data) VALUES ('posts', ?)", (dumps(totals),))
@@ -0,0 +1,6 @@
+"""Reproducible benchmarks for the hot blog and admin routes.
+
+``python -m benchmarks.run`` seeds a SQLite corpus (see ``corpus``) and
+drives the routes through the Flask test client, reporting latency,
+throughput and storage backend reads per request. See the README.
+"""
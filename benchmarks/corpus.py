@@ -0,0 +1,116 @@
+"""Deterministic benchmark corpora in a SQLite storage backend.
+
+The same parameters always produce the same posts, categories and images,
+so runs against separately seeded databases stay comparable. Records are
+written straight through the backend, with the fields ``Post.create`` and
+``Media.create`` would store, which is much faster than going through the
+models and skips the search index and page cache.
+"""
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from rendering import content_hash, render_markdown
+import slugs
+
+# Fixed so corpora do not depend on when they were seeded
+EPOCH = datetime(2024, 1, 1)
+
+ADMIN_ID = 'bench-admin'
+
+WORDS = """
+latency cache index query shard replica worker request response template
+render stream cursor page batch queue upload image variant thumbnail author
+draft publish category archive search token bucket header proxy client server
+""".split()
+
+CONTENT_TYPES = ('image/jpeg', 'image/png', 'image/webp', 'image/gif')
+
+
+def _id(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _body(rng, paragraphs):
+    parts = []
+    for n in range(paragraphs):
+        if n and n % 3 == 0:
+            parts.append(f'## {_sentence(rng, 4)[:-1]}')
+        parts.append(' '.join(_sentence(rng, rng.randint(8, 16)) for _ in range(4)))
+    return '\n\n'.join(parts)
+
+
+def seed(backend, posts=10000, categories=200, images=5000, paragraphs=8, published_ratio=0.9, seed=1):
+    """Fill an empty backend and return a summary of what was written."""
+    rng = random.Random(seed)
+
+    admin = {'username': 'bench', 'email': 'bench@example.com', 'is_admin': True,
+             'created_at': EPOCH.isoformat()}
+    backend.put_user(ADMIN_ID, admin)
+    author = {'id': ADMIN_ID, 'username': admin['username'], 'email': admin['email']}
+
+    category_ids = []
+    for n in range(categories):
+        category_id = _id(rng)
+        backend.put_category(category_id, {'name': f'Category {n + 1}', 'description': _sentence(rng, 8)})
+        category_ids.append(category_id)
+
+    published = []
+    for n in range(posts):
+        post_id = _id(rng)
+        title = f'{_sentence(rng, 5)[:-1]} {n + 1}'
+        slug = slugs.slugify(title)
+        backend.claim_slug(slug, post_id)
+        content = _body(rng, paragraphs)
+        digest = content_hash(content)
+        # Newest first in id order, a few minutes apart
+        timestamp = EPOCH - timedelta(minutes=7 * n)
+        is_published = rng.random() < published_ratio
+        backend.create_post(post_id, {
+            'title': title,
+            'slug': slug,
+            'content': content,
+            'content_html': render_markdown(content, digest),
+            'content_hash': digest,
+            'author': author,
+            'categories': rng.sample(category_ids, min(len(category_ids), rng.randint(1, 3))),
+            'is_published': is_published,
+            'excerpt': _sentence(rng, 20),
+            'featured_image': '',
+            'featured_image_status': 'none',
+            'featured_image_job': None,
+            'meta_description': _sentence(rng, 12),
+            'timestamp': timestamp,
+            'created_at': timestamp,
+            'updated_at': timestamp
+        })
+        if is_published:
+            published.append(slug)
+
+    for n in range(images):
+        content_type = rng.choice(CONTENT_TYPES)
+        filename = f'{_id(rng)}.{content_type.split("/")[1]}'
+        backend.put_media(filename, {
+            'filename': filename,
+            'content_type': content_type,
+            'size': rng.randint(20_000, 4_000_000),
+            'sha256': '%064x' % rng.getrandbits(256),
+            'width': rng.choice((640, 1280, 1920, 2560)),
+            'height': rng.choice((480, 720, 1080, 1440)),
+            'created_at': EPOCH - timedelta(minutes=11 * n)
+        })
+
+    return {'posts': posts, 'published_slugs': published, 'category_ids': category_ids, 'images': images}
+
+
+def describe(backend):
+    """Summary of an already seeded backend, as ``seed`` returns it."""
+    published = [data.get('slug') for _, data in backend.stream_posts(fields=['slug', 'is_published'])
+                 if data.get('is_published')]
+    category_ids = [category_id for category_id, _ in backend.list_categories()]
+    return {'posts': (backend.get_stats() or {}).get('total', 0), 'published_slugs': published,
+            'category_ids': category_ids, 'images': sum(1 for _ in backend.stream_media(fields=[]))}
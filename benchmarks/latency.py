@@ -0,0 +1,38 @@
+"""Simulated network latency for the benchmark backend.
+
+The SQLite corpus answers in microseconds, while each Firestore call is a
+network round trip. Adding a fixed delay to every backend call makes
+results that depend on waiting for I/O, such as throughput under
+concurrency, resemble a deployment.
+"""
+import time
+
+import backends
+from instrumentation import InstrumentedBackend
+
+
+class LatencyBackend:
+    """Wraps a backend so every call first sleeps for ``seconds``."""
+
+    def __init__(self, backend, seconds):
+        self._backend = backend
+        self._seconds = seconds
+
+    def __getattr__(self, name):
+        attr = getattr(self._backend, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            time.sleep(self._seconds)
+            return attr(*args, **kwargs)
+        return call
+
+
+def install(milliseconds):
+    """Delay every call of the selected backend by ``milliseconds``."""
+    if not milliseconds:
+        return
+    backend = backends.get_backend()
+    # Keep the instrumentation outermost so it measures the delay too
+    backends._backend = InstrumentedBackend(LatencyBackend(backend._backend, milliseconds / 1000))
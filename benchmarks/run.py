@@ -0,0 +1,260 @@
+"""Benchmark the hot routes against a seeded SQLite corpus.
+
+    python -m benchmarks.run                          # seed (once) and run
+    python -m benchmarks.run --save benchmarks/baseline.json
+    python -m benchmarks.run --baseline benchmarks/baseline.json --max-regression 20
+
+Each scenario is requested ``--requests`` times through the Flask test
+client, spread over ``--concurrency`` threads, after ``--warmup`` untimed
+requests. Backend reads per request come from the ``Server-Timing``
+header that ``instrumentation`` adds to every response. The page cache is
+off unless ``--page-cache`` is given, so the numbers measure rendering and
+storage rather than cache hits.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SERVER_TIMING = re.compile(r'desc="(\d+) calls, (\d+) reads"')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+def backend_counts(response):
+    match = _SERVER_TIMING.search(response.headers.get('Server-Timing', ''))
+    return (int(match.group(1)), int(match.group(2))) if match else (0, 0)
+
+
+def build_scenarios(summary, deep_page):
+    from models import Media
+    from pagination import page_index
+
+    slugs = summary['published_slugs'][::max(1, len(summary['published_slugs']) // 500)] or ['missing']
+    category_ids = summary['category_ids'] or ['missing']
+    last_page = max(1, -(-len(summary['published_slugs']) // 10))
+    deep = min(deep_page, last_page)
+
+    def cycle(paths):
+        paths = itertools.cycle(paths)
+        lock = threading.Lock()
+
+        def next_path():
+            with lock:
+                return next(paths)
+        return next_path
+
+    # name -> (next path, logged in, reset before each request)
+    return {
+        'index': (cycle(['/']), False, None),
+        'index_deep': (cycle([f'/?page={deep}']), False, None),
+        # Without remembered page boundaries the listing is walked from the start
+        'index_deep_cold': (cycle([f'/?page={deep}']), False, page_index.clear),
+        'view_post': (cycle(f'/post/{slug}' for slug in slugs), False, None),
+        'category_posts': (cycle(f'/category/{category_id}' for category_id in category_ids), False, None),
+        'admin_dashboard': (cycle(['/admin/dashboard']), True, None),
+        'admin_media': (cycle(f'/admin/media?sort={sort}' for sort in Media.SORTS), True, None),
+    }
+
+
+def make_client(app, logged_in):
+    from benchmarks.corpus import ADMIN_ID
+
+    client = app.test_client()
+    if logged_in:
+        with client.session_transaction() as session:
+            session['_user_id'] = ADMIN_ID
+            session['_fresh'] = True
+    return client
+
+
+def run_scenario(app, scenario, requests, concurrency, warmup):
+    next_path, logged_in, reset = scenario
+    local = threading.local()
+
+    def one():
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = make_client(app, logged_in)
+        if reset:
+            reset()
+        path = next_path()
+        start = time.perf_counter()
+        response = client.get(path)
+        elapsed = time.perf_counter() - start
+        calls, reads = backend_counts(response)
+        response.close()
+        return elapsed, response.status_code, calls, reads
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: one(), range(warmup)))
+        started = time.perf_counter()
+        samples = list(pool.map(lambda _: one(), range(requests)))
+        wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed * 1000 for elapsed, _, _, _ in samples)
+    return {
+        'requests': requests,
+        'errors': sum(1 for _, status, _, _ in samples if status != 200),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'rps': round(requests / wall, 1),
+        'calls_per_request': round(sum(calls for _, _, calls, _ in samples) / requests, 2),
+        'reads_per_request': round(sum(reads for _, _, _, reads in samples) / requests, 2)
+    }
+
+
+def _change(new, old):
+    if not old:
+        return ''
+    return f'{(new - old) / old * 100:+.0f}%'
+
+
+def compare(results, baseline, max_regression):
+    """Print the changes against ``baseline``; return the regressions found."""
+    regressions = []
+    print(f"\n{'scenario':<18}{'p50':>16}{'p99':>16}{'rps':>16}{'reads/req':>18}")
+    for name, result in results['scenarios'].items():
+        old = baseline.get('scenarios', {}).get(name)
+        if old is None:
+            print(f'{name:<18}  (not in baseline)')
+            continue
+        print(f"{name:<18}"
+              f"{_change(result['p50_ms'], old['p50_ms']):>16}"
+              f"{_change(result['p99_ms'], old['p99_ms']):>16}"
+              f"{_change(result['rps'], old['rps']):>16}"
+              f"{result['reads_per_request'] - old['reads_per_request']:>+18.2f}")
+        # Reads are deterministic for a given corpus, so any increase counts
+        if result['reads_per_request'] > old['reads_per_request']:
+            regressions.append(f"{name}: {old['reads_per_request']} -> {result['reads_per_request']} reads/request")
+        if max_regression is not None:
+            for key in ('p50_ms', 'p99_ms'):
+                if old[key] and (result[key] - old[key]) / old[key] * 100 > max_regression:
+                    regressions.append(f'{name}: {key} {old[key]} -> {result[key]}')
+    return regressions
+
+
+def add_corpus_arguments(parser):
+    parser.add_argument('--posts', type=int, default=10000)
+    parser.add_argument('--categories', type=int, default=200)
+    parser.add_argument('--images', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the corpus')
+    parser.add_argument('--db', help='corpus database (default: one per corpus size under instance/benchmarks)')
+    parser.add_argument('--page-cache', choices=['off', 'memory'], default='off')
+    parser.add_argument('--backend-latency', type=float, default=0,
+                        help='milliseconds added to every backend call, to stand in for Firestore round trips')
+
+
+def prepare(args):
+    """Point the app at the corpus for ``args``, seeding it on first use.
+
+    Returns ``(environment, summary)``; the environment variables are also
+    set in this process.
+    """
+    db = args.db or os.path.join(ROOT, 'instance', 'benchmarks',
+                                 f'corpus-{args.posts}-{args.categories}-{args.images}-{args.seed}.db')
+    fresh = not os.path.exists(db)
+
+    # The backend, caches and logging read their settings on first use
+    environment = {
+        'STORAGE_BACKEND': 'sqlite',
+        'SQLITE_PATH': db,
+        'PAGE_CACHE': args.page_cache,
+        'SEARCH_INDEX_PATH': os.path.join(tempfile.mkdtemp(prefix='bench-search-'), 'search.db'),
+        'LOG_LEVEL': os.getenv('LOG_LEVEL', 'WARNING'),
+        'BENCH_BACKEND_LATENCY_MS': str(args.backend_latency)
+    }
+    os.environ.update(environment)
+    from backends import get_backend
+    from benchmarks import corpus
+
+    backend = get_backend()
+    if fresh:
+        print(f'Seeding {db} ...', file=sys.stderr)
+        started = time.perf_counter()
+        summary = corpus.seed(backend, posts=args.posts, categories=args.categories, images=args.images,
+                              seed=args.seed)
+        print(f'Seeded in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+    else:
+        summary = corpus.describe(backend)
+    return environment, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the hot routes against a seeded SQLite corpus')
+    add_corpus_arguments(parser)
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--deep-page', type=int, default=500, help='page number used by the deep index scenarios')
+    parser.add_argument('--scenario', action='append', help='run only these scenarios (repeatable)')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against results saved with --save')
+    parser.add_argument('--max-regression', type=float,
+                        help='exit with an error if p50/p99 grow by more than this percentage')
+    args = parser.parse_args(argv)
+
+    _, summary = prepare(args)
+
+    from benchmarks import latency
+    from app import create_app
+    latency.install(args.backend_latency)
+    app = create_app({'TESTING': True, 'WTF_CSRF_ENABLED': False})
+
+    scenarios = build_scenarios(summary, args.deep_page)
+    selected = args.scenario or list(scenarios)
+    unknown = set(selected) - set(scenarios)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    results = {
+        'meta': {
+            'posts': args.posts, 'categories': args.categories, 'images': args.images, 'seed': args.seed,
+            'requests': args.requests, 'concurrency': args.concurrency, 'page_cache': args.page_cache,
+            'backend_latency_ms': args.backend_latency,
+            'python': platform.python_version(), 'machine': platform.machine()
+        },
+        'scenarios': {}
+    }
+    print(f"{'scenario':<18}{'p50 ms':>10}{'p99 ms':>10}{'req/s':>10}{'calls/req':>11}{'reads/req':>11}{'errors':>8}")
+    for name in selected:
+        result = run_scenario(app, scenarios[name], args.requests, args.concurrency, args.warmup)
+        results['scenarios'][name] = result
+        print(f"{name:<18}{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['rps']:>10.1f}"
+              f"{result['calls_per_request']:>11.2f}{result['reads_per_request']:>11.2f}{result['errors']:>8}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('meta', {}).get('posts') != args.posts:
+            print('Warning: the baseline was recorded against a different corpus', file=sys.stderr)
+        regressions = compare(results, baseline, args.max_regression)
+        if regressions:
+            print('\nRegressions:\n  ' + '\n  '.join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Compare throughput of the sync and threaded gunicorn worker modes.
+
+    python -m benchmarks.serving --workers 2 --threads 32 --clients 64 --backend-latency 20
+
+Starts gunicorn over the benchmark corpus once with sync workers and once
+with ``--threads`` threads per worker, drives each with ``--clients``
+concurrent HTTP clients for ``--duration`` seconds, and reports requests
+per second and latency for both. Every backend call is delayed by
+``--backend-latency`` milliseconds to stand in for Firestore round trips;
+without it the SQLite corpus answers too fast for waiting to matter.
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.run import ROOT, add_corpus_arguments, percentile, prepare
+
+
+def wait_until_serving(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited before serving')
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start serving in time')
+
+
+def load(port, paths, clients, duration):
+    """Request ``paths`` round robin from ``clients`` threads for ``duration`` seconds."""
+    paths = itertools.cycle(paths)
+    lock = threading.Lock()
+    samples = []
+    errors = [0]
+    deadline = time.monotonic() + duration
+
+    def client():
+        local_samples = []
+        local_errors = 0
+        while time.monotonic() < deadline:
+            with lock:
+                path = next(paths)
+            start = time.perf_counter()
+            try:
+                # A new connection per request; sync workers close them anyway
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                connection.close()
+                if response.status != 200:
+                    local_errors += 1
+            except OSError:
+                local_errors += 1
+                continue
+            local_samples.append(time.perf_counter() - start)
+        with lock:
+            samples.extend(local_samples)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies = sorted(sample * 1000 for sample in samples)
+    return {
+        'requests': len(samples),
+        'errors': errors[0],
+        'rps': round(len(samples) / wall, 1),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p99_ms': round(percentile(latencies, 99), 3)
+    }
+
+
+def serve_and_load(environment, workers, threads, port, paths, clients, duration):
+    env = dict(os.environ, **environment, WEB_CONCURRENCY=str(workers), WEB_THREADS=str(threads))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '--bind', f'127.0.0.1:{port}', 'benchmarks.wsgi:app'],
+        cwd=ROOT, env=env)
+    try:
+        wait_until_serving(port, process)
+        return load(port, paths, clients, duration)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare sync and threaded gunicorn workers')
+    add_corpus_arguments(parser)
+    parser.set_defaults(backend_latency=20)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes in both modes')
+    parser.add_argument('--threads', type=int, default=32, help='threads per worker in the threaded mode')
+    parser.add_argument('--clients', type=int, default=64, help='concurrent HTTP clients')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load per mode')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--save', help='write the results to this JSON file')
+    args = parser.parse_args(argv)
+
+    environment, summary = prepare(args)
+    slugs = summary['published_slugs'][::max(1, len(summary['published_slugs']) // 500)]
+    # Mostly post pages, with the index and category listings mixed in
+    paths = [f'/post/{slug}' for slug in slugs]
+    paths[::10] = ['/'] * len(paths[::10])
+    paths[5::10] = [f'/category/{category_id}' for category_id, _ in
+                    zip(itertools.cycle(summary['category_ids']), paths[5::10])]
+
+    results = {
+        'meta': {
+            'posts': args.posts, 'workers': args.workers, 'threads': args.threads, 'clients': args.clients,
+            'duration': args.duration, 'backend_latency_ms': args.backend_latency
+        },
+        'modes': {}
+    }
+    print(f"{'mode':<10}{'workers':>9}{'threads':>9}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for mode, threads in (('sync', 1), ('threaded', args.threads)):
+        result = serve_and_load(environment, args.workers, threads, args.port, paths, args.clients, args.duration)
+        results['modes'][mode] = dict(result, threads=threads)
+        print(f"{mode:<10}{args.workers:>9}{threads:>9}{result['rps']:>10.1f}{result['p50_ms']:>10.2f}"
+              f"{result['p99_ms']:>10.2f}{result['errors']:>8}")
+
+    sync_rps = results['modes']['sync']['rps']
+    if sync_rps:
+        print(f"\nThreaded workers served {results['modes']['threaded']['rps'] / sync_rps:.1f}x "
+              f"the requests per second of sync workers")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
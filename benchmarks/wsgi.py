@@ -0,0 +1,13 @@
+"""WSGI entry point serving the app over a benchmark corpus.
+
+``benchmarks.serving`` starts gunicorn with this module after setting
+``STORAGE_BACKEND``/``SQLITE_PATH`` to the corpus and
+``BENCH_BACKEND_LATENCY_MS`` to the simulated round trip.
+"""
+import os
+
+from app import create_app
+from benchmarks import latency
+
+latency.install(float(os.getenv('BENCH_BACKEND_LATENCY_MS', 0)))
+app = create_app()
@@ -0,0 +1,430 @@
+"""Bulk import and export of posts.
+
+Import reads a JSONL file (one post per line) or Markdown files with a
+frontmatter header (a single ``.md`` file, a directory or a ``.zip`` of
+them) and writes posts in backend batches of up to ``BATCH_OPS``
+operations, several batches at a time. Every record gets a stable post id
+(its ``id`` field, or one derived from the archive's name, or a digest of
+its content, and the record's position), and
+the batches that have been committed are recorded in a state file next to
+the archive, so an interrupted import can simply be run again.
+
+Export pages through the posts in timestamp order with a cursor and writes
+them as they arrive, so the collection is never held in memory. A JSONL
+export can be imported again as it is.
+
+    python bulk.py import posts.jsonl --author admin@example.com
+    python bulk.py export posts.jsonl
+    python bulk.py export posts/ --format markdown
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+from backends import get_backend
+from models import Category, User, category_first_pages
+from pagination import page_index
+from rendering import content_hash, render_markdown
+import page_cache
+import search
+import slugs
+
+logger = logging.getLogger(__name__)
+
+# Firestore commits at most 500 writes at once. Each post is two (the post
+# and its slug) and each batch adds one counter update.
+BATCH_OPS = 500
+OPS_PER_POST = 2
+
+EXPORT_PAGE_SIZE = 500
+
+# Stored fields that are derived or only meaningful inside this deployment
+EXPORT_SKIP = ('content_html', 'featured_image_job', 'featured_image_queued_at', 'featured_image_error')
+
+FRONTMATTER_FIELDS = ('id', 'title', 'slug', 'excerpt', 'categories', 'is_published', 'timestamp',
+                      'meta_description', 'author', 'featured_image')
+
+_IMPORT_NAMESPACE = uuid.UUID('8f0c5d1e-3b7a-4c59-9d2e-6a1f4b8c7e30')
+
+
+class BulkImportError(Exception):
+    """A record that cannot be imported; stops the import."""
+
+
+# Archives
+
+def parse_frontmatter(text):
+    """Split a Markdown document into its ``key: value`` header and body."""
+    record = {}
+    body = text
+    if text.startswith('---'):
+        header, sep, rest = text[3:].partition('\n---')
+        if sep:
+            body = rest.split('\n', 1)[1] if '\n' in rest else ''
+            for line in header.strip().splitlines():
+                key, colon, value = line.partition(':')
+                if colon and key.strip():
+                    record[key.strip()] = _frontmatter_value(value.strip())
+    record['content'] = body.lstrip('\n')
+    return record
+
+
+def _frontmatter_value(value):
+    if value.startswith(('[', '"')):
+        # Exported headers are JSON
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    if value.startswith('[') and value.endswith(']'):
+        return [_frontmatter_value(item.strip()) for item in value[1:-1].split(',') if item.strip()]
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+        return value[1:-1]
+    if value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    return value
+
+
+def format_frontmatter(record):
+    """Inverse of ``parse_frontmatter`` for an exported post."""
+    lines = ['---']
+    for key in FRONTMATTER_FIELDS:
+        value = record.get(key)
+        if value is None or value == '':
+            continue
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        elif isinstance(value, list):
+            value = '[' + ', '.join(json.dumps(str(item)) for item in value) + ']'
+        else:
+            value = json.dumps(str(value))
+        lines.append(f'{key}: {value}')
+    lines.append('---')
+    return '\n'.join(lines) + '\n\n' + (record.get('content') or '') + '\n'
+
+
+def read_archive(path):
+    """Iterate over the post records in a JSONL file, Markdown file, directory or zip."""
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.md'):
+                with open(os.path.join(path, name), encoding='utf-8') as f:
+                    yield parse_frontmatter(f.read())
+    elif zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for name in sorted(archive.namelist()):
+                if name.endswith('.md'):
+                    yield parse_frontmatter(archive.read(name).decode('utf-8'))
+    elif path.endswith('.md'):
+        with open(path, encoding='utf-8') as f:
+            yield parse_frontmatter(f.read())
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+# Import
+
+def _parse_time(value):
+    if isinstance(value, datetime):
+        parsed = value
+    elif value:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    else:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class _Importer:
+    """Shared state of one import run: lookups, claimed slugs and progress."""
+
+    def __init__(self, backend, author, state_path, batch_ops):
+        self.backend = backend
+        self.author = author
+        self.state_path = state_path
+        self.batch_ops = batch_ops
+        self.imported = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        self._claimed = set()
+        self._authors = {}
+        self._categories = {}
+        for category in Category.get_all():
+            self._categories[category.id] = category.id
+            if category.name:
+                self._categories[category.name.lower()] = category.id
+        self._done = set()
+        if state_path and os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+            if state.get('batch_ops') == batch_ops:
+                self._done = set(state.get('done', []))
+
+    def is_done(self, number):
+        return number in self._done
+
+    def _mark_done(self, number):
+        with self._lock:
+            self._done.add(number)
+            if self.state_path:
+                tmp_path = f'{self.state_path}.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump({'batch_ops': self.batch_ops, 'done': sorted(self._done)}, f)
+                os.replace(tmp_path, self.state_path)
+
+    def _author(self, value):
+        if isinstance(value, dict):
+            return value
+        if not value:
+            return self.author
+        with self._lock:
+            if value not in self._authors:
+                user = User.find_by('email' if '@' in value else 'username', value)
+                self._authors[value] = {'id': user.id, 'username': user.username,
+                                        'email': user.email} if user else self.author
+            return self._authors[value]
+
+    def _category_ids(self, values):
+        if isinstance(values, str):
+            values = [value.strip() for value in values.split(',') if value.strip()]
+        category_ids = []
+        for value in values or []:
+            with self._lock:
+                category_id = self._categories.get(value) or self._categories.get(str(value).lower())
+                if category_id is None:
+                    category = Category.create(str(value))
+                    if category is None:
+                        raise BulkImportError(f"Could not create category {value}")
+                    category_id = self._categories[category.name.lower()] = category.id
+            category_ids.append(category_id)
+        return category_ids
+
+    def post_data(self, record):
+        content = record.get('content') or ''
+        digest = content_hash(content)
+        timestamp = _parse_time(record.get('timestamp') or record.get('created_at') or record.get('date')) \
+            or datetime.utcnow()
+        return {
+            'title': record.get('title') or '',
+            # Imported slugs are normalised like any other, so they always route
+            'slug': slugs.slugify(record.get('slug') or record.get('title')),
+            'content': content,
+            'content_html': render_markdown(content, digest),
+            'content_hash': digest,
+            'author': self._author(record.get('author')),
+            'categories': self._category_ids(record.get('categories')),
+            'is_published': bool(record.get('is_published', record.get('published', False))),
+            'excerpt': record.get('excerpt') or '',
+            'featured_image': record.get('featured_image') or '',
+            'featured_image_status': 'ready' if record.get('featured_image') else 'none',
+            'featured_image_variants': record.get('featured_image_variants') or {},
+            'featured_image_job': None,
+            'meta_description': record.get('meta_description') or '',
+            'timestamp': timestamp,
+            'created_at': _parse_time(record.get('created_at')) or timestamp,
+            'updated_at': _parse_time(record.get('updated_at')) or timestamp
+        }
+
+    def _assign_slugs(self, posts):
+        """Give each post the first free candidate of its slug."""
+        pending = {post_id: slugs.candidates(data['slug']) for post_id, data in posts}
+        chosen = {post_id: next(candidates) for post_id, candidates in pending.items()}
+        while pending:
+            taken = self.backend.get_slugs(chosen[post_id] for post_id in pending)
+            with self._lock:
+                for post_id in list(pending):
+                    slug = chosen[post_id]
+                    owner = taken.get(slug)
+                    # A slug this post already owns is from an earlier, interrupted run
+                    if owner == post_id or (owner is None and slug not in self._claimed):
+                        self._claimed.add(slug)
+                        del pending[post_id]
+                        continue
+                    try:
+                        chosen[post_id] = next(pending[post_id])
+                    except StopIteration:
+                        raise BulkImportError(f"No free slug for {slug}")
+        for post_id, data in posts:
+            data['slug'] = chosen[post_id]
+
+    def write_batch(self, number, posts, attempts=3):
+        wanted = [data['slug'] for _, data in posts]
+        for attempt in range(1, attempts + 1):
+            try:
+                self._assign_slugs(posts)
+                written = self.backend.create_posts(posts)
+                break
+            except BulkImportError:
+                raise
+            except Exception as e:
+                # Usually a slug claimed by another writer since it was checked
+                logger.warning("Import batch %s attempt %s failed: %s", number, attempt, e)
+                if attempt == attempts:
+                    raise
+                with self._lock:
+                    self._claimed.difference_update(data['slug'] for _, data in posts)
+                for (_, data), slug in zip(posts, wanted):
+                    data['slug'] = slug
+        written_ids = set(written)
+        search.get_index().index_many((post_id, data) for post_id, data in posts if post_id in written_ids)
+        self._mark_done(number)
+        with self._lock:
+            self.imported += len(written)
+            self.skipped += len(posts) - len(written)
+
+
+def file_digest(path):
+    """SHA-256 hex digest of the file at ``path``, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def import_posts(path, author=None, workers=4, batch_ops=BATCH_OPS, state_path=None, resume=True,
+                 source=None):
+    """Import every post in the archive at ``path``; returns ``(imported, skipped)``.
+
+    ``author`` (a ``User``) is credited for records without an ``author``.
+    Posts whose id already exists are skipped, which makes re-running an
+    import safe. Records without an ``id`` get one derived from ``source``
+    (by default the archive's file name) and their position, so pass a
+    stable ``source`` when ``path`` is a temporary copy.
+    """
+    backend = get_backend()
+    per_batch = max(1, (batch_ops - 1) // OPS_PER_POST)
+    state_path = state_path or f'{path.rstrip(os.sep)}.import-state.json'
+    if not resume and os.path.exists(state_path):
+        os.remove(state_path)
+    default_author = {'id': author.id, 'username': author.username, 'email': author.email} if author else {}
+    importer = _Importer(backend, default_author, state_path, batch_ops)
+    source = source or os.path.basename(path.rstrip(os.sep))
+
+    def batches():
+        batch = []
+        number = 0
+        for position, record in enumerate(read_archive(path)):
+            post_id = str(record.get('id') or uuid.uuid5(_IMPORT_NAMESPACE, f'{source}:{position}'))
+            batch.append((post_id, record))
+            if len(batch) == per_batch:
+                yield number, batch
+                batch, number = [], number + 1
+        if batch:
+            yield number, batch
+
+    def run(number, records):
+        importer.write_batch(number, [(post_id, importer.post_data(record)) for post_id, record in records])
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import') as executor:
+            in_flight = set()
+            for number, records in batches():
+                if importer.is_done(number):
+                    continue
+                # Keep a bounded number of batches in memory
+                if len(in_flight) >= workers * 2:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                in_flight.add(executor.submit(run, number, records))
+            for future in in_flight:
+                future.result()
+    finally:
+        if importer.imported:
+            page_index.clear()
+            category_first_pages.clear()
+            page_cache.purge('posts')
+
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return importer.imported, importer.skipped
+
+
+# Export
+
+def _export_record(post_id, post_data):
+    record = {'id': post_id}
+    for key, value in post_data.items():
+        if key in EXPORT_SKIP:
+            continue
+        record[key] = value.isoformat() if isinstance(value, datetime) else value
+    return record
+
+
+def iter_posts(published_only=False, page_size=EXPORT_PAGE_SIZE):
+    """Every post as an export record, newest first, one page in memory at a time."""
+    backend = get_backend()
+    after = None
+    while True:
+        page = backend.list_posts(page_size, after=after, published_only=published_only)
+        for post_id, post_data in page:
+            yield _export_record(post_id, post_data)
+        if len(page) < page_size:
+            return
+        post_id, post_data = page[-1]
+        after = (post_data.get('timestamp'), post_id)
+
+
+def iter_jsonl(published_only=False):
+    for record in iter_posts(published_only=published_only):
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def export_posts(path, format='jsonl', published_only=False):
+    """Write every post to ``path`` (a JSONL file, or a directory for ``markdown``); returns the count."""
+    count = 0
+    if format == 'markdown':
+        os.makedirs(path, exist_ok=True)
+        for record in iter_posts(published_only=published_only):
+            author = record.get('author') or {}
+            if isinstance(author, dict):
+                record['author'] = author.get('email') or author.get('username')
+            with open(os.path.join(path, f"{record.get('slug') or record['id']}.md"), 'w', encoding='utf-8') as f:
+                f.write(format_frontmatter(record))
+            count += 1
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in iter_jsonl(published_only=published_only):
+                f.write(line)
+                count += 1
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bulk import and export of posts')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    import_parser = subparsers.add_parser('import', help='import a JSONL file or Markdown files')
+    import_parser.add_argument('path', help='.jsonl file, .md file, directory of .md files or .zip of them')
+    import_parser.add_argument('--author', help='email or username credited for records without an author')
+    import_parser.add_argument('--workers', type=int, default=4, help='batches written in parallel')
+    import_parser.add_argument('--batch-ops', type=int, default=BATCH_OPS, help='write operations per batch')
+    import_parser.add_argument('--restart', action='store_true', help='ignore the state of an interrupted run')
+    export_parser = subparsers.add_parser('export', help='export every post')
+    export_parser.add_argument('path', help='output .jsonl file, or directory for --format markdown')
+    export_parser.add_argument('--format', choices=['jsonl', 'markdown'], default='jsonl')
+    export_parser.add_argument('--published-only', action='store_true')
+
+    args = parser.parse_args()
+    if args.command == 'import':
+        author = None
+        if args.author:
+            author = User.find_by('email' if '@' in args.author else 'username', args.author)
+            if author is None:
+                parser.error(f"No user {args.author}")
+        imported, skipped = import_posts(args.path, author=author, workers=args.workers,
+                                         batch_ops=args.batch_ops, resume=not args.restart)
+        print(f"Imported {imported} posts, skipped {skipped} that already existed")
+    else:
+        print(f"Exported {export_posts(args.path, args.format, args.published_only)} posts")
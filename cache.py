@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Small thread-safe LRU cache whose entries expire after ``ttl`` seconds.
+
+    ``on_evict(key, value)`` is called, outside the cache's lock, for each
+    entry dropped because it expired or the cache was full.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at > time.monotonic():
+                self._data.move_to_end(key)
+                return value
+            del self._data[key]
+        self._evicted([(key, value)])
+        return default
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        evicted = []
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted_key, (evicted_value, _) = self._data.popitem(last=False)
+                evicted.append((evicted_key, evicted_value))
+        self._evicted(evicted)
+
+    def _evicted(self, items):
+        if self.on_evict is not None:
+            for key, value in items:
+                self.on_evict(key, value)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+_MISSING = object()
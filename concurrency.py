@@ -0,0 +1,72 @@
+"""Run a view's independent backend reads at the same time.
+
+Reads are blocking network calls, so a view that makes three of them waits
+for the sum of their round trips. ``gather`` runs them on a shared,
+bounded thread pool and waits for all of them, so the view waits for the
+slowest one instead:
+
+    post, categories = concurrency.gather(lambda: Post.get(post_id), Category.get_all)
+
+Each call runs in a copy of the caller's context, so it sees the current
+Flask app and request and its backend calls are counted against the
+request by ``instrumentation``.
+"""
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+DEFAULT_TIMEOUT = float(os.getenv('FANOUT_TIMEOUT', 10))
+
+# Set inside pool threads so nested gathers run inline instead of waiting
+# on a pool their own caller may have filled
+_in_pool = contextvars.ContextVar('in_fanout_pool', default=False)
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+
+def _pool():
+    global _executor, _executor_pid
+    # Threads do not survive a fork, so each worker builds its own pool
+    if _executor is None or _executor_pid != os.getpid():
+        with _lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(max_workers=int(os.getenv('FANOUT_WORKERS', 16)),
+                                               thread_name_prefix='fanout')
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def _run(fn):
+    _in_pool.set(True)
+    return fn()
+
+
+def submit(fn):
+    """Start ``fn()`` on the shared pool in a copy of the current context; returns a Future."""
+    return _pool().submit(contextvars.copy_context().run, _run, fn)
+
+
+def gather(*calls, timeout=DEFAULT_TIMEOUT):
+    """Call every zero-argument callable in ``calls`` concurrently and return their results in order.
+
+    ``timeout`` (seconds) applies to each call; a call that takes longer
+    raises ``TimeoutError``. The first exception raised by a call is
+    re-raised here once it is reached.
+    """
+    if _in_pool.get() or len(calls) < 2:
+        return [call() for call in calls]
+
+    futures = [submit(call) for call in calls]
+    # The calls start together, so each one's timeout ends at the same moment
+    deadline = time.monotonic() + timeout
+    try:
+        return [future.result(timeout=max(deadline - time.monotonic(), 0)) for future in futures]
+    except TimeoutError:
+        raise TimeoutError(f"Backend call did not finish within {timeout}s")
+    finally:
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,73 @@
+"""Conditional GET support for public pages.
+
+Views compute a validator from data they already loaded and call
+``check()`` before rendering; a matching ``If-None-Match`` or
+``If-Modified-Since`` is answered with an empty 304, so no template or
+markdown work happens for clients that already hold the page.
+"""
+import hashlib
+import os
+from datetime import timezone
+
+from flask import current_app, g, request, session
+from flask_login import current_user
+
+from rendering import RENDER_VERSION
+
+VALIDATORS_ATTR = 'validators'
+
+
+def _utc(value):
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def make_etag(*parts):
+    """Strong ETag for a page built from ``parts``.
+
+    The viewer is part of the tag because pages differ for signed-in users,
+    and ``ETAG_VERSION`` can be bumped when a deploy changes the templates.
+    """
+    viewer = current_user.get_id() if current_user.is_authenticated else 'anonymous'
+    payload = repr((os.getenv('ETAG_VERSION', '1'), RENDER_VERSION, viewer) + parts)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def check(etag, last_modified=None):
+    """Return a 304 response if the client's copy is current, otherwise None.
+
+    The validators are remembered and added to the full response by
+    ``add_validators``. Pages with pending flash messages get neither.
+    """
+    if request.method not in ('GET', 'HEAD') or '_flashes' in session:
+        return None
+    last_modified = _utc(last_modified).replace(microsecond=0) if last_modified else None
+    g.setdefault(VALIDATORS_ATTR, (etag, last_modified))
+
+    if request.if_none_match:
+        # If-None-Match takes precedence over If-Modified-Since
+        fresh = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified:
+        fresh = last_modified <= _utc(request.if_modified_since)
+    else:
+        fresh = False
+    if not fresh:
+        return None
+
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+
+def add_validators(response):
+    """``after_request`` hook putting the validators from ``check()`` on 200 responses."""
+    validators = g.get(VALIDATORS_ATTR)
+    if validators and response.status_code == 200:
+        etag, last_modified = validators
+        response.set_etag(etag)
+        if last_modified:
+            response.last_modified = last_modified
+    return response
@@ -1,19 +1,14 @@
 from models import User
-from firebase_config import db, auth_instance
 import argparse
 
 def create_admin_user(username, email, password):
     try:
         # Check if user already exists
-        users_ref = db.collection('users')
-        username_query = users_ref.where('username', '==', username).limit(1).get()
-        email_query = users_ref.where('email', '==', email).limit(1).get()
-        
-        if len(list(username_query)):
+        if User.find_by('username', username):
             print("Error: Username already taken!")
             return
             
-        if len(list(email_query)):
+        if User.find_by('email', email):
             print("Error: Email already registered!")
             return
         
@@ -1,50 +1,130 @@
-import firebase_admin
-from firebase_admin import credentials, firestore, auth, storage
-import pyrebase
+"""Firebase clients, created on first use.
+
+Nothing here talks to Firebase at import time. Each process builds its
+clients the first time they are asked for, so Gunicorn workers create
+their own after the fork and CLI scripts that never touch Firebase do not
+pay for it.
+"""
 import os
+import threading
+
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Firebase Admin SDK Configuration
-cred = credentials.Certificate({
-    "type": os.getenv('FIREBASE_TYPE'),
-    "project_id": os.getenv('FIREBASE_PROJECT_ID'),
-    "private_key_id": os.getenv('FIREBASE_PRIVATE_KEY_ID'),
-    "private_key": os.getenv('FIREBASE_PRIVATE_KEY'),
-    "client_email": os.getenv('FIREBASE_CLIENT_EMAIL'),
-    "client_id": os.getenv('FIREBASE_CLIENT_ID'),
-    "auth_uri": os.getenv('FIREBASE_AUTH_URI'),
-    "token_uri": os.getenv('FIREBASE_TOKEN_URI'),
-    "auth_provider_x509_cert_url": os.getenv('FIREBASE_AUTH_PROVIDER_CERT_URL'),
-    "client_x509_cert_url": os.getenv('FIREBASE_CLIENT_CERT_URL')
-})
-
-# Initialize Firebase Admin
-try:
-    firebase_admin.initialize_app(cred, {
-        'storageBucket': os.getenv('FIREBASE_STORAGE_BUCKET')
+_lock = threading.RLock()
+_clients = {}
+_pid = None
+
+
+def _client(name, factory):
+    """Return the process-wide client ``name``, building it with ``factory`` once per process."""
+    global _pid
+    if _pid != os.getpid():
+        # Forked from a process that already had clients; their channels
+        # are not safe to share, so start over
+        with _lock:
+            if _pid != os.getpid():
+                _clients.clear()
+                _pid = os.getpid()
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+
+def _create_app():
+    import firebase_admin
+    from firebase_admin import credentials
+
+    # Firebase Admin SDK Configuration
+    cred = credentials.Certificate({
+        "type": os.getenv('FIREBASE_TYPE'),
+        "project_id": os.getenv('FIREBASE_PROJECT_ID'),
+        "private_key_id": os.getenv('FIREBASE_PRIVATE_KEY_ID'),
+        "private_key": os.getenv('FIREBASE_PRIVATE_KEY'),
+        "client_email": os.getenv('FIREBASE_CLIENT_EMAIL'),
+        "client_id": os.getenv('FIREBASE_CLIENT_ID'),
+        "auth_uri": os.getenv('FIREBASE_AUTH_URI'),
+        "token_uri": os.getenv('FIREBASE_TOKEN_URI'),
+        "auth_provider_x509_cert_url": os.getenv('FIREBASE_AUTH_PROVIDER_CERT_URL'),
+        "client_x509_cert_url": os.getenv('FIREBASE_CLIENT_CERT_URL')
     })
-except ValueError:
-    # App already initialized
-    pass
-
-# Get Firestore database instance
-db = firestore.client()
-
-# Pyrebase Configuration for client-side operations
-firebase_config = {
-    "apiKey": os.getenv('FIREBASE_API_KEY'),
-    "authDomain": os.getenv('FIREBASE_AUTH_DOMAIN'),
-    "projectId": os.getenv('FIREBASE_PROJECT_ID'),
-    "storageBucket": os.getenv('FIREBASE_STORAGE_BUCKET'),
-    "messagingSenderId": os.getenv('FIREBASE_MESSAGING_SENDER_ID'),
-    "appId": os.getenv('FIREBASE_APP_ID'),
-    "databaseURL": os.getenv('FIREBASE_DATABASE_URL')
+
+    options = {'storageBucket': os.getenv('FIREBASE_STORAGE_BUCKET')}
+
+    # Initialize Firebase Admin
+    try:
+        return firebase_admin.initialize_app(cred, options)
+    except ValueError:
+        # Initialized before a fork. firebase_admin caches the Firestore and
+        # Storage clients on the app, so reusing it would share the parent's
+        # channels; replace it so this process builds its own.
+        firebase_admin.delete_app(firebase_admin.get_app())
+        return firebase_admin.initialize_app(cred, options)
+
+
+def _create_pyrebase():
+    import pyrebase
+
+    # Pyrebase Configuration for client-side operations
+    firebase_config = {
+        "apiKey": os.getenv('FIREBASE_API_KEY'),
+        "authDomain": os.getenv('FIREBASE_AUTH_DOMAIN'),
+        "projectId": os.getenv('FIREBASE_PROJECT_ID'),
+        "storageBucket": os.getenv('FIREBASE_STORAGE_BUCKET'),
+        "messagingSenderId": os.getenv('FIREBASE_MESSAGING_SENDER_ID'),
+        "appId": os.getenv('FIREBASE_APP_ID'),
+        "databaseURL": os.getenv('FIREBASE_DATABASE_URL')
+    }
+    return pyrebase.initialize_app(firebase_config)
+
+
+def get_app():
+    """The Firebase Admin app."""
+    return _client('app', _create_app)
+
+
+def get_db():
+    """The Firestore client."""
+    def create():
+        from firebase_admin import firestore
+        return firestore.client(app=get_app())
+    return _client('db', create)
+
+
+def get_bucket():
+    """The default Firebase Storage bucket."""
+    def create():
+        from firebase_admin import storage
+        return storage.bucket(app=get_app())
+    return _client('bucket', create)
+
+
+def get_auth():
+    """Pyrebase auth, used for email/password sign-in."""
+    return _client('auth', lambda: _client('pyrebase', _create_pyrebase).auth())
+
+
+def get_storage():
+    """Pyrebase storage."""
+    return _client('storage', lambda: _client('pyrebase', _create_pyrebase).storage())
+
+
+_LEGACY_NAMES = {
+    'db': get_db,
+    'auth_instance': get_auth,
+    'storage_instance': get_storage
 }
 
-# Initialize Pyrebase
-firebase = pyrebase.initialize_app(firebase_config)
-auth_instance = firebase.auth()
-storage_instance = firebase.storage()
+
+def __getattr__(name):
+    # Keeps ``from firebase_config import db`` working for older scripts;
+    # the client is still only built when the name is imported.
+    if name in _LEGACY_NAMES:
+        return _LEGACY_NAMES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,9 +1,9 @@
+from flask import g
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
 from wtforms import StringField, TextAreaField, PasswordField, BooleanField, SelectMultipleField, SubmitField, SelectField
 from wtforms.validators import DataRequired, Email, Length, EqualTo, ValidationError, URL, Optional
 from models import User, Category
-from firebase_config import db
 
 class LoginForm(FlaskForm):
     email = StringField('Email', 
@@ -37,19 +37,24 @@ class RegistrationForm(FlaskForm):
     submit = SubmitField('Sign Up')
 
     def validate_username(self, username):
-        # Check if username exists in Firestore
-        users_ref = db.collection('users')
-        query = users_ref.where('username', '==', username.data).limit(1).get()
-        if len(list(query)):
+        if User.find_by('username', username.data):
             raise ValidationError('That username is already taken. Please choose another.')
 
     def validate_email(self, email):
-        # Check if email exists in Firestore
-        users_ref = db.collection('users')
-        query = users_ref.where('email', '==', email.data).limit(1).get()
-        if len(list(query)):
+        if User.find_by('email', email.data):
             raise ValidationError('That email is already registered. Please use a different email.')
 
+def category_choices():
+    """``(id, name)`` choices for category pickers.
+
+    Taken from the category registry, which is shared across requests and
+    invalidated on category writes, once per request, so building and
+    validating a form in the same request see the same choices.
+    """
+    if 'category_choices' not in g:
+        g.category_choices = [(c.id, c.name) for c in Category.get_all_cached()]
+    return g.category_choices
+
 class PostForm(FlaskForm):
     title = StringField('Title', validators=[DataRequired(), Length(min=1, max=200)])
     content = TextAreaField('Content', validators=[DataRequired()])
@@ -65,11 +70,13 @@ class PostForm(FlaskForm):
     meta_description = TextAreaField('Meta Description', validators=[Optional(), Length(max=160)])
     submit = SubmitField('Submit')
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, categories=None, **kwargs):
         super(PostForm, self).__init__(*args, **kwargs)
-        # Dynamically populate categories from Firebase
-        categories = Category.get_all()
-        self.categories.choices = [(c.id, c.name) for c in categories]
+        # Choices come from the category registry unless the view passes categories
+        if categories is None:
+            self.categories.choices = category_choices()
+        else:
+            self.categories.choices = [(c.id, c.name) for c in categories]
 
     def get_tags_list(self):
         if self.tags.data:
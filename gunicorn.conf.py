@@ -0,0 +1,15 @@
+"""Gunicorn settings.
+
+``WEB_CONCURRENCY`` sets the number of worker processes. With
+``WEB_THREADS`` above 1 each worker serves that many requests at once on
+threads (the ``gthread`` worker), which suits this app: a blog request
+spends nearly all of its time waiting on Firestore and Storage, and a
+thread waiting on the network costs far less than another worker process.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+threads = int(os.getenv('WEB_THREADS', 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
@@ -0,0 +1,79 @@
+"""Resized derivatives of uploaded images.
+
+Each variant is produced as WebP and JPEG so templates can offer WebP
+through ``srcset`` with a JPEG fallback. Images are never upscaled.
+"""
+import io
+import os
+
+from PIL import Image, ImageOps
+
+# Variant name -> target width in pixels
+VARIANTS = {
+    'thumb': 160,
+    'card': 400,
+    'hero': 1200
+}
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg')
+}
+
+QUALITY = 82
+
+# What resizing raises for files that are not images, are corrupt, or decode
+# to more pixels than Image.MAX_IMAGE_PIXELS allows
+IMAGE_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+# Derivative names include the upload's job id, so their content never changes
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+def make_variants(path):
+    """Yield ``(variant, fmt, width, height, content_type, fileobj)`` for every derivative."""
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'L'):
+            # JPEG has no alpha channel; flatten onto white
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.convert('RGBA').split()[-1])
+            image = background
+        elif image.mode == 'L':
+            image = image.convert('RGB')
+
+        for variant, width in VARIANTS.items():
+            resized = image.copy()
+            if resized.width > width:
+                height = round(resized.height * width / resized.width)
+                resized = resized.resize((width, height), Image.LANCZOS)
+            for fmt, (pil_format, content_type) in FORMATS.items():
+                out = io.BytesIO()
+                resized.save(out, pil_format, quality=QUALITY, optimize=True)
+                out.seek(0)
+                yield variant, fmt, resized.width, resized.height, content_type, out
+
+
+def variant_name(name, variant, fmt):
+    """Storage name of a derivative of ``name``."""
+    stem = os.path.splitext(name)[0]
+    return f"{stem}-{variant}.{fmt}"
+
+
+def variant_names(name):
+    """Storage names of every derivative of ``name``."""
+    return [variant_name(name, variant, fmt) for variant in VARIANTS for fmt in FORMATS]
+
+
+def store_variants(store, path, name):
+    """Generate and store every derivative of the image at ``path``.
+
+    Returns ``{variant: {'width': ..., 'webp': url, 'jpeg': url}}``.
+    """
+    variants = {}
+    for variant, fmt, width, height, content_type, fileobj in make_variants(path):
+        derived = variant_name(name, variant, fmt)
+        store.save(derived, fileobj, content_type=content_type, cache_control=CACHE_CONTROL)
+        entry = variants.setdefault(variant, {'width': width, 'height': height})
+        entry[fmt] = store.public_url(derived)
+    return variants
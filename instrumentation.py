@@ -0,0 +1,349 @@
+"""Per-request instrumentation.
+
+Every storage backend call, template render and markdown conversion is
+timed and counted against the request that made it. At the end of a
+request the totals are sent back in a ``Server-Timing`` header, written
+as one structured log line and folded into per-route histograms that
+``/metrics`` serves in the Prometheus text format when ``METRICS_TOKEN``
+is set.
+
+Metrics are kept per process; with several Gunicorn workers each one
+reports its own, so scrape them individually or aggregate in Prometheus.
+"""
+import contextvars
+import functools
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from flask import Response, abort, before_render_template, g, request, template_rendered
+
+logger = logging.getLogger('blog.requests')
+
+# Backend methods that read; everything else counts as a write
+READ_PREFIXES = ('get_', 'list_', 'stream_', 'find_', 'count_', 'post_uses_')
+
+# Batch reads returning ``{id: data}``; each document found is one read
+BATCH_READS = ('get_posts', 'get_users', 'get_slugs')
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Timings and counters of one request.
+
+    Worker threads started with a copy of the request's context add to the
+    same object, hence the lock.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = Counter()
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds, **counts):
+        with self._lock:
+            self.seconds[name] += seconds
+            self.counts.update(counts)
+
+
+def current():
+    """Metrics of the request being served, or None outside a request."""
+    return _current.get()
+
+
+class timed:
+    """Context manager adding the time spent in its block to ``name``."""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        metrics = current()
+        if metrics is not None:
+            metrics.add(self.name, time.perf_counter() - self._start)
+        return False
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames, buckets):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += 1
+            series[2] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, (buckets, count, total) in sorted(self._series.items()):
+                label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+                sep = ',' if label_text else ''
+                for bound, bucket_count in zip(self.buckets, buckets):
+                    lines.append(f'{self.name}_bucket{{{label_text}{sep}le="{bound}"}} {bucket_count}')
+                lines.append(f'{self.name}_bucket{{{label_text}{sep}le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{label_text}}} {total}')
+                lines.append(f'{self.name}_count{{{label_text}}} {count}')
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help, labelnames):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, labels, value=1):
+        with self._lock:
+            self._values[labels] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                label_text = ','.join(f'{name}="{_escape(v)}"' for name, v in zip(self.labelnames, labels))
+                lines.append(f'{self.name}{{{label_text}}} {value}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REQUEST_SECONDS = Histogram('blog_request_duration_seconds', 'Time spent serving a request',
+                            ('route', 'method'), DURATION_BUCKETS)
+BACKEND_SECONDS = Histogram('blog_backend_duration_seconds', 'Time spent in storage backend calls per request',
+                            ('route',), DURATION_BUCKETS)
+BACKEND_READS = Histogram('blog_backend_reads', 'Records read from the storage backend per request',
+                          ('route',), COUNT_BUCKETS)
+RENDER_SECONDS = Histogram('blog_render_duration_seconds', 'Time spent rendering templates per request',
+                           ('route',), DURATION_BUCKETS)
+BACKEND_CALLS = CounterMetric('blog_backend_calls_total', 'Storage backend calls by operation',
+                              ('operation',))
+BACKEND_ERRORS = CounterMetric('blog_backend_errors_total', 'Storage backend calls that raised, by operation',
+                               ('operation',))
+REQUESTS = CounterMetric('blog_requests_total', 'Requests served', ('route', 'method', 'status'))
+
+REGISTRY = (REQUEST_SECONDS, BACKEND_SECONDS, BACKEND_READS, RENDER_SECONDS, BACKEND_CALLS, BACKEND_ERRORS,
+            REQUESTS)
+
+
+def _record_call(operation, seconds, records, failed=False):
+    BACKEND_CALLS.inc((operation,))
+    if failed:
+        BACKEND_ERRORS.inc((operation,))
+    metrics = current()
+    if metrics is None:
+        return
+    if failed:
+        # The time spent waiting still counts against the request
+        metrics.add('backend', seconds, backend_calls=1, backend_errors=1)
+    elif operation.startswith(READ_PREFIXES):
+        # Firestore bills at least one read per query, even an empty one
+        metrics.add('backend', seconds, backend_calls=1, backend_reads=max(records, 1))
+    else:
+        metrics.add('backend', seconds, backend_calls=1, backend_writes=1)
+
+
+class InstrumentedBackend:
+    """Wraps a storage backend so every call is timed and counted."""
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def __getattr__(self, name):
+        attr = getattr(self._backend, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        if name.startswith('stream_'):
+            @functools.wraps(attr)
+            def call(*args, **kwargs):
+                return self._stream(name, attr(*args, **kwargs))
+        else:
+            @functools.wraps(attr)
+            def call(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    result = attr(*args, **kwargs)
+                except Exception:
+                    _record_call(name, time.perf_counter() - start, 0, failed=True)
+                    raise
+                records = len(result) if isinstance(result, list) or name in BATCH_READS else 1
+                _record_call(name, time.perf_counter() - start, records)
+                return result
+
+        # Later lookups skip __getattr__
+        setattr(self, name, call)
+        return call
+
+    @staticmethod
+    def _stream(name, iterator):
+        seconds = 0.0
+        records = 0
+        failed = False
+        iterator = iter(iterator)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                except Exception:
+                    failed = True
+                    raise
+                finally:
+                    seconds += time.perf_counter() - start
+                records += 1
+                yield item
+        finally:
+            _record_call(name, seconds, records, failed=failed)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any ``fields`` passed through ``extra``."""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging():
+    """Set up the root logger from ``LOG_LEVEL`` and ``LOG_FORMAT`` (``json`` or ``text``)."""
+    root = logging.getLogger()
+    if getattr(root, '_blog_configured', False):
+        return
+    handler = logging.StreamHandler()
+    if os.getenv('LOG_FORMAT', 'json') == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s %(message)s'))
+    root.addHandler(handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    root._blog_configured = True
+
+
+def _start_request():
+    g._metrics_token = _current.set(RequestMetrics())
+
+
+def _start_render(sender, template, context, **extra):
+    metrics = current()
+    if metrics is not None:
+        g.setdefault('_render_started', []).append(time.perf_counter())
+
+
+def _finish_render(sender, template, context, **extra):
+    metrics = current()
+    started = g.get('_render_started')
+    if metrics is not None and started:
+        metrics.add('render', time.perf_counter() - started.pop())
+
+
+def _server_timing(metrics, total):
+    calls = metrics.counts['backend_calls']
+    reads = metrics.counts['backend_reads']
+    parts = [f'db;dur={metrics.seconds["backend"] * 1000:.1f};desc="{calls} calls, {reads} reads"']
+    for name in ('render', 'markdown'):
+        if name in metrics.seconds:
+            parts.append(f'{name};dur={metrics.seconds[name] * 1000:.1f}')
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def _finish_request(response):
+    metrics = current()
+    if metrics is None:
+        return response
+    total = time.perf_counter() - metrics.started
+    route = request.endpoint or 'unmatched'
+
+    REQUEST_SECONDS.observe((route, request.method), total)
+    REQUESTS.inc((route, request.method, str(response.status_code)))
+    if route != 'metrics':
+        BACKEND_SECONDS.observe((route,), metrics.seconds['backend'])
+        BACKEND_READS.observe((route,), metrics.counts['backend_reads'])
+        RENDER_SECONDS.observe((route,), metrics.seconds['render'])
+
+    response.headers['Server-Timing'] = _server_timing(metrics, total)
+    logger.info('request', extra={'fields': {
+        'method': request.method,
+        'path': request.path,
+        'route': route,
+        'status': response.status_code,
+        'duration_ms': round(total * 1000, 2),
+        'backend_ms': round(metrics.seconds['backend'] * 1000, 2),
+        'backend_calls': metrics.counts['backend_calls'],
+        'backend_reads': metrics.counts['backend_reads'],
+        'backend_writes': metrics.counts['backend_writes'],
+        'backend_errors': metrics.counts['backend_errors'],
+        'render_ms': round(metrics.seconds['render'] * 1000, 2),
+        'markdown_ms': round(metrics.seconds['markdown'] * 1000, 2),
+        'cache': response.headers.get('X-Cache')
+    }})
+    return response
+
+
+def _end_request(exc=None):
+    token = g.pop('_metrics_token', None)
+    if token is not None:
+        _current.reset(token)
+
+
+def metrics_view():
+    # Off unless a token is configured, and then only served to its bearer
+    token = os.getenv('METRICS_TOKEN')
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """Instrument ``app`` and serve ``/metrics``."""
+    configure_logging()
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_end_request)
+    before_render_template.connect(_start_render, app)
+    template_rendered.connect(_finish_render, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,157 @@
+"""Blob storage for uploaded media.
+
+Firestore only keeps metadata (size, content type, hash, dimensions); the
+bytes live in Firebase Storage or, for tests and single-node setups, in a
+local directory. Both backends stream files in fixed-size chunks so a
+worker never holds a whole image in memory.
+"""
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+
+from firebase_config import get_bucket
+from PIL import Image, UnidentifiedImageError
+
+CHUNK_SIZE = 64 * 1024
+
+
+class LocalMediaStore:
+    """Stores media under a directory on the local filesystem."""
+
+    def __init__(self, root, base_url='/admin/media/'):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, name):
+        path = os.path.abspath(os.path.join(self.root, name))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid media path: {name}")
+        return path
+
+    def save(self, name, fileobj, content_type=None, cache_control=None):
+        # Cache headers are set by the route that serves local files
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so readers never see partial files
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                shutil.copyfileobj(fileobj, out, CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def open(self, name):
+        """Return ``(chunks, size)`` for a stored file, or None if it does not exist."""
+        path = self._path(name)
+        if not os.path.isfile(path):
+            return None
+
+        def chunks():
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        return chunks(), os.path.getsize(path)
+
+    def delete(self, name):
+        try:
+            os.unlink(self._path(name))
+        except FileNotFoundError:
+            pass
+
+    def public_url(self, name):
+        """URL of a stored file, served by the admin.serve_media route."""
+        return self.base_url + name
+
+
+class FirebaseMediaStore:
+    """Stores media in the default Firebase Storage bucket."""
+
+    def save(self, name, fileobj, content_type=None, cache_control=None):
+        blob = get_bucket().blob(name)
+        if cache_control:
+            blob.cache_control = cache_control
+        blob.upload_from_file(fileobj, content_type=content_type)
+
+    def open(self, name):
+        """Return ``(chunks, size)`` for a stored file, or None if it does not exist."""
+        blob = get_bucket().get_blob(name)
+        if blob is None:
+            return None
+
+        def chunks():
+            with blob.open('rb', chunk_size=CHUNK_SIZE) as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+
+        return chunks(), blob.size
+
+    def delete(self, name):
+        blob = get_bucket().blob(name)
+        if blob.exists():
+            blob.delete()
+
+    def public_url(self, name):
+        """Make a stored file publicly readable and return its URL."""
+        blob = get_bucket().blob(name)
+        blob.make_public()
+        return blob.public_url
+
+
+_store = None
+
+
+def get_media_store():
+    """The media store selected by ``MEDIA_BACKEND`` (``firebase`` or ``local``)."""
+    global _store
+    if _store is None:
+        if os.getenv('MEDIA_BACKEND', 'firebase') == 'local':
+            default_root = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'media')
+            _store = LocalMediaStore(os.getenv('MEDIA_ROOT', default_root),
+                                     base_url=os.getenv('MEDIA_URL', '/admin/media/'))
+        else:
+            _store = FirebaseMediaStore()
+    return _store
+
+
+def describe(fileobj):
+    """Size, SHA-256 and image dimensions of an upload, read in chunks.
+
+    Leaves the file positioned at the start so it can be stored afterwards.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    fileobj.seek(0)
+    while True:
+        chunk = fileobj.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+
+    width = height = None
+    fileobj.seek(0)
+    try:
+        # Only the header is parsed; pixel data is not decoded
+        with Image.open(fileobj) as image:
+            width, height = image.size
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        pass
+    fileobj.seek(0)
+
+    return {'size': size, 'sha256': digest.hexdigest(), 'width': width, 'height': height}
+
+
+def guess_content_type(name):
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
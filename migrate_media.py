@@ -0,0 +1,13 @@
+from models import Media
+import media_storage
+
+def migrate_media():
+    try:
+        store = media_storage.get_media_store()
+        migrated = Media.migrate_legacy(store)
+        print(f"Moved {migrated} image(s) out of Firestore into the media store.")
+    except Exception as e:
+        print(f"Error: {str(e)}")
+
+if __name__ == "__main__":
+    migrate_media()
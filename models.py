@@ -1,10 +1,52 @@
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+import threading
+import time
 from flask_login import UserMixin
-from firebase_admin import storage, firestore
-from firebase_config import db, auth_instance
+from firebase_config import get_auth
+from backends import get_backend
 import uuid
 import base64
+import io
 from werkzeug.utils import secure_filename
+from pagination import encode_cursor, decode_cursor, encode_token, decode_token, page_index
+from cache import TTLCache
+from rendering import content_hash, render_markdown
+import media_storage
+import uploads
+import imaging
+import page_cache
+import slugs
+import search
+
+logger = logging.getLogger(__name__)
+
+# Users loaded by Flask-Login on every authenticated request. Entries are
+# dropped when a user's role changes; other workers see it within the TTL.
+user_cache = TTLCache(
+    maxsize=int(os.getenv('USER_CACHE_SIZE', 1024)),
+    ttl=int(os.getenv('USER_CACHE_TTL', 60))
+)
+
+# First page of each category listing, keyed by category id
+category_first_pages = TTLCache(
+    maxsize=int(os.getenv('CATEGORY_PAGE_CACHE_SIZE', 512)),
+    ttl=int(os.getenv('CATEGORY_PAGE_CACHE_TTL', 60))
+)
+
+# A featured image still pending after this many seconds was lost, for
+# example to a worker restart; the upload queue only lives in memory
+FEATURED_IMAGE_TIMEOUT = int(os.getenv('FEATURED_IMAGE_TIMEOUT', 900))
+STALLED_UPLOAD_ERROR = 'the upload did not finish; please choose the image again'
+
+# Post slug (current or former) -> post id. Slugs are never reassigned while
+# their post exists, so entries only go stale when a post is deleted; delete
+# drops them here and ``Post.resolve`` re-checks any that point at a missing post.
+slug_cache = TTLCache(
+    maxsize=int(os.getenv('SLUG_CACHE_SIZE', 4096)),
+    ttl=int(os.getenv('SLUG_CACHE_TTL', 300))
+)
 
 class User(UserMixin):
     def __init__(self, uid, username, email, is_admin=False):
@@ -14,53 +56,138 @@ class User(UserMixin):
         self.is_admin = is_admin
 
     @staticmethod
-    def get(user_id):
+    def get(user_id, use_cache=True):
+        if use_cache:
+            user = user_cache.get(user_id)
+            if user is not None:
+                return user
         try:
-            user_doc = db.collection('users').document(user_id).get()
-            if user_doc.exists:
-                user_data = user_doc.to_dict()
-                return User(
-                    uid=user_id,
-                    username=user_data.get('username'),
-                    email=user_data.get('email'),
-                    is_admin=user_data.get('is_admin', False)
-                )
-        except Exception as e:
-            print(f"Error getting user: {e}")
+            user_data = get_backend().get_user(user_id)
+            if user_data is not None:
+                user = User.from_data(user_id, user_data)
+                user_cache.set(user_id, user)
+                return user
+        except Exception:
+            logger.exception("Error getting user")
         return None
 
+    @staticmethod
+    def get_many(user_ids):
+        """Users for ``user_ids`` in order, with one batch read for those not cached.
+
+        Returns ``(users, missing_ids)``.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        found = {}
+        for user_id in user_ids:
+            user = user_cache.get(user_id)
+            if user is not None:
+                found[user_id] = user
+        uncached = [user_id for user_id in user_ids if user_id not in found]
+        if uncached:
+            try:
+                for user_id, user_data in get_backend().get_users(uncached).items():
+                    found[user_id] = User.from_data(user_id, user_data)
+                    user_cache.set(user_id, found[user_id])
+            except Exception:
+                logger.exception("Error getting users")
+        return ([found[user_id] for user_id in user_ids if user_id in found],
+                [user_id for user_id in user_ids if user_id not in found])
+
+    @staticmethod
+    def from_data(user_id, user_data):
+        return User(
+            uid=user_id,
+            username=user_data.get('username'),
+            email=user_data.get('email'),
+            is_admin=user_data.get('is_admin', False)
+        )
+
+    @staticmethod
+    def find_by(field, value):
+        """The user whose ``field`` (``username`` or ``email``) equals ``value``, or None."""
+        found = get_backend().find_user(field, value)
+        return User.from_data(*found) if found else None
+
+    @staticmethod
+    def get_all():
+        return [User.from_data(user_id, user_data) for user_id, user_data in get_backend().list_users()]
+
+    @staticmethod
+    def count():
+        return get_backend().count_users()
+
+    @staticmethod
+    def make_admin(user_id):
+        get_backend().update_user(user_id, {'is_admin': True})
+        User.invalidate(user_id)
+
+    @staticmethod
+    def invalidate(user_id):
+        """Drop a cached user so the next load reads it from the backend."""
+        user_cache.pop(user_id)
+
+    def to_claims(self):
+        """Fields that can be signed into the session instead of re-read."""
+        return {
+            'id': self.id,
+            'username': self.username,
+            'email': self.email,
+            'is_admin': self.is_admin
+        }
+
+    @staticmethod
+    def from_claims(claims):
+        return User(
+            uid=claims['id'],
+            username=claims.get('username'),
+            email=claims.get('email'),
+            is_admin=claims.get('is_admin', False)
+        )
+
     @staticmethod
     def create(email, password, username, is_admin=False):
         try:
             # Create user in Firebase Auth
-            user = auth_instance.create_user_with_email_and_password(email, password)
+            user = get_auth().create_user_with_email_and_password(email, password)
             
-            # Store additional user data in Firestore
+            # Store additional user data in the backend
             user_data = {
                 'username': username,
                 'email': email,
                 'is_admin': is_admin,
                 'created_at': datetime.utcnow().isoformat()
             }
-            db.collection('users').document(user['localId']).set(user_data)
+            get_backend().put_user(user['localId'], user_data)
             
             return User(user['localId'], username, email, is_admin)
-        except Exception as e:
-            print(f"Error creating user: {e}")
+        except Exception:
+            logger.exception("Error creating user")
             return None
 
-class Post:
-    def __init__(self, id, title, content, author, categories=None, is_published=False, 
-                 excerpt=None, featured_image=None, meta_description=None, timestamp=None):
+class PostSummary:
+    """The fields a listing card shows. Listings load only these, never the body."""
+
+    FIELDS = ['title', 'slug', 'excerpt', 'author', 'categories', 'is_published', 'featured_image',
+              'featured_image_status', 'featured_image_queued_at', 'featured_image_variants', 'timestamp',
+              'content_hash']
+
+    def __init__(self, id, title, author, categories=None, is_published=False, excerpt=None,
+                 featured_image=None, timestamp=None, content_hash=None, featured_image_status=None,
+                 featured_image_variants=None, slug=None):
         self.id = id
         self.title = title or ''
-        self.content = content or ''
+        self.slug = slug
+        self.content_hash = content_hash
         self.author = author
         self.categories = categories or []
         self.is_published = bool(is_published)
         self.excerpt = excerpt or ''
         self.featured_image = featured_image or ''
-        self.meta_description = meta_description or ''
+        # none, pending, ready or failed while a background upload runs
+        self.featured_image_status = featured_image_status or ('ready' if featured_image else 'none')
+        # Resized copies: {variant: {'width': ..., 'webp': url, 'jpeg': url}}
+        self.featured_image_variants = featured_image_variants or {}
         self.timestamp = timestamp
         # Handle timestamp
         if isinstance(timestamp, datetime):
@@ -68,39 +195,123 @@ class Post:
         else:
             self.created_at = datetime.utcnow()
 
+    @property
+    def url_key(self):
+        """What public URLs address the post by: its slug, or its id before it has one."""
+        return self.slug or self.id
+
+    def image_url(self, variant='card'):
+        """JPEG URL of a featured image variant, falling back to the original."""
+        resized = self.featured_image_variants.get(variant) or {}
+        return resized.get('jpeg') or self.featured_image
+
+    def image_srcset(self, fmt='jpeg'):
+        """``srcset`` listing every stored size of the featured image in ``fmt``."""
+        sizes = sorted(self.featured_image_variants.values(), key=lambda resized: resized['width'])
+        return ', '.join(f"{resized[fmt]} {resized['width']}w" for resized in sizes if resized.get(fmt))
+
+    @staticmethod
+    def _upload_stalled(post_data):
+        """Whether a pending featured image has outlived ``FEATURED_IMAGE_TIMEOUT``."""
+        if post_data.get('featured_image_status') != 'pending':
+            return False
+        queued_at = post_data.get('featured_image_queued_at')
+        if not isinstance(queued_at, datetime):
+            # Queued before uploads recorded the time
+            return True
+        if queued_at.tzinfo is not None:
+            queued_at = queued_at.astimezone(timezone.utc).replace(tzinfo=None)
+        return datetime.utcnow() - queued_at > timedelta(seconds=FEATURED_IMAGE_TIMEOUT)
+
+    @staticmethod
+    def _fields(post_data):
+        """Constructor arguments shared by summaries and full posts."""
+        # Create a User object from author data
+        author_data = post_data.get('author', {})
+        author = None
+        if author_data:
+            author = User(
+                uid=author_data.get('id'),
+                username=author_data.get('username', 'Unknown'),
+                email=author_data.get('email', ''),
+                is_admin=False
+            )
+
+        # Convert timestamp to datetime if it exists
+        timestamp = post_data.get('timestamp')
+        if isinstance(timestamp, (int, float)):
+            timestamp = datetime.fromtimestamp(timestamp)
+        elif not isinstance(timestamp, datetime):
+            timestamp = datetime.utcnow()
+
+        return dict(
+            title=post_data.get('title', ''),
+            slug=post_data.get('slug'),
+            author=author,
+            categories=post_data.get('categories', []),
+            is_published=post_data.get('is_published', False),
+            excerpt=post_data.get('excerpt'),
+            featured_image=post_data.get('featured_image'),
+            featured_image_status='failed' if PostSummary._upload_stalled(post_data)
+                                  else post_data.get('featured_image_status'),
+            featured_image_variants=post_data.get('featured_image_variants'),
+            timestamp=timestamp,
+            content_hash=post_data.get('content_hash')
+        )
+
+    @staticmethod
+    def from_data(post_id, post_data):
+        return PostSummary(id=post_id, **PostSummary._fields(post_data))
+
+
+class Post(PostSummary):
+    def __init__(self, id, title, content, author, categories=None, is_published=False, 
+                 excerpt=None, featured_image=None, meta_description=None, timestamp=None,
+                 content_html=None, content_hash=None, featured_image_status=None,
+                 featured_image_error=None, featured_image_variants=None, slug=None):
+        super().__init__(id, title, author, categories=categories, is_published=is_published,
+                         excerpt=excerpt, featured_image=featured_image, timestamp=timestamp,
+                         content_hash=content_hash, featured_image_status=featured_image_status,
+                         featured_image_variants=featured_image_variants, slug=slug)
+        self.content = content or ''
+        self.content_html = content_html
+        self.featured_image_error = featured_image_error
+        self.meta_description = meta_description or ''
+
+    @property
+    def html(self):
+        """Rendered body, using the HTML stored with the post when it is current.
+
+        Stored HTML is only served if its hash matches the body under this
+        ``RENDER_VERSION``; otherwise the body is rendered again.
+        """
+        digest = content_hash(self.content)
+        if not self.content_html or self.content_hash != digest:
+            self.content_html = render_markdown(self.content, digest)
+            self.content_hash = digest
+        return self.content_html
+
     @staticmethod
     def create(title, content, author, categories=None, is_published=False, 
                excerpt=None, featured_image=None, meta_description=None):
         try:
             post_id = str(uuid.uuid4())
             current_time = datetime.utcnow()
+            digest = content_hash(content)
+            content_html = render_markdown(content, digest)
             
-            # Handle featured image upload if provided
-            featured_image_url = None
-            if featured_image:
-                try:
-                    # Generate a unique filename
-                    filename = f"posts/{post_id}/{secure_filename(featured_image.filename)}"
-                    
-                    # Upload to Firebase Storage
-                    bucket = storage.bucket()
-                    blob = bucket.blob(filename)
-                    blob.upload_from_string(
-                        featured_image.read(),
-                        content_type=featured_image.content_type
-                    )
-                    
-                    # Make the blob publicly accessible
-                    blob.make_public()
-                    featured_image_url = blob.public_url
-                except Exception as e:
-                    print(f"Error uploading image: {e}")
-                    # Continue without the image if upload fails
-                    pass
+            slug = Post._claim_slug(title, post_id)
+            
+            # Spool the featured image; it is uploaded after the post is saved
+            spooled_image = uploads.spool(featured_image) if featured_image else None
+            image_job = uuid.uuid4().hex if spooled_image else None
             
             post_data = {
                 'title': title or '',
+                'slug': slug,
                 'content': content or '',
+                'content_html': content_html,
+                'content_hash': digest,
                 'author': {
                     'id': author.id,
                     'username': author.username,
@@ -109,30 +320,43 @@ class Post:
                 'categories': categories or [],
                 'is_published': bool(is_published),
                 'excerpt': excerpt or '',
-                'featured_image': featured_image_url or '',
+                'featured_image': '',
+                'featured_image_status': 'pending' if spooled_image else 'none',
+                'featured_image_job': image_job,
+                'featured_image_queued_at': current_time if spooled_image else None,
                 'meta_description': meta_description or '',
                 'timestamp': current_time,
                 'created_at': current_time,
                 'updated_at': current_time
             }
             
-            # Save to Firestore
-            db.collection('posts').document(post_id).set(post_data)
+            # Saves the post and bumps the dashboard counters atomically
+            get_backend().create_post(post_id, post_data)
+            search.index_post(post_id, post_data)
+            page_index.clear()
+            Post._invalidate_categories(categories)
+            page_cache.purge('posts', f'post-{post_id}')
+            if spooled_image:
+                Post._queue_featured_image(post_id, image_job, spooled_image, featured_image.filename,
+                                           featured_image.content_type)
             
             return Post(
                 id=post_id,
                 title=title,
+                slug=slug,
                 content=content,
                 author=author,
                 categories=categories,
                 is_published=is_published,
                 excerpt=excerpt,
-                featured_image=featured_image_url,
+                featured_image_status='pending' if spooled_image else 'none',
                 meta_description=meta_description,
-                timestamp=current_time
+                timestamp=current_time,
+                content_html=content_html,
+                content_hash=digest
             )
-        except Exception as e:
-            print(f"Error creating post: {e}")
+        except Exception:
+            logger.exception("Error creating post")
             return None
 
     def update(self, title=None, content=None, categories=None, is_published=None, 
@@ -140,10 +364,19 @@ class Post:
         try:
             update_data = {}
             if title is not None:
+                if not self.slug or slugs.slugify(title) != slugs.slugify(self.title):
+                    # The old slug stays claimed and redirects to the new one
+                    self.slug = Post._claim_slug(title, self.id)
+                    update_data['slug'] = self.slug
                 update_data['title'] = title
                 self.title = title
             if content is not None:
+                # Render once here so views never run markdown
+                self.content_hash = content_hash(content)
+                self.content_html = render_markdown(content, self.content_hash)
                 update_data['content'] = content
+                update_data['content_html'] = self.content_html
+                update_data['content_hash'] = self.content_hash
                 self.content = content
             if categories is not None:
                 update_data['categories'] = categories
@@ -154,146 +387,318 @@ class Post:
             if excerpt is not None:
                 update_data['excerpt'] = excerpt
                 self.excerpt = excerpt
+            spooled_image = image_job = None
             if featured_image is not None:
-                # Handle featured image upload if provided
-                featured_image_url = None
+                # Spool the new image; it is uploaded after the post is saved
                 if featured_image:
-                    # Generate a unique filename
-                    filename = f"posts/{self.id}/{secure_filename(featured_image.filename)}"
-                    
-                    # Upload to Firebase Storage
-                    bucket = storage.bucket()
-                    blob = bucket.blob(filename)
-                    blob.upload_from_string(
-                        featured_image.read(),
-                        content_type=featured_image.content_type
-                    )
-                    
-                    # Make the blob publicly accessible
-                    blob.make_public()
-                    featured_image_url = blob.public_url
-                update_data['featured_image'] = featured_image_url
-                self.featured_image = featured_image_url
+                    spooled_image = uploads.spool(featured_image)
+                    image_job = uuid.uuid4().hex
+                    update_data['featured_image_status'] = 'pending'
+                    update_data['featured_image_job'] = image_job
+                    update_data['featured_image_queued_at'] = datetime.utcnow()
+                    update_data['featured_image_error'] = None
+                    self.featured_image_status = 'pending'
+                else:
+                    update_data['featured_image'] = ''
+                    update_data['featured_image_variants'] = {}
+                    update_data['featured_image_status'] = 'none'
+                    self.featured_image = ''
+                    self.featured_image_variants = {}
+                    self.featured_image_status = 'none'
             if meta_description is not None:
                 update_data['meta_description'] = meta_description
                 self.meta_description = meta_description
             
-            update_data['timestamp'] = firestore.SERVER_TIMESTAMP
-            self.timestamp = firestore.SERVER_TIMESTAMP
+            current_time = datetime.utcnow()
+            update_data['timestamp'] = current_time
+            update_data['updated_at'] = current_time
+            self.timestamp = current_time
+            self.created_at = current_time
             
-            db.collection('posts').document(self.id).update(update_data)
+            # The backend moves the counters from the stored version, not
+            # from this possibly stale object
+            before = get_backend().update_post(self.id, update_data)
+            post_cache.invalidate(self.id)
+            search.index_post(self.id, dict(before, **update_data))
+            page_index.clear()
+            Post._invalidate_categories(set(before.get('categories') or []) | set(self.categories))
+            page_cache.purge('posts', f'post-{self.id}')
+            if spooled_image:
+                Post._queue_featured_image(self.id, image_job, spooled_image, featured_image.filename,
+                                           featured_image.content_type)
             return True
-        except Exception as e:
-            print(f"Error updating post: {e}")
+        except Exception:
+            logger.exception("Error updating post")
             return False
 
+    @staticmethod
+    def _queue_featured_image(post_id, job_id, path, filename, content_type):
+        """Upload a spooled featured image in the background and record the result.
+
+        The job id is saved on the post with the pending state, so a slow
+        upload can never overwrite the image from a newer edit.
+        """
+        name = f"posts/{post_id}/{job_id[:8]}-{secure_filename(filename)}"
+
+        def upload():
+            store = media_storage.get_media_store()
+            with open(path, 'rb') as f:
+                store.save(name, f, content_type=content_type, cache_control=imaging.CACHE_CONTROL)
+            try:
+                variants = imaging.store_variants(store, path, name)
+            except imaging.IMAGE_ERRORS:
+                # Pages fall back to the original if the image cannot be resized
+                logger.exception("Error resizing featured image")
+                variants = {}
+            return store.public_url(name), variants
+
+        def record(fields):
+            get_backend().update_post_if(post_id, fields, 'featured_image_job', job_id)
+            post_cache.invalidate(post_id)
+            # Cached listing pages may show the old image state
+            category_first_pages.clear()
+            page_cache.purge('posts', f'post-{post_id}')
+
+        def uploaded(result):
+            url, variants = result
+            record({
+                'featured_image': url,
+                'featured_image_variants': variants,
+                'featured_image_status': 'ready',
+                'featured_image_error': None
+            })
+
+        def failed(error):
+            record({'featured_image_status': 'failed', 'featured_image_error': str(error)})
+
+        def retrying(attempt, error):
+            record({'featured_image_attempts': attempt, 'featured_image_error': str(error)})
+
+        def cleanup():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+        uploads.upload_queue.submit(upload, on_success=uploaded, on_failure=failed,
+                                    on_retry=retrying, cleanup=cleanup)
+
+    @staticmethod
+    def from_data(post_id, post_data):
+        """Build a Post from its stored fields."""
+        return Post(
+            id=post_id,
+            content=post_data.get('content', ''),
+            featured_image_error=post_data.get('featured_image_error') or
+                                 (STALLED_UPLOAD_ERROR if PostSummary._upload_stalled(post_data) else None),
+            meta_description=post_data.get('meta_description'),
+            content_html=post_data.get('content_html'),
+            **PostSummary._fields(post_data)
+        )
+
     @staticmethod
     def get(post_id):
         try:
-            post_doc = db.collection('posts').document(post_id).get()
-            if post_doc.exists:
-                post_data = post_doc.to_dict()
-                
-                # Create a User object from author data
-                author_data = post_data.get('author', {})
-                author = None
-                if author_data:
-                    author = User(
-                        uid=author_data.get('id'),
-                        username=author_data.get('username', 'Unknown'),
-                        email=author_data.get('email', ''),
-                        is_admin=False
-                    )
-                
-                # Convert timestamp to datetime if it exists
-                timestamp = post_data.get('timestamp')
-                if isinstance(timestamp, (int, float)):
-                    timestamp = datetime.fromtimestamp(timestamp)
-                elif not isinstance(timestamp, datetime):
-                    timestamp = datetime.utcnow()
-                
-                return Post(
-                    id=post_id,
-                    title=post_data.get('title', ''),
-                    content=post_data.get('content', ''),
-                    author=author,
-                    categories=post_data.get('categories', []),
-                    is_published=post_data.get('is_published', False),
-                    excerpt=post_data.get('excerpt'),
-                    featured_image=post_data.get('featured_image'),
-                    meta_description=post_data.get('meta_description'),
-                    timestamp=timestamp
-                )
-        except Exception as e:
-            print(f"Error getting post: {e}")
+            post_data = post_cache.get(post_id)
+            if post_data is not None:
+                return Post.from_data(post_id, post_data)
+        except Exception:
+            logger.exception("Error getting post")
         return None
 
+    @staticmethod
+    def get_many(post_ids):
+        """Posts for ``post_ids`` in order, with one batch read for those not cached.
+
+        Returns ``(posts, missing_ids)``.
+        """
+        post_ids = list(dict.fromkeys(post_ids))
+        try:
+            found = post_cache.get_many(post_ids)
+        except Exception:
+            logger.exception("Error getting posts")
+            found = {}
+        return ([Post.from_data(post_id, found[post_id]) for post_id in post_ids if post_id in found],
+                [post_id for post_id in post_ids if post_id not in found])
+
+    @staticmethod
+    def resolve(slug_or_id):
+        """Look up a post by a slug it has or had, or by its id.
+
+        Slugs resolve through ``slug_cache``, so a cached slug costs the same
+        single read as an id. A cached slug whose post is gone is looked up
+        again, since another worker may have deleted the post and the slug
+        been claimed by a new one.
+        """
+        if slugs.looks_like_id(slug_or_id):
+            return Post.get(slug_or_id)
+        post_id = slug_cache.get(slug_or_id)
+        if post_id is not None:
+            post = Post.get(post_id)
+            if post is not None:
+                return post
+            slug_cache.pop(slug_or_id)
+        try:
+            fresh_id = get_backend().get_slug(slug_or_id)
+        except Exception:
+            logger.exception("Error resolving slug")
+            return None
+        if fresh_id is None or fresh_id == post_id:
+            return None
+        slug_cache.set(slug_or_id, fresh_id)
+        return Post.get(fresh_id)
+
+    @staticmethod
+    def _claim_slug(title, post_id):
+        """Reserve the first free slug for ``title`` and return it."""
+        base = slugs.slugify(title)
+        backend = get_backend()
+        for slug in slugs.candidates(base):
+            if backend.claim_slug(slug, post_id):
+                return slug
+        # A hundred posts share this title; fall back to one no other post can have
+        slug = f"{base}-{post_id[:8]}"
+        backend.claim_slug(slug, post_id)
+        return slug
+
     @staticmethod
     def get_all(limit=10, offset=0, published_only=False):
+        """Return up to ``limit`` post summaries, newest first.
+
+        Listing pages should use ``get_page`` instead; ``offset`` is skipped
+        server-side here but Firestore still bills the skipped documents.
+        """
         try:
-            # Create base query
-            query = db.collection('posts')
-            
-            # Add published filter if requested
-            if published_only:
-                query = query.where('is_published', '==', True)
-            
-            # Add ordering by timestamp
-            query = query.order_by('timestamp', direction=firestore.Query.DESCENDING)
-            
-            # Get all documents up to offset + limit
-            docs = query.limit(offset + limit).get()
-            
-            # Skip the first 'offset' documents
-            posts = []
-            for i, post_doc in enumerate(docs):
-                if i < offset:
-                    continue
-                    
-                post_data = post_doc.to_dict()
-                
-                # Create a User object from author data
-                author_data = post_data.get('author', {})
-                author = None
-                if author_data:
-                    author = User(
-                        uid=author_data.get('id'),
-                        username=author_data.get('username', 'Unknown'),
-                        email=author_data.get('email', ''),
-                        is_admin=False
-                    )
-                
-                # Convert timestamp to datetime if it exists
-                timestamp = post_data.get('timestamp')
-                if isinstance(timestamp, (int, float)):
-                    timestamp = datetime.fromtimestamp(timestamp)
-                elif not isinstance(timestamp, datetime):
-                    timestamp = datetime.utcnow()
-                
-                posts.append(Post(
-                    id=post_doc.id,
-                    title=post_data.get('title', ''),
-                    content=post_data.get('content', ''),
-                    author=author,
-                    categories=post_data.get('categories', []),
-                    is_published=post_data.get('is_published', False),
-                    excerpt=post_data.get('excerpt'),
-                    featured_image=post_data.get('featured_image'),
-                    meta_description=post_data.get('meta_description'),
-                    timestamp=timestamp
-                ))
-            return posts
-        except Exception as e:
-            print(f"Error getting posts: {e}")
+            docs = get_backend().list_posts(limit, published_only=published_only, offset=offset,
+                                            fields=PostSummary.FIELDS)
+            return [PostSummary.from_data(post_id, post_data) for post_id, post_data in docs]
+        except Exception:
+            logger.exception("Error getting posts")
             return []
 
+    @staticmethod
+    def get_page(limit=10, cursor=None, page=1, published_only=False):
+        """Return ``(posts, next_cursor)`` for one page of the post listing.
+
+        Posts are ``PostSummary`` objects; their bodies are not fetched.
+        ``cursor`` is the opaque token of a previous page's ``next_cursor``.
+        Without one, ``page`` is resolved through the page index so numbered
+        links cost one page of reads instead of every page before them.
+        """
+        try:
+            listing = ('posts', published_only, limit)
+            return Post._paginate(listing, limit, cursor, page, published_only=published_only)
+        except Exception:
+            logger.exception("Error getting posts")
+            return [], None
+
+    @staticmethod
+    def get_by_category(category_id, limit=10, cursor=None, page=1, published_only=True):
+        """Return ``(posts, next_cursor)`` for one page of a category listing.
+
+        First pages are served from a short-lived per-category cache that is
+        dropped whenever a post in that category is written.
+        """
+        variant = (limit, published_only)
+        first_page = not cursor and page <= 1
+        if first_page:
+            cached = category_first_pages.get(category_id, {}).get(variant)
+            if cached is not None:
+                return cached
+        try:
+            listing = ('category', category_id, published_only, limit)
+            result = Post._paginate(listing, limit, cursor, page,
+                                    published_only=published_only, category_id=category_id)
+            if first_page:
+                variants = dict(category_first_pages.get(category_id, {}))
+                variants[variant] = result
+                category_first_pages.set(category_id, variants)
+            return result
+        except Exception:
+            logger.exception("Error getting posts for category")
+            return [], None
+
+    @staticmethod
+    def _invalidate_categories(category_ids):
+        for category_id in category_ids or []:
+            category_first_pages.pop(category_id)
+
+    @staticmethod
+    def _paginate(listing, limit, cursor=None, page=1, **filters):
+        position = decode_cursor(cursor)
+        # Page numbers only index boundaries the server found itself; a
+        # client's cursor can point anywhere, whatever page it claims to be
+        trusted = position is None
+        if position is None and page > 1:
+            cursor = Post._seek(listing, page, limit, **filters)
+            if cursor is None:
+                # Past the last page
+                return [], None
+            position = decode_cursor(cursor)
+
+        # Fetch one extra document to know whether there is a next page
+        docs = get_backend().list_posts(limit + 1, after=position, fields=PostSummary.FIELDS, **filters)
+        posts = [PostSummary.from_data(post_id, post_data) for post_id, post_data in docs[:limit]]
+
+        next_cursor = None
+        if len(docs) > limit:
+            last_id, last_data = docs[limit - 1]
+            next_cursor = encode_cursor(last_data.get('timestamp'), last_id)
+            if trusted:
+                page_index.remember(listing, page + 1, next_cursor)
+        elif trusted:
+            page_index.remember_last(listing, page)
+        return posts, next_cursor
+
+    @staticmethod
+    def _seek(listing, page, limit, **filters):
+        """Find the cursor that starts ``page``, walking from the nearest known page.
+
+        The walk only reads the timestamp field and records every page
+        boundary it passes, so each page is walked at most once. Pages past
+        the known end of the listing, or more than ``page_index.window``
+        pages beyond the nearest known one, are treated as past the end
+        without reading, so large page numbers cannot force long walks.
+        """
+        known_page, cursor = page_index.nearest(listing, page)
+        if known_page == page:
+            return cursor
+        last_page = page_index.last_page(listing)
+        if (last_page is not None and page > last_page) or page - known_page > page_index.window:
+            return None
+
+        walk = get_backend().list_posts((page - known_page) * limit, after=decode_cursor(cursor),
+                                        fields=['timestamp'], **filters)
+
+        start_page = known_page
+        seen = 0
+        for post_id, post_data in walk:
+            seen += 1
+            if seen % limit == 0:
+                known_page += 1
+                cursor = encode_cursor(post_data.get('timestamp'), post_id)
+                page_index.remember(listing, known_page, cursor)
+        if known_page == page:
+            return cursor
+        # The walk ran off the end; remember where it stopped
+        page_index.remember_last(listing, start_page + max(-(-seen // limit), 1) - 1)
+        return None
+
     def delete(self):
         try:
-            # Delete the post document
-            db.collection('posts').document(self.id).delete()
+            # Delete the post and drop it from the counters
+            get_backend().delete_post(self.id)
+            post_cache.invalidate(self.id)
+            released = get_backend().release_slugs(self.id) or []
+            search.remove_post(self.id)
+            for slug in set(released) | {self.slug}:
+                slug_cache.pop(slug)
+            page_index.clear()
+            Post._invalidate_categories(self.categories)
+            page_cache.purge('posts', f'post-{self.id}')
             return True
-        except Exception as e:
-            print(f"Error deleting post: {e}")
+        except Exception:
+            logger.exception("Error deleting post")
             return False
 
 class Category:
@@ -311,37 +716,333 @@ class Category:
                 'description': description
             }
             
-            db.collection('categories').document(category_id).set(category_data)
+            get_backend().put_category(category_id, category_data)
+            category_registry.invalidate()
+            page_cache.purge(f'category-{category_id}')
             return Category(category_id, name, description)
-        except Exception as e:
-            print(f"Error creating category: {e}")
+        except Exception:
+            logger.exception("Error creating category")
             return None
 
     @staticmethod
     def get_all():
         try:
-            categories = []
-            for doc in db.collection('categories').stream():
-                category_data = doc.to_dict()
-                categories.append(Category(
-                    id=doc.id,
-                    name=category_data.get('name'),
-                    description=category_data.get('description')
-                ))
-            return categories
-        except Exception as e:
-            print(f"Error getting categories: {e}")
+            return Category._load_all()
+        except Exception:
+            logger.exception("Error getting categories")
             return []
 
+    @staticmethod
+    def _load_all():
+        categories = []
+        for category_id, category_data in get_backend().list_categories():
+            categories.append(Category(
+                id=category_id,
+                name=category_data.get('name'),
+                description=category_data.get('description')
+            ))
+        return categories
+
+    @staticmethod
+    def get(category_id):
+        """Look up a category in the registry without a backend read."""
+        return category_registry.snapshot().get(category_id)
+
+    @staticmethod
+    def get_all_cached():
+        """All categories from the registry snapshot, without a backend read."""
+        return list(category_registry.snapshot().values())
+
+    @staticmethod
+    def get_many(category_ids):
+        """Categories for ``category_ids`` in order, from the registry snapshot.
+
+        Returns ``(categories, missing_ids)``.
+        """
+        categories = category_registry.snapshot()
+        category_ids = list(dict.fromkeys(category_ids))
+        return ([categories[category_id] for category_id in category_ids if category_id in categories],
+                [category_id for category_id in category_ids if category_id not in categories])
+
     def delete(self):
         try:
             # Check if any posts are using this category
-            posts = db.collection('posts').where('categories', 'array_contains', self.id).limit(1).get()
-            if len(posts) > 0:
+            if get_backend().post_uses_category(self.id):
                 return False
             
-            db.collection('categories').document(self.id).delete()
+            get_backend().delete_category(self.id)
+            category_registry.invalidate()
+            page_cache.purge(f'category-{self.id}')
+            return True
+        except Exception:
+            logger.exception("Error deleting category")
+            return False
+
+
+class Media:
+    """Metadata of an uploaded media file; the bytes live in the media store."""
+
+    # Sort keys offered by the media library: (field, descending)
+    SORTS = {
+        'newest': ('created_at', True),
+        'oldest': ('created_at', False),
+        'largest': ('size', True),
+        'smallest': ('size', False),
+        'name': ('filename', False)
+    }
+    LIST_FIELDS = ['filename', 'content_type', 'size', 'width', 'height', 'created_at', 'variants']
+
+    def __init__(self, filename, content_type=None, size=0, width=None, height=None,
+                 sha256=None, created_at=None, variants=None):
+        self.filename = filename
+        self.content_type = content_type or ''
+        self.size = size or 0
+        self.width = width
+        self.height = height
+        self.sha256 = sha256
+        self.created_at = created_at
+        self.variants = variants or {}
+
+    def thumbnail_url(self):
+        thumb = self.variants.get('thumb') or {}
+        return thumb.get('webp') or thumb.get('jpeg')
+
+    @staticmethod
+    def create(filename, content_type, size, sha256=None, width=None, height=None):
+        try:
+            created_at = datetime.utcnow()
+            get_backend().put_media(filename, {
+                'filename': filename,
+                'content_type': content_type,
+                'size': size,
+                'sha256': sha256,
+                'width': width,
+                'height': height,
+                'created_at': created_at
+            })
+            return Media(filename, content_type, size, width, height, sha256, created_at)
+        except Exception:
+            logger.exception("Error saving media metadata")
+            return None
+
+    @staticmethod
+    def from_data(filename, media_data):
+        return Media(
+            filename=filename,
+            content_type=media_data.get('content_type'),
+            size=media_data.get('size'),
+            width=media_data.get('width'),
+            height=media_data.get('height'),
+            sha256=media_data.get('sha256'),
+            created_at=media_data.get('created_at'),
+            variants=media_data.get('variants')
+        )
+
+    @staticmethod
+    def get_page(limit=24, cursor=None, sort='newest', content_type=None, since=None, until=None):
+        """Return ``(media, next_cursor)`` for one page of the media library.
+
+        Only metadata fields are fetched, so a page costs the same whatever the
+        files weigh. A date range always sorts by upload date, since Firestore
+        can only order a range query by the field it filters on.
+        """
+        try:
+            if since or until:
+                sort = 'oldest' if sort == 'oldest' else 'newest'
+            field, descending = Media.SORTS.get(sort, Media.SORTS['newest'])
+
+            after = None
+            position = decode_token(cursor)
+            if position and len(position) == 3 and position[0] == field:
+                after = (position[1], position[2])
+
+            docs = get_backend().list_media(limit + 1, sort_field=field, descending=descending, after=after,
+                                            content_type=content_type, since=since, until=until,
+                                            fields=Media.LIST_FIELDS)
+            media = [Media.from_data(filename, media_data) for filename, media_data in docs[:limit]]
+            next_cursor = None
+            if len(docs) > limit:
+                last_filename, last_data = docs[limit - 1]
+                next_cursor = encode_token(field, last_data.get(field), last_filename)
+            return media, next_cursor
+        except Exception:
+            logger.exception("Error getting media")
+            return [], None
+
+    @staticmethod
+    def queue_variants(filename, path):
+        """Generate resized copies of a spooled upload in the background."""
+        store = media_storage.get_media_store()
+
+        def saved(variants):
+            get_backend().update_media(filename, {'variants': variants})
+
+        def cleanup():
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+        uploads.upload_queue.submit(lambda: imaging.store_variants(store, path, filename),
+                                    on_success=saved, cleanup=cleanup)
+
+    @staticmethod
+    def get_legacy_data(filename):
+        """Bytes of an image uploaded before the media store existed, if any."""
+        try:
+            media_data = get_backend().get_media(filename)
+            if media_data is not None:
+                return media_data.get('data')
+        except Exception:
+            logger.exception("Error getting media")
+        return None
+
+    @staticmethod
+    def delete(filename):
+        try:
+            get_backend().delete_media(filename)
             return True
-        except Exception as e:
-            print(f"Error deleting category: {e}")
+        except Exception:
+            logger.exception("Error deleting media")
             return False
+
+    @staticmethod
+    def migrate_legacy(store):
+        """Move bytes stored inline in image documents into ``store``.
+
+        Legacy documents have no ``size`` field, so they are found through a
+        projection on it; each one is then read in full once and rewritten
+        as metadata only.
+        """
+        backend = get_backend()
+        migrated = 0
+        for filename, media_data in list(backend.stream_media(fields=['size'])):
+            if media_data.get('size') is not None:
+                continue
+            media_data = backend.get_media(filename) or {}
+            data = media_data.get('data')
+            if not data:
+                continue
+
+            fileobj = io.BytesIO(data)
+            metadata = media_storage.describe(fileobj)
+            content_type = media_data.get('content_type') or media_storage.guess_content_type(filename)
+            store.save(filename, fileobj, content_type=content_type)
+            backend.put_media(filename, dict(
+                metadata,
+                filename=filename,
+                content_type=content_type,
+                created_at=media_data.get('created_at')
+            ))
+            migrated += 1
+        return migrated
+
+
+class CategoryRegistry:
+    """Per-process snapshot of the categories collection, keyed by id.
+
+    The whole collection is loaded with a single stream and reloaded once it
+    is older than ``ttl`` seconds, so writes made by another worker show up
+    within that window. Writes in this process invalidate it immediately.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._categories = None
+        self._loaded_at = 0
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        # Read and refresh under the lock so a concurrent invalidate() can
+        # never leave a caller holding None
+        with self._lock:
+            categories = self._categories
+            if categories is None or time.monotonic() - self._loaded_at > self.ttl:
+                try:
+                    categories = self._categories = {c.id: c for c in Category._load_all()}
+                    self._loaded_at = time.monotonic()
+                except Exception:
+                    # Keep serving the previous snapshot if there is one
+                    logger.exception("Error loading categories")
+                    if categories is None:
+                        return {}
+            return categories
+
+    def invalidate(self):
+        with self._lock:
+            self._categories = None
+
+
+category_registry = CategoryRegistry(ttl=int(os.getenv('CATEGORY_CACHE_TTL', 60)))
+
+
+class PostCache:
+    """Per-process read-through LRU of stored post fields, keyed by post id.
+
+    Writes in this process drop their entry at once. Writes made by other
+    workers arrive through the backend's change watch, normally within a
+    second; entries also expire after ``ttl`` seconds, which bounds the
+    staleness when the backend cannot watch or the watch is down.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generation = 0
+        self._watching_pid = None
+        self._lock = threading.Lock()
+
+    def get(self, post_id):
+        """The stored fields of a post, or None if it does not exist."""
+        self._watch()
+        post_data = self._cache.get(post_id)
+        if post_data is None:
+            generation = self._generation
+            post_data = get_backend().get_post(post_id)
+            # Don't store a read that an invalidation may have overtaken
+            if post_data is not None and generation == self._generation:
+                self._cache.set(post_id, post_data)
+        return post_data
+
+    def get_many(self, post_ids):
+        """``{id: data}`` for those of ``post_ids`` that exist, reading the uncached ones in one batch."""
+        self._watch()
+        found = {}
+        for post_id in post_ids:
+            post_data = self._cache.get(post_id)
+            if post_data is not None:
+                found[post_id] = post_data
+        uncached = [post_id for post_id in post_ids if post_id not in found]
+        if uncached:
+            generation = self._generation
+            fetched = get_backend().get_posts(uncached)
+            if generation == self._generation:
+                for post_id, post_data in fetched.items():
+                    self._cache.set(post_id, post_data)
+            found.update(fetched)
+        return found
+
+    def invalidate(self, post_id):
+        with self._lock:
+            self._generation += 1
+        self._cache.pop(post_id)
+
+    def _watch(self):
+        # Watches do not survive a fork, so each worker starts its own
+        if self._watching_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watching_pid == os.getpid():
+                return
+            self._watching_pid = os.getpid()
+            # Entries inherited from the parent were not covered by a watch
+            self._cache.clear()
+        try:
+            get_backend().watch_posts(self.invalidate)
+        except Exception:
+            logger.exception("Error watching posts; cached posts expire after POST_CACHE_TTL")
+
+
+post_cache = PostCache(
+    maxsize=int(os.getenv('POST_CACHE_SIZE', 1024)),
+    ttl=int(os.getenv('POST_CACHE_TTL', 60))
+)
@@ -0,0 +1,286 @@
+"""Full-page cache for anonymous blog traffic.
+
+Public pages are stored whole, keyed by host, path and query string, and
+tagged with surrogate keys naming what they show (``posts`` for listings,
+``post-<id>``, ``category-<id>``). Model writes purge the keys they
+affect. Logged-in users and requests with pending flash messages always
+get a freshly rendered page.
+
+``PAGE_CACHE`` selects ``memory`` (per worker, bounded LRU), ``disk``
+(``PAGE_CACHE_DIR``, shared by every worker on the host, so a purge in
+one worker reaches all of them) or ``off``.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from functools import wraps
+
+from flask import current_app, g, request, session
+from flask_login import current_user
+
+from cache import TTLCache
+import conditional
+
+logger = logging.getLogger(__name__)
+
+SURROGATE_KEYS_ATTR = 'surrogate_keys'
+
+
+class MemoryPageStore:
+    """Pages in a per-process LRU, with a tag -> cache keys index for purging."""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.ttl = ttl
+        self._pages = TTLCache(maxsize=maxsize, ttl=ttl, on_evict=self._forget)
+        self._tags = {}
+        self._purged_at = {}
+        # Re-entrant: storing a page can evict another, which calls _forget
+        self._lock = threading.RLock()
+
+    def get(self, key):
+        return self._pages.get(key)
+
+    def set(self, key, entry):
+        with self._lock:
+            # A page rendered before a purge of one of its tags is already stale
+            if any(self._purged_at.get(tag, 0) >= entry['stored_at'] for tag in entry['keys']):
+                return
+            self._pages.set(key, entry)
+            for tag in entry['keys']:
+                self._tags.setdefault(tag, set()).add(key)
+
+    def _forget(self, key, entry):
+        # Keeps the tag index as small as the cache, whatever URLs are requested
+        with self._lock:
+            if self._pages.get(key) is not None:
+                # Stored again since it was evicted
+                return
+            for tag in entry['keys']:
+                keys = self._tags.get(tag)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tags[tag]
+
+    def purge(self, tags):
+        now = time.time()
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                self._purged_at[tag] = now
+                keys |= self._tags.pop(tag, set())
+            for key in keys:
+                entry = self._pages.pop(key)
+                if entry is not None:
+                    # Its other tags must not keep pointing at it
+                    self._forget(key, entry)
+
+    def clear(self):
+        with self._lock:
+            self._tags.clear()
+            self._pages.clear()
+
+
+class DiskPageStore:
+    """Pages as JSON files under ``directory``.
+
+    A purge records the time in one small file per tag; an entry is stale if
+    any of its tags was purged after its page started rendering. Workers
+    therefore share purges without knowing which files hold which pages.
+
+    Every ``SWEEP_EVERY`` writes a worker deletes expired pages and, beyond
+    ``maxsize`` pages, the least recently written ones.
+    """
+
+    SWEEP_EVERY = 100
+
+    def __init__(self, directory, ttl=60, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._pages_dir = os.path.join(directory, 'pages')
+        self._tags_dir = os.path.join(directory, 'tags')
+        os.makedirs(self._pages_dir, exist_ok=True)
+        os.makedirs(self._tags_dir, exist_ok=True)
+
+    @staticmethod
+    def _name(value):
+        return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+    def _page_path(self, key):
+        return os.path.join(self._pages_dir, self._name(key) + '.json')
+
+    def _tag_path(self, tag):
+        return os.path.join(self._tags_dir, self._name(tag))
+
+    def _write(self, path, text):
+        # Write then rename so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    def _purged_at(self, tag):
+        try:
+            with open(self._tag_path(tag), encoding='utf-8') as f:
+                return float(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def get(self, key):
+        path = self._page_path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        stored_at = entry.get('stored_at', 0)
+        if (time.time() - stored_at > self.ttl or
+                any(self._purged_at(tag) >= stored_at for tag in entry['keys'])):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            return None
+        return entry
+
+    def set(self, key, entry):
+        self._write(self._page_path(key), json.dumps(entry))
+        with self._lock:
+            self._writes += 1
+            sweep = self._writes % self.SWEEP_EVERY == 0
+        if sweep:
+            self.sweep()
+
+    def sweep(self):
+        """Delete expired pages, then the oldest ones past ``maxsize``."""
+        pages = []
+        for name in os.listdir(self._pages_dir):
+            path = os.path.join(self._pages_dir, name)
+            try:
+                pages.append((os.stat(path).st_mtime, path))
+            except OSError:
+                pass
+        pages.sort(reverse=True)
+        # A page is written after it started rendering, so its mtime bounds its age
+        expired_before = time.time() - self.ttl
+        for n, (mtime, path) in enumerate(pages):
+            if n >= self.maxsize or mtime < expired_before:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def purge(self, tags):
+        now = repr(time.time())
+        for tag in tags:
+            self._write(self._tag_path(tag), now)
+
+    def clear(self):
+        for name in os.listdir(self._pages_dir):
+            try:
+                os.unlink(os.path.join(self._pages_dir, name))
+            except OSError:
+                pass
+
+
+_store = None
+
+
+def get_page_store():
+    """The page store selected by ``PAGE_CACHE``, or None when it is off."""
+    global _store
+    mode = os.getenv('PAGE_CACHE', 'memory')
+    if mode == 'off':
+        return None
+    if _store is None:
+        ttl = int(os.getenv('PAGE_CACHE_TTL', 60))
+        if mode == 'disk':
+            default_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'page_cache')
+            _store = DiskPageStore(os.getenv('PAGE_CACHE_DIR', default_dir), ttl=ttl,
+                                   maxsize=int(os.getenv('PAGE_CACHE_DISK_SIZE', 10000)))
+        else:
+            _store = MemoryPageStore(maxsize=int(os.getenv('PAGE_CACHE_SIZE', 1024)), ttl=ttl)
+    return _store
+
+
+def purge(*tags):
+    """Drop every cached page tagged with any of ``tags``."""
+    store = get_page_store()
+    if store is None or not tags:
+        return
+    try:
+        store.purge(tags)
+    except Exception:
+        logger.exception("Error purging page cache")
+
+
+def tag(*keys):
+    """Record surrogate keys for the page being rendered."""
+    g.setdefault(SURROGATE_KEYS_ATTR, set()).update(keys)
+
+
+def _cacheable():
+    return (request.method == 'GET' and not current_user.is_authenticated
+            and '_flashes' not in session)
+
+
+def _public_headers(response, keys):
+    ttl = int(os.getenv('PAGE_CACHE_PROXY_TTL', 10))
+    response.headers['Cache-Control'] = f'public, max-age=0, s-maxage={ttl}'
+    # nginx's proxy_cache honours this ahead of Cache-Control
+    response.headers['X-Accel-Expires'] = str(ttl)
+    response.headers['Surrogate-Key'] = ' '.join(sorted(keys))
+    response.vary.add('Cookie')
+
+
+def cached_page(view):
+    """Serve anonymous GETs of ``view`` from the page cache.
+
+    The view tags its page with ``tag()``; only plain 200 responses that
+    did not touch the session are stored.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        store = get_page_store()
+        if store is None or not _cacheable():
+            response = current_app.make_response(view(*args, **kwargs))
+            if current_user.is_authenticated:
+                response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+        key = request.host + request.full_path
+        entry = store.get(key)
+        if entry is not None:
+            response = current_app.response_class(entry['body'], status=entry['status'],
+                                                  content_type=entry['content_type'])
+            response.headers.update(entry.get('validators') or {})
+            response.headers['X-Cache'] = 'HIT'
+            _public_headers(response, entry['keys'])
+            # Answers If-None-Match / If-Modified-Since from the stored validators
+            return response.make_conditional(request)
+
+        started = time.time()
+        response = current_app.make_response(view(*args, **kwargs))
+        keys = g.get(SURROGATE_KEYS_ATTR)
+        if response.status_code == 200 and keys and not session.modified and not response.direct_passthrough:
+            conditional.add_validators(response)
+            store.set(key, {
+                'body': response.get_data(as_text=True),
+                'status': response.status_code,
+                'content_type': response.content_type,
+                'validators': {name: response.headers[name] for name in ('ETag', 'Last-Modified')
+                               if name in response.headers},
+                'keys': sorted(keys),
+                'stored_at': started
+            })
+            response.headers['X-Cache'] = 'MISS'
+            _public_headers(response, keys)
+        return response
+
+    return wrapper
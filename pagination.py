@@ -0,0 +1,92 @@
+import base64
+import json
+from datetime import datetime
+
+from cache import TTLCache
+
+
+def encode_cursor(timestamp, doc_id):
+    """Build an opaque page token pointing just after (timestamp, doc_id)."""
+    payload = json.dumps([timestamp.isoformat(), doc_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Return ``(timestamp, doc_id)`` for a page token, or None if it is malformed."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        timestamp, doc_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(timestamp), str(doc_id)
+    except (ValueError, TypeError, UnicodeError):
+        return None
+
+
+def encode_token(*values):
+    """Build an opaque token from JSON values; datetimes are supported."""
+    encoded = [{'dt': value.isoformat()} if isinstance(value, datetime) else value for value in values]
+    payload = json.dumps(encoded, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_token(token):
+    """Return the list of values in a token from ``encode_token``, or None if malformed."""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list):
+            return None
+        return [datetime.fromisoformat(value['dt']) if isinstance(value, dict) else value
+                for value in values]
+    except (ValueError, TypeError, KeyError, UnicodeError):
+        return None
+
+
+class PageIndex:
+    """Remembers which cursor starts each page number of a listing.
+
+    Keeps ``?page=N`` links working without reading and discarding the
+    earlier pages: once a page boundary has been seen it costs one bounded
+    query to serve that page again. It also remembers a listing's last page
+    once a walk reaches the end, so pages past it cost no reads.
+
+    ``window`` bounds both how far back ``nearest`` looks and how many pages
+    a single walk may cover.
+    """
+
+    def __init__(self, maxsize=4096, ttl=600, window=500):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.window = window
+
+    def get(self, listing, page):
+        return self._cache.get((listing, page))
+
+    def remember(self, listing, page, cursor):
+        if page > 1 and cursor:
+            self._cache.set((listing, page), cursor)
+
+    def last_page(self, listing):
+        """The listing's last page number, if a walk or a short page has found it."""
+        return self._cache.get((listing, 'last'))
+
+    def remember_last(self, listing, page):
+        self._cache.set((listing, 'last'), max(page, 1))
+
+    def nearest(self, listing, page):
+        """Return ``(page, cursor)`` for the closest known page at or before ``page``."""
+        for known in range(page, max(1, page - self.window), -1):
+            cursor = self._cache.get((listing, known))
+            if cursor:
+                return known, cursor
+        return 1, None
+
+    def clear(self):
+        self._cache.clear()
+
+
+# Page boundaries shift whenever posts are written, so the model clears this
+# on create/update/delete. Tokens already handed out stay valid.
+page_index = PageIndex()
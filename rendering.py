@@ -0,0 +1,34 @@
+import hashlib
+import os
+
+import markdown
+
+from cache import TTLCache
+import instrumentation
+
+# Bump when the markdown configuration changes so cached HTML is re-rendered
+RENDER_VERSION = 1
+
+# Rendered bodies keyed by content hash. The key changes whenever the content
+# does, so entries never need invalidating; the bound just caps memory.
+html_cache = TTLCache(
+    maxsize=int(os.getenv('RENDER_CACHE_SIZE', 512)),
+    ttl=int(os.getenv('RENDER_CACHE_TTL', 24 * 60 * 60))
+)
+
+
+def content_hash(content):
+    """Version of a post body as rendered by this module."""
+    payload = f"{RENDER_VERSION}:{content or ''}".encode('utf-8')
+    return hashlib.sha256(payload).hexdigest()
+
+
+def render_markdown(content, digest=None):
+    """Convert a post body to HTML, at most once per content version."""
+    digest = digest or content_hash(content)
+    html = html_cache.get(digest)
+    if html is None:
+        with instrumentation.timed('markdown'):
+            html = markdown.markdown(content or '')
+        html_cache.set(digest, html)
+    return html
@@ -1,18 +1,20 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify, Response, abort, stream_with_context
 from flask_login import login_required, current_user
-from models import Post, Category, User
+from models import Post, Category, User, Media
 from forms import PostForm, CategoryForm
 from werkzeug.utils import secure_filename
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 import uuid
-from firebase_admin import storage, firestore
+import stats
+import media_storage
+import uploads
+import imaging
+import bulk
+import concurrency
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
 
-# Initialize Firestore client using Firebase Admin
-db = firestore.client()
-
 @admin_bp.context_processor
 def inject_now():
     return {'now': datetime.utcnow()}
@@ -24,16 +26,30 @@ def dashboard():
         flash('You do not have permission to access the admin dashboard.', 'danger')
         return redirect(url_for('blog.index'))
     
-    # Get statistics from Firebase
+    # Read the maintained counters instead of scanning the posts collection
     try:
-        # Get total posts
-        posts = Post.get_all(limit=1000)  # Adjust limit as needed
-        total_posts = len(posts)
-        published_posts = len([p for p in posts if p.is_published])
+        post_stats, categories, total_users = concurrency.gather(
+            stats.get_stats, Category.get_all_cached, User.count)
+        category_names = {c.id: c.name for c in categories}
+        posts_by_category = sorted(
+            ((category_names.get(category_id, 'Unknown'), total)
+             for category_id, total in post_stats['by_category'].items() if total),
+            key=lambda item: item[1], reverse=True)
+        # Busiest authors, with their current names fetched in one batch
+        top_authors = sorted(((author_id, total) for author_id, total in post_stats['by_author'].items() if total),
+                             key=lambda item: item[1], reverse=True)[:10]
+        authors, _ = User.get_many(author_id for author_id, _ in top_authors)
+        author_names = {user.id: user.username for user in authors}
+        posts_by_author = [(author_names.get(author_id, 'Unknown'), total) for author_id, total in top_authors]
         
         return render_template('admin/dashboard.html', 
-                           total_posts=total_posts, 
-                           published_posts=published_posts)
+                           total_posts=post_stats['total'], 
+                           published_posts=post_stats['published'],
+                           draft_posts=post_stats['drafts'],
+                           total_users=total_users,
+                           total_categories=len(category_names),
+                           posts_by_category=posts_by_category,
+                           posts_by_author=posts_by_author)
     except Exception as e:
         flash(f'Error loading dashboard: {str(e)}', 'danger')
         return render_template('admin/dashboard.html', 
@@ -47,12 +63,15 @@ def list_posts():
         flash('You do not have permission to manage posts.', 'danger')
         return redirect(url_for('blog.index'))
     
+    page = max(request.args.get('page', 1, type=int), 1)
+    cursor = request.args.get('cursor')
     try:
-        posts = Post.get_all(limit=50, published_only=False)  # Get both published and draft posts
-        return render_template('admin/posts/list.html', posts=posts)
+        # Get both published and draft posts
+        posts, next_cursor = Post.get_page(limit=50, cursor=cursor, page=page, published_only=False)
+        return render_template('admin/posts/list.html', posts=posts, page=page, next_cursor=next_cursor)
     except Exception as e:
         flash(f'Error loading posts: {str(e)}', 'danger')
-        return render_template('admin/posts/list.html', posts=[])
+        return render_template('admin/posts/list.html', posts=[], page=1, next_cursor=None)
 
 @admin_bp.route('/posts/create', methods=['GET', 'POST'])
 @login_required
@@ -99,12 +118,17 @@ def edit_post(post_id):
         flash('You do not have permission to edit posts.', 'danger')
         return redirect(url_for('blog.index'))
     
-    post = Post.get(post_id)
+    try:
+        # The post and the category registry (reloaded when stale) are independent reads
+        post, categories = concurrency.gather(lambda: Post.get(post_id), Category.get_all_cached)
+    except Exception as e:
+        flash(f'Error loading post: {str(e)}', 'danger')
+        return redirect(url_for('admin.list_posts'))
     if not post:
         flash('Post not found.', 'danger')
         return redirect(url_for('admin.list_posts'))
     
-    form = PostForm(obj=post)
+    form = PostForm(obj=post, categories=categories)
     
     if form.validate_on_submit():
         try:
@@ -134,6 +158,23 @@ def edit_post(post_id):
     
     return render_template('admin/posts/editor.html', form=form, post=post)
 
+@admin_bp.route('/posts/<post_id>/featured-image')
+@login_required
+def featured_image_status(post_id):
+    # Polled by the editor while a featured image uploads in the background
+    if not current_user.is_admin:
+        return jsonify({'error': 'Unauthorized'}), 403
+    
+    post = Post.get(post_id)
+    if not post:
+        return jsonify({'error': 'Post not found'}), 404
+    
+    return jsonify({
+        'status': post.featured_image_status,
+        'url': post.featured_image,
+        'error': post.featured_image_error
+    })
+
 @admin_bp.route('/posts/<post_id>/delete', methods=['POST'])
 @login_required
 def delete_post(post_id):
@@ -156,6 +197,57 @@ def delete_post(post_id):
     
     return redirect(url_for('admin.list_posts'))
 
+@admin_bp.route('/posts/export')
+@login_required
+def export_posts():
+    if not current_user.is_admin:
+        flash('You do not have permission to export posts.', 'danger')
+        return redirect(url_for('blog.index'))
+    
+    # Streamed page by page; the collection is never loaded at once
+    published_only = request.args.get('published') == '1'
+    filename = f"posts-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.jsonl"
+    return Response(stream_with_context(bulk.iter_jsonl(published_only=published_only)),
+                    mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@admin_bp.route('/posts/import', methods=['POST'])
+@login_required
+def import_posts():
+    if not current_user.is_admin:
+        flash('You do not have permission to import posts.', 'danger')
+        return redirect(url_for('blog.index'))
+    
+    file = request.files.get('file')
+    extension = os.path.splitext(file.filename or '')[1].lower() if file else ''
+    if extension not in ('.jsonl', '.md', '.zip'):
+        flash('Upload a .jsonl file, a Markdown (.md) file or a .zip of Markdown files.', 'danger')
+        return redirect(url_for('admin.list_posts'))
+    
+    # The import runs on the upload queue; a failed attempt resumes where it stopped
+    path = uploads.spool(file)
+    os.replace(path, path + extension)
+    path += extension
+    author = current_user._get_current_object()
+    name = file.filename
+    # The spooled copy has a random name; derive record ids from the content
+    # instead, so uploading the same archive again skips what it imported
+    source = bulk.file_digest(path)
+    
+    def finished(result):
+        bulk.logger.info("Imported %s posts from %s, skipped %s", result[0], name, result[1])
+    
+    def cleanup():
+        for leftover in (path, f'{path}.import-state.json'):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+    
+    uploads.upload_queue.submit(lambda: bulk.import_posts(path, author=author, source=source), on_success=finished,
+                                on_failure=lambda e: bulk.logger.error("Import of %s failed: %s", name, e),
+                                cleanup=cleanup)
+    flash('Import started. Imported posts appear in the list as their batches are written.', 'success')
+    return redirect(url_for('admin.list_posts'))
+
 @admin_bp.route('/upload/image', methods=['POST'])
 @login_required
 def upload_image():
@@ -170,21 +262,24 @@ def upload_image():
         if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
             return jsonify({'error': 'Invalid file type'}), 400
         
-        # Generate unique filename
+        # Generate unique filename; served as immutable, so names are never reused
         filename = secure_filename(file.filename)
         timestamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
-        filename = f"{timestamp}-{filename}"
+        filename = f"{timestamp}-{uuid.uuid4().hex[:8]}-{filename}"
         
-        # Upload to Firestore
-        doc_ref = db.collection('images').document(filename)
-        doc_ref.set({
-            'filename': filename,
-            'content_type': file.content_type,
-            'data': file.read()
-        })
+        # Store the bytes in the media store and only metadata in the backend
+        metadata = media_storage.describe(file.stream)
+        media_storage.get_media_store().save(filename, file.stream, content_type=file.content_type)
+        if not Media.create(filename, file.content_type, **metadata):
+            media_storage.get_media_store().delete(filename)
+            return jsonify({'error': 'Could not save media metadata'}), 500
+        if metadata['width']:
+            # Thumbnails and responsive sizes are generated off the request path
+            Media.queue_variants(filename, uploads.spool(file))
         
         return jsonify({
-            'location': f'/admin/media/{filename}'  # TinyMCE expects the URL in the 'location' field
+            'success': True,
+            'location': url_for('admin.serve_media', filename=filename)  # TinyMCE expects the URL in the 'location' field
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -201,7 +296,8 @@ def preview_post(post_id):
         flash('Post not found.', 'danger')
         return redirect(url_for('admin.list_posts'))
     
-    return render_template('blog/post.html', post=post, preview=True)
+    categories, _ = Category.get_many(post.categories)
+    return render_template('blog/post.html', post=post, preview=True, categories=categories)
 
 @admin_bp.route('/categories')
 @login_required
@@ -252,18 +348,11 @@ def delete_category(category_id):
     
     try:
         # Get the category
-        categories = db.collection('categories').where('id', '==', category_id).limit(1).get()
-        if not categories:
+        category = Category.get(category_id)
+        if category is None:
             flash('Category not found.', 'danger')
             return redirect(url_for('admin.list_categories'))
         
-        category_doc = categories[0]
-        category = Category(
-            id=category_doc.id,
-            name=category_doc.get('name'),
-            description=category_doc.get('description')
-        )
-        
         if category.delete():
             flash('Category deleted successfully!', 'success')
         else:
@@ -273,6 +362,14 @@ def delete_category(category_id):
     
     return redirect(url_for('admin.list_categories'))
 
+MEDIA_TYPES = ['image/jpeg', 'image/png', 'image/gif', 'image/webp']
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d') if value else None
+    except ValueError:
+        return None
+
 @admin_bp.route('/media')
 @login_required
 def media():
@@ -280,26 +377,49 @@ def media():
         flash('You do not have permission to manage media.', 'danger')
         return redirect(url_for('blog.index'))
     
+    content_type = request.args.get('type') or None
+    sort = request.args.get('sort', 'newest')
+    cursor = request.args.get('cursor')
+    since = parse_date(request.args.get('from'))
+    until = parse_date(request.args.get('to'))
+    if until:
+        # Make the end date inclusive
+        until += timedelta(days=1)
+    
+    filters = {key: request.args[key] for key in ('type', 'sort', 'from', 'to') if request.args.get(key)}
     try:
-        # List all files in the media bucket
-        images_ref = db.collection('images')
-        images = images_ref.get()
-        
-        # Organize files by type
-        media_files = []
-        for image in images:
-            media_files.append({
-                'name': image.id,
-                'url': f'/admin/media/{image.id}',
-                'size': len(image.get('data')),
-                'updated': image.update_time,
-                'content_type': image.get('content_type')
-            })
-        
-        return render_template('admin/media/list.html', media_files=media_files)
+        media_files, next_cursor = Media.get_page(limit=24, cursor=cursor, sort=sort,
+                                                  content_type=content_type, since=since, until=until)
+        return render_template('admin/media/list.html', media_files=media_files, next_cursor=next_cursor,
+                               filters=filters, sorts=list(Media.SORTS), content_types=MEDIA_TYPES)
     except Exception as e:
         flash(f'Error loading media files: {str(e)}', 'danger')
-        return render_template('admin/media/list.html', media_files=[])
+        return render_template('admin/media/list.html', media_files=[], next_cursor=None,
+                               filters=filters, sorts=list(Media.SORTS), content_types=MEDIA_TYPES)
+
+@admin_bp.route('/media/<path:filename>', methods=['GET'])
+def serve_media(filename):
+    # Public: uploaded images are embedded in published posts
+    try:
+        stored = media_storage.get_media_store().open(filename)
+    except ValueError:
+        # A name that escapes the media root
+        abort(404)
+    if stored is None:
+        # Images uploaded before the media store kept their bytes in Firestore
+        data = Media.get_legacy_data(filename) if '/' not in filename else None
+        if not data:
+            abort(404)
+        stored = iter([data]), len(data)
+    
+    chunks, size = stored
+    response = Response(chunks, mimetype=media_storage.guess_content_type(filename))
+    if size is not None:
+        response.content_length = size
+    # Filenames are unique per upload, so the content never changes
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    return response
 
 @admin_bp.route('/media/<path:filename>', methods=['DELETE'])
 @login_required
@@ -308,9 +428,13 @@ def delete_media(filename):
         return jsonify({'success': False, 'error': 'Permission denied'}), 403
     
     try:
-        # Delete file from Firestore
-        doc_ref = db.collection('images').document(filename)
-        doc_ref.delete()
+        # Delete the stored file, its resized copies and its metadata
+        store = media_storage.get_media_store()
+        store.delete(filename)
+        for derived in imaging.variant_names(filename):
+            store.delete(derived)
+        if not Media.delete(filename):
+            return jsonify({'success': False, 'error': 'Could not delete media metadata'}), 500
         
         return jsonify({'success': True})
     except Exception as e:
@@ -324,15 +448,7 @@ def manage_users():
         return redirect(url_for('blog.index'))
     
     try:
-        # Get all users from Firestore
-        users_ref = db.collection('users')
-        users_docs = users_ref.get()
-        users = [User(
-            uid=doc.id,
-            username=doc.get('username'),
-            email=doc.get('email'),
-            is_admin=doc.get('is_admin', False)
-        ) for doc in users_docs]
+        users = User.get_all()
         
         return render_template('admin/users.html', users=users)
     except Exception as e:
@@ -347,9 +463,7 @@ def make_admin(user_id):
         return redirect(url_for('blog.index'))
     
     try:
-        # Update user in Firestore
-        user_ref = db.collection('users').document(user_id)
-        user_ref.update({'is_admin': True})
+        User.make_admin(user_id)
         flash('User has been made an admin successfully!', 'success')
     except Exception as e:
         flash(f'Error updating user: {str(e)}', 'danger')
@@ -2,7 +2,7 @@ from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
 from models import User
 from forms import LoginForm, RegistrationForm
-from firebase_config import auth_instance
+from firebase_config import get_auth
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -15,10 +15,10 @@ def login():
     if form.validate_on_submit():
         try:
             # Authenticate with Firebase
-            user_data = auth_instance.sign_in_with_email_and_password(form.email.data, form.password.data)
+            user_data = get_auth().sign_in_with_email_and_password(form.email.data, form.password.data)
             
             # Get user from Firestore
-            user = User.get(user_data['localId'])
+            user = User.get(user_data['localId'], use_cache=False)
             if user:
                 login_user(user, remember=form.remember_me.data)
                 next_page = request.args.get('next')
@@ -60,7 +60,7 @@ def register():
 def logout():
     try:
         # Sign out from Firebase
-        auth_instance.current_user = None
+        get_auth().current_user = None
         logout_user()
         flash('You have been logged out.', 'success')
     except Exception as e:
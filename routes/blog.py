@@ -3,18 +3,33 @@ from flask_login import login_required, current_user
 from models import Post, Category
 from forms import PostForm
 from datetime import datetime
+import page_cache
+import conditional
+import search
 
 blog_bp = Blueprint('blog', __name__)
-
-# Cache for category names to avoid multiple database calls
-category_cache = {}
+blog_bp.after_request(conditional.add_validators)
 
 def get_category_name(category_id):
-    """Helper function to get category name from cache or database"""
-    if category_id not in category_cache:
-        category = Category.get(category_id)
-        category_cache[category_id] = category.name if category else 'Unknown'
-    return category_cache[category_id]
+    """Helper function to get category name from the category registry"""
+    category = Category.get(category_id)
+    return category.name if category else 'Unknown'
+
+def categories_for(posts):
+    """Resolve every category referenced by ``posts`` in one batch, keyed by id"""
+    categories, _ = Category.get_many(category_id for post in posts for category_id in post.categories)
+    return {category.id: category for category in categories}
+
+def post_version(post):
+    """Stored fields that change whatever a post's page or listing entry shows"""
+    return (post.id, post.timestamp, post.content_hash, tuple(post.categories),
+            post.featured_image, post.featured_image_status)
+
+def listing_etag(listing, page, posts, next_cursor, *extra):
+    # Listings send no Last-Modified: deleting or unpublishing a post changes
+    # the page without moving the newest timestamp on it
+    return conditional.make_etag(listing, page, next_cursor, *extra,
+                                 *(post_version(post) for post in posts))
 
 @blog_bp.context_processor
 def utility_processor():
@@ -22,20 +37,41 @@ def utility_processor():
     return dict(get_category_name=get_category_name)
 
 @blog_bp.route('/')
+@page_cache.cached_page
 def index():
-    page = request.args.get('page', 1, type=int)
-    offset = (page - 1) * 10
+    page = max(request.args.get('page', 1, type=int), 1)
+    cursor = request.args.get('cursor')
     try:
-        posts = Post.get_all(limit=10, offset=offset, published_only=True)
-        return render_template('blog/index.html', posts=posts, page=page)
+        posts, next_cursor = Post.get_page(limit=10, cursor=cursor, page=page, published_only=True)
+        page_cache.tag('posts', *(f'category-{category_id}' for post in posts for category_id in post.categories))
+        not_modified = conditional.check(listing_etag('index', page, posts, next_cursor))
+        if not_modified:
+            return not_modified
+        return render_template('blog/index.html', posts=posts, page=page, next_cursor=next_cursor,
+                               categories=categories_for(posts))
     except Exception as e:
         flash(f'Error loading posts: {str(e)}', 'error')
-        return render_template('blog/index.html', posts=[], page=1)
+        return render_template('blog/index.html', posts=[], page=1, next_cursor=None, categories={})
 
-@blog_bp.route('/post/<post_id>')
-def view_post(post_id):
+@blog_bp.route('/search')
+def search_posts():
+    query = request.args.get('q', '').strip()
+    cursor = request.args.get('cursor')
+    hits, next_cursor = [], None
+    if query:
+        try:
+            hits, next_cursor = search.get_index().search(query, limit=10, cursor=cursor)
+        except Exception as e:
+            flash(f'Error searching posts: {str(e)}', 'error')
+    return render_template('blog/search.html', query=query, hits=hits, cursor=cursor,
+                           next_cursor=next_cursor)
+
+@blog_bp.route('/post/<slug>')
+@page_cache.cached_page
+def view_post(slug):
     try:
-        post = Post.get(post_id)
+        # Accepts current slugs, old slugs and post ids
+        post = Post.resolve(slug)
         if post is None:
             flash('Post not found.', 'error')
             return redirect(url_for('blog.index'))
@@ -45,27 +81,45 @@ def view_post(post_id):
             flash('This post is not published.', 'error')
             return redirect(url_for('blog.index'))
         
-        return render_template('blog/post.html', post=post)
+        if slug != post.url_key:
+            return redirect(url_for('blog.view_post', slug=post.url_key), code=301)
+        
+        page_cache.tag(f'post-{post.id}', *(f'category-{category_id}' for category_id in post.categories))
+        # No Last-Modified: image processing changes the page without moving the timestamp
+        not_modified = conditional.check(conditional.make_etag('post', *post_version(post)))
+        if not_modified:
+            return not_modified
+        categories, _ = Category.get_many(post.categories)
+        return render_template('blog/post.html', post=post, categories=categories)
     except Exception as e:
         flash(f'Error loading post: {str(e)}', 'error')
         return redirect(url_for('blog.index'))
 
 @blog_bp.route('/category/<category_id>')
+@page_cache.cached_page
 def category_posts(category_id):
     try:
+        page = max(request.args.get('page', 1, type=int), 1)
+        cursor = request.args.get('cursor')
+        # Categories come from the in-memory registry, so only the posts are read
         category = Category.get(category_id)
         if category is None:
             flash('Category not found.', 'error')
             return redirect(url_for('blog.index'))
+        posts, next_cursor = Post.get_by_category(category_id, limit=10, cursor=cursor, page=page,
+                                                  published_only=True)
         
-        page = request.args.get('page', 1, type=int)
-        offset = (page - 1) * 10
-        posts = Post.get_by_category(category_id, limit=10, offset=offset, published_only=True)
+        page_cache.tag('posts', f'category-{category_id}')
+        etag = listing_etag('category', page, posts, next_cursor, category.id, category.name, category.description)
+        not_modified = conditional.check(etag)
+        if not_modified:
+            return not_modified
         
         return render_template('blog/category_posts.html', 
                              category=category, 
                              posts=posts,
-                             page=page)
+                             page=page,
+                             next_cursor=next_cursor)
     except Exception as e:
         flash(f'Error loading category posts: {str(e)}', 'error')
         return redirect(url_for('blog.index'))
@@ -88,7 +142,7 @@ def update_post(post_id):
     # Ensure only the author can edit the post
     if post.author_id != current_user.id:
         flash('You do not have permission to edit this post.', 'danger')
-        return redirect(url_for('blog.view_post', post_id=post.id))
+        return redirect(url_for('blog.view_post', slug=post.url_key))
     
     form = PostForm(obj=post)
     if form.validate_on_submit():
@@ -103,7 +157,7 @@ def update_post(post_id):
             )
             
             flash('Your post has been updated!', 'success')
-            return redirect(url_for('blog.view_post', post_id=post.id))
+            return redirect(url_for('blog.view_post', slug=post.url_key))
         except Exception as e:
             flash(f'Error updating post: {str(e)}', 'error')
     
@@ -117,7 +171,7 @@ def delete_post(post_id):
     # Ensure only the author can delete the post
     if post.author_id != current_user.id:
         flash('You do not have permission to delete this post.', 'danger')
-        return redirect(url_for('blog.view_post', post_id=post.id))
+        return redirect(url_for('blog.view_post', slug=post.url_key))
     
     try:
         post.delete()
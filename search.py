@@ -0,0 +1,365 @@
+"""Full-text search over published posts.
+
+Posts are tokenised into case-folded words, in any script, and kept in an
+inverted index on local disk (``SEARCH_INDEX_PATH``, a SQLite file shared
+by the workers on a host). Each term's postings are two packed integer arrays,
+sorted document numbers and term frequencies, so a query reads one small
+row per term and never touches the storage backend. Results are ranked
+with BM25; title terms count ``TITLE_WEIGHT`` times.
+
+``Post.create``/``update``/``delete`` keep the index current. Run
+``python search.py rebuild`` to build it from scratch, for example on a
+new host or after importing posts.
+"""
+import argparse
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from pagination import encode_token, decode_token
+
+logger = logging.getLogger(__name__)
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+TITLE_WEIGHT = 3
+
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have i if in into is it its of on or
+so that the their there these this to was were will with you your we our not
+""".split())
+
+_TOKEN = re.compile(r'\w+')
+
+# SQLite's default limit on bound parameters is 999 in older builds
+_CHUNK = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc INTEGER PRIMARY KEY,
+    post_id TEXT NOT NULL UNIQUE,
+    length INTEGER NOT NULL,
+    terms TEXT NOT NULL,
+    slug TEXT,
+    title TEXT,
+    excerpt TEXT,
+    timestamp TEXT
+);
+-- docs and freqs are packed unsigned int arrays in doc order
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT PRIMARY KEY,
+    docs BLOB NOT NULL,
+    freqs BLOB NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def tokenize(text):
+    """Case-folded word terms of ``text`` in any script, without stopwords and single ASCII characters."""
+    text = unicodedata.normalize('NFKC', text or '').casefold()
+    return [term for term in _TOKEN.findall(text)
+            if term not in STOPWORDS and (len(term) > 1 or not term.isascii())]
+
+
+def term_counts(post_data):
+    """Weighted term frequencies of a post."""
+    counts = Counter(tokenize(post_data.get('content')))
+    counts.update(tokenize(post_data.get('excerpt')))
+    for term in tokenize(post_data.get('title')):
+        counts[term] += TITLE_WEIGHT
+    return counts
+
+
+def _timestamp_text(value):
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+class SearchHit:
+    """A search result, rendered from the index without loading the post."""
+
+    def __init__(self, post_id, slug, title, excerpt, timestamp, score):
+        self.id = post_id
+        self.slug = slug
+        self.title = title or ''
+        self.excerpt = excerpt or ''
+        self.created_at = datetime.strptime(timestamp, TIMESTAMP_FORMAT) if timestamp else None
+        self.score = score
+
+    @property
+    def url_key(self):
+        return self.slug or self.id
+
+
+class SearchIndex:
+    """Inverted index of published posts in a SQLite file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        # Connections are not shared across a fork
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def index(self, post_id, post_data):
+        """Add or refresh a post; unpublished posts are removed instead."""
+        with self._transaction() as conn:
+            self._index(conn, post_id, post_data)
+
+    def index_many(self, posts):
+        """Index ``(post_id, post_data)`` pairs in one transaction."""
+        with self._transaction() as conn:
+            return self._index_all(conn, posts)
+
+    def replace_all(self, posts):
+        """Replace the whole index with ``posts`` in one transaction.
+
+        Searches keep seeing the previous index until the new one commits.
+        """
+        with self._transaction() as conn:
+            self._clear(conn)
+            return self._index_all(conn, posts)
+
+    def _index_all(self, conn, posts):
+        count = 0
+        for post_id, post_data in posts:
+            self._index(conn, post_id, post_data)
+            count += 1
+        return count
+
+    def remove(self, post_id):
+        with self._transaction() as conn:
+            self._remove(conn, post_id)
+
+    def clear(self):
+        with self._transaction() as conn:
+            self._clear(conn)
+
+    @staticmethod
+    def _clear(conn):
+        conn.execute('DELETE FROM docs')
+        conn.execute('DELETE FROM postings')
+
+    def _index(self, conn, post_id, post_data):
+        if not post_data.get('is_published'):
+            self._remove(conn, post_id)
+            return
+
+        counts = term_counts(post_data)
+        row = conn.execute('SELECT doc, terms FROM docs WHERE post_id = ?', (post_id,)).fetchone()
+        fields = (sum(counts.values()), ' '.join(sorted(counts)), post_data.get('slug'),
+                  post_data.get('title'), post_data.get('excerpt'), _timestamp_text(post_data.get('timestamp')))
+        if row is None:
+            doc = conn.execute(
+                'INSERT INTO docs (post_id, length, terms, slug, title, excerpt, timestamp) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)', (post_id,) + fields).lastrowid
+            old_terms = set()
+        else:
+            doc, old_terms = row[0], set(row[1].split())
+            conn.execute(
+                'UPDATE docs SET length = ?, terms = ?, slug = ?, title = ?, excerpt = ?, timestamp = ? '
+                'WHERE doc = ?', fields + (doc,))
+
+        # Only the postings of terms that were added, removed or changed are rewritten
+        for term in old_terms - set(counts):
+            self._set_posting(conn, term, doc, 0)
+        for term, freq in counts.items():
+            self._set_posting(conn, term, doc, freq)
+
+    def _remove(self, conn, post_id):
+        row = conn.execute('SELECT doc, terms FROM docs WHERE post_id = ?', (post_id,)).fetchone()
+        if row is None:
+            return
+        doc, terms = row
+        for term in terms.split():
+            self._set_posting(conn, term, doc, 0)
+        conn.execute('DELETE FROM docs WHERE doc = ?', (doc,))
+
+    @staticmethod
+    def _set_posting(conn, term, doc, freq):
+        """Set ``doc``'s frequency in ``term``'s postings; 0 removes it."""
+        docs, freqs = array('I'), array('I')
+        row = conn.execute('SELECT docs, freqs FROM postings WHERE term = ?', (term,)).fetchone()
+        if row is not None:
+            docs.frombytes(row[0])
+            freqs.frombytes(row[1])
+
+        i = bisect_left(docs, doc)
+        present = i < len(docs) and docs[i] == doc
+        if freq:
+            if present:
+                if freqs[i] == freq:
+                    return
+                freqs[i] = freq
+            else:
+                docs.insert(i, doc)
+                freqs.insert(i, freq)
+        elif present:
+            del docs[i]
+            del freqs[i]
+        else:
+            return
+
+        if docs:
+            conn.execute('INSERT OR REPLACE INTO postings (term, docs, freqs) VALUES (?, ?, ?)',
+                         (term, docs.tobytes(), freqs.tobytes()))
+        else:
+            conn.execute('DELETE FROM postings WHERE term = ?', (term,))
+
+    def search(self, query, limit=10, cursor=None):
+        """Return ``(hits, next_cursor)`` for one page of BM25-ranked results."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return [], None
+
+        conn = self._connection()
+        total_docs, total_length = conn.execute('SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs').fetchone()
+        if not total_docs:
+            return [], None
+        avgdl = total_length / total_docs
+
+        postings = []
+        for term in terms:
+            row = conn.execute('SELECT docs, freqs FROM postings WHERE term = ?', (term,)).fetchone()
+            if row is None:
+                continue
+            docs, freqs = array('I'), array('I')
+            docs.frombytes(row[0])
+            freqs.frombytes(row[1])
+            idf = math.log(1 + (total_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            postings.append((idf, docs, freqs))
+        if not postings:
+            return [], None
+
+        candidates = set()
+        for _, docs, _ in postings:
+            candidates.update(docs)
+        lengths = self._lengths(conn, candidates)
+
+        scores = dict.fromkeys(candidates, 0.0)
+        for idf, docs, freqs in postings:
+            for doc, freq in zip(docs, freqs):
+                norm = K1 * (1 - B + B * lengths.get(doc, avgdl) / avgdl)
+                scores[doc] += idf * freq * (K1 + 1) / (freq + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        position = decode_token(cursor)
+        if position and len(position) == 2:
+            after = (-position[0], position[1])
+            ranked = [item for item in ranked if (-item[1], item[0]) > after]
+
+        page = ranked[:limit]
+        next_cursor = None
+        if len(ranked) > limit:
+            last_doc, last_score = page[-1]
+            next_cursor = encode_token(last_score, last_doc)
+        return self._hits(conn, page), next_cursor
+
+    @staticmethod
+    def _lengths(conn, docs):
+        docs = list(docs)
+        lengths = {}
+        for start in range(0, len(docs), _CHUNK):
+            chunk = docs[start:start + _CHUNK]
+            placeholders = ', '.join('?' * len(chunk))
+            lengths.update(conn.execute(f'SELECT doc, length FROM docs WHERE doc IN ({placeholders})', chunk))
+        return lengths
+
+    @staticmethod
+    def _hits(conn, page):
+        if not page:
+            return []
+        placeholders = ', '.join('?' * len(page))
+        rows = conn.execute(f'SELECT doc, post_id, slug, title, excerpt, timestamp FROM docs '
+                            f'WHERE doc IN ({placeholders})', [doc for doc, _ in page])
+        by_doc = {row[0]: row[1:] for row in rows}
+        return [SearchHit(*by_doc[doc], score) for doc, score in page if doc in by_doc]
+
+
+_index = None
+
+
+def get_index():
+    """The search index at ``SEARCH_INDEX_PATH``."""
+    global _index
+    if _index is None:
+        default_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'search.db')
+        _index = SearchIndex(os.getenv('SEARCH_INDEX_PATH', default_path))
+    return _index
+
+
+def index_post(post_id, post_data):
+    """Bring a post's index entry up to date; errors never fail the post write."""
+    try:
+        get_index().index(post_id, post_data)
+    except Exception:
+        logger.exception("Error indexing post")
+
+
+def remove_post(post_id):
+    try:
+        get_index().remove(post_id)
+    except Exception:
+        logger.exception("Error removing post from search index")
+
+
+def rebuild():
+    """Re-index every post from the storage backend."""
+    from backends import get_backend
+
+    fields = ['title', 'slug', 'excerpt', 'content', 'is_published', 'timestamp']
+    return get_index().replace_all(get_backend().stream_posts(fields=fields))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Manage the full-text search index')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('rebuild', help='re-index every post from the storage backend')
+    query_parser = subparsers.add_parser('query', help='run a search and print the ranked results')
+    query_parser.add_argument('text', help='search terms')
+    query_parser.add_argument('--limit', type=int, default=10)
+
+    args = parser.parse_args()
+    if args.command == 'rebuild':
+        print(f"Indexed {rebuild()} posts")
+    else:
+        hits, _ = get_index().search(args.text, limit=args.limit)
+        for hit in hits:
+            print(f"{hit.score:8.3f}  {hit.title} ({hit.url_key})")
@@ -0,0 +1,36 @@
+import re
+import unicodedata
+
+MAX_LENGTH = 80
+
+# Static routes under /post/ that Flask matches ahead of /post/<slug>
+RESERVED = frozenset({'new'})
+
+_UUID = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+
+def slugify(text):
+    """URL-safe ASCII slug for ``text``, e.g. ``"Héllo, World!"`` -> ``"hello-world"``."""
+    text = unicodedata.normalize('NFKD', text or '').encode('ascii', 'ignore').decode('ascii')
+    slug = re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+    slug = slug[:MAX_LENGTH].rstrip('-') or 'post'
+    if looks_like_id(slug):
+        # Keep slugs and post ids apart so an id URL never needs a slug lookup
+        slug = f'post-{slug}'
+    return slug
+
+
+def looks_like_id(value):
+    """Whether ``value`` has the shape of a post id (a UUID4 string)."""
+    return bool(_UUID.match(value or ''))
+
+
+def candidates(base):
+    """Slugs to try for ``base`` in order: ``base``, ``base-2``, ``base-3``, ...
+
+    A reserved ``base`` is skipped, so a post titled "New" gets ``new-2``.
+    """
+    if base not in RESERVED:
+        yield base
+    for n in range(2, 100):
+        yield f'{base}-{n}'
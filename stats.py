@@ -0,0 +1,92 @@
+"""Maintained post counters for the admin dashboard.
+
+The counters are kept in a single record that the storage backend updates
+in the same transaction as the post write that changes them, so the
+dashboard reads one record instead of the whole posts collection.
+Run ``python stats.py repair`` to rebuild them from scratch.
+"""
+import argparse
+import logging
+
+COUNTER_FIELDS = ('total', 'published', 'drafts')
+GROUPS = ('by_category', 'by_author')
+
+logger = logging.getLogger(__name__)
+
+
+def post_counts(post_data):
+    """Counter contributions of a single post document (empty if there is none)."""
+    if not post_data:
+        return {'total': 0, 'published': 0, 'drafts': 0, 'by_category': {}, 'by_author': {}}
+
+    published = bool(post_data.get('is_published'))
+    author_id = (post_data.get('author') or {}).get('id')
+    return {
+        'total': 1,
+        'published': 1 if published else 0,
+        'drafts': 0 if published else 1,
+        'by_category': {category_id: 1 for category_id in post_data.get('categories') or []},
+        'by_author': {author_id: 1} if author_id else {}
+    }
+
+
+def diff(before, after):
+    """Counter changes needed when a post goes from ``before`` to ``after``."""
+    old, new = post_counts(before), post_counts(after)
+    delta = {field: new[field] - old[field] for field in COUNTER_FIELDS}
+    for group in GROUPS:
+        keys = set(old[group]) | set(new[group])
+        delta[group] = {key: new[group].get(key, 0) - old[group].get(key, 0) for key in keys}
+    return delta
+
+
+def apply(totals, delta):
+    """Add ``delta`` to a counters dict in place, dropping groups that reach zero."""
+    for field in COUNTER_FIELDS:
+        totals[field] = totals.get(field, 0) + delta[field]
+    for group in GROUPS:
+        counts = totals.setdefault(group, {})
+        for key, value in delta[group].items():
+            counts[key] = counts.get(key, 0) + value
+            if not counts[key]:
+                del counts[key]
+    return totals
+
+
+def get_stats():
+    """Current counters, with zeros for anything not recorded yet."""
+    from backends import get_backend
+
+    stats = post_counts(None)
+    try:
+        stats.update(get_backend().get_stats() or {})
+    except Exception:
+        logger.exception("Error getting stats")
+    return stats
+
+
+def recompute():
+    """Rebuild the counters from every stored post and overwrite the stored ones."""
+    from backends import get_backend
+
+    backend = get_backend()
+    totals = post_counts(None)
+    for _, post_data in backend.stream_posts(fields=['is_published', 'categories', 'author.id']):
+        apply(totals, diff(None, post_data))
+
+    backend.set_stats(totals)
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Manage the post counters shown on the admin dashboard')
+    parser.add_argument('command', choices=['show', 'repair'],
+                        help='show the stored counters or recompute them from the posts collection')
+
+    args = parser.parse_args()
+    stats = recompute() if args.command == 'repair' else get_stats()
+    print(f"Total posts: {stats['total']}")
+    print(f"Published: {stats['published']}")
+    print(f"Drafts: {stats['drafts']}")
+    print(f"Categories: {len(stats['by_category'])}")
+    print(f"Authors: {len(stats['by_author'])}")
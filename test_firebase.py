@@ -1,4 +1,4 @@
-from firebase_config import db, auth_instance, storage_instance
+from firebase_config import get_db
 from models import User, Post, Category
 from datetime import datetime
 import sys
@@ -7,7 +7,7 @@ def test_firebase_connection():
     print("Testing Firebase connection...")
     try:
         # Test Firestore connection
-        collections = db.collections()
+        collections = get_db().collections()
         print("[OK] Successfully connected to Firestore")
         print("Available collections:", [col.id for col in collections])
         return True
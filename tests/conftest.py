@@ -0,0 +1,126 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backends
+import media_storage
+import page_cache
+import pagination
+import rendering
+import search
+import uploads
+import models
+from models import Post, User
+
+
+@pytest.fixture(autouse=True)
+def storage(tmp_path, monkeypatch):
+    """A fresh SQLite backend, search index and local media store for every test."""
+    monkeypatch.setenv('STORAGE_BACKEND', 'sqlite')
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'blog.db'))
+    monkeypatch.setenv('SEARCH_INDEX_PATH', str(tmp_path / 'search.db'))
+    monkeypatch.setenv('MEDIA_BACKEND', 'local')
+    monkeypatch.setenv('MEDIA_ROOT', str(tmp_path / 'media'))
+    monkeypatch.setenv('PAGE_CACHE', 'memory')
+    monkeypatch.setenv('LOG_LEVEL', 'WARNING')
+    monkeypatch.delenv('METRICS_TOKEN', raising=False)
+
+    monkeypatch.setattr(backends, '_backend', None)
+    monkeypatch.setattr(search, '_index', None)
+    monkeypatch.setattr(page_cache, '_store', None)
+    monkeypatch.setattr(media_storage, '_store', None)
+    # Background jobs run on a queue of their own, without backoff, so tests can wait for them
+    monkeypatch.setattr(uploads, 'upload_queue', uploads.UploadQueue(max_workers=1, backoff=0))
+
+    for cache in (models.user_cache, models.category_first_pages, models.slug_cache, models.post_cache._cache,
+                  rendering.html_cache):
+        cache.clear()
+    models.category_registry.invalidate()
+    pagination.page_index.clear()
+    return tmp_path
+
+
+@pytest.fixture
+def backend():
+    return backends.get_backend()
+
+
+@pytest.fixture
+def app():
+    from app import create_app
+    return create_app({'TESTING': True, 'WTF_CSRF_ENABLED': False})
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin(backend):
+    backend.put_user('admin', {'username': 'admin', 'email': 'admin@example.com', 'is_admin': True})
+    return User('admin', 'admin', 'admin@example.com', is_admin=True)
+
+
+@pytest.fixture
+def admin_client(app, admin):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = admin.id
+        session['_fresh'] = True
+    return client
+
+
+def spy(monkeypatch, backend, name):
+    """Record the arguments of every call to backend method ``name``."""
+    calls = []
+    inner = backend._backend
+    original = getattr(inner, name)
+
+    def method(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(inner, name, method)
+    # InstrumentedBackend keeps the methods it has wrapped
+    backend.__dict__.pop(name, None)
+    return calls
+
+
+def wait_for_uploads():
+    """Block until every job queued on the upload queue has finished."""
+    uploads.upload_queue._executor.shutdown(wait=True)
+
+
+def make_post(title='A post', content='Some content.', author=None, categories=None, is_published=True,
+              **kwargs):
+    post = Post.create(title=title, content=content, author=author or User('author', 'author', 'a@example.com'),
+                       categories=categories, is_published=is_published, **kwargs)
+    assert post is not None
+    return post
+
+
+def make_posts(backend, count, published=True, categories=None, start=datetime(2024, 1, 1)):
+    """Write ``count`` posts straight through the backend, newest first; returns their ids."""
+    ids = []
+    for n in range(count):
+        post_id = f'post-{n:04d}'
+        timestamp = start - timedelta(minutes=n)
+        backend.create_post(post_id, {
+            'title': f'Post {n}',
+            'slug': f'post-{n}',
+            'content': f'Body of post {n}.',
+            'excerpt': '',
+            'author': {'id': 'author', 'username': 'author', 'email': 'a@example.com'},
+            'categories': list(categories or []),
+            'is_published': published,
+            'timestamp': timestamp,
+            'created_at': timestamp,
+            'updated_at': timestamp
+        })
+        ids.append(post_id)
+    return ids
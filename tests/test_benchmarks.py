@@ -0,0 +1,54 @@
+from backends.sqlite_backend import SQLiteBackend
+from benchmarks import corpus
+from benchmarks.run import backend_counts, build_scenarios, compare, percentile, run_scenario
+
+SIZES = dict(posts=30, categories=4, images=10, paragraphs=2)
+
+
+def test_corpus_is_deterministic(tmp_path):
+    first = SQLiteBackend(str(tmp_path / 'first.db'))
+    second = SQLiteBackend(str(tmp_path / 'second.db'))
+    assert corpus.seed(first, **SIZES) == corpus.seed(second, **SIZES)
+    assert list(first.stream_posts()) == list(second.stream_posts())
+    assert corpus.seed(SQLiteBackend(str(tmp_path / 'third.db')), seed=2, **SIZES) != corpus.seed(
+        SQLiteBackend(str(tmp_path / 'fourth.db')), **SIZES)
+
+
+def test_describe_matches_seed(backend):
+    summary = corpus.seed(backend, **SIZES)
+    described = corpus.describe(backend)
+    assert described['posts'] == summary['posts']
+    assert sorted(described['published_slugs']) == sorted(summary['published_slugs'])
+    assert sorted(described['category_ids']) == sorted(summary['category_ids'])
+    assert described['images'] == summary['images']
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) == 0.0
+
+
+def test_scenarios_run_against_the_app(backend, app, monkeypatch):
+    # As the runner does by default, so the requests reach the backend
+    monkeypatch.setenv('PAGE_CACHE', 'off')
+    summary = corpus.seed(backend, **SIZES)
+    scenarios = build_scenarios(summary, deep_page=2)
+    for name in ('index', 'index_deep', 'view_post', 'category_posts', 'admin_dashboard', 'admin_media'):
+        result = run_scenario(app, scenarios[name], requests=3, concurrency=1, warmup=1)
+        assert result['errors'] == 0, name
+        assert result['reads_per_request'] > 0, name
+
+
+def test_backend_counts_reads_server_timing(client):
+    assert backend_counts(client.get('/')) == (2, 2)
+
+
+def test_more_reads_than_the_baseline_is_a_regression():
+    result = {'p50_ms': 1, 'p99_ms': 2, 'rps': 100, 'reads_per_request': 3}
+    baseline = {'scenarios': {'index': dict(result, reads_per_request=2)}}
+    assert compare({'scenarios': {'index': result}}, baseline, None) == ['index: 2 -> 3 reads/request']
+    assert compare({'scenarios': {'index': dict(result, p50_ms=3)}}, {'scenarios': {'index': result}}, 50) == \
+        ['index: p50_ms 1 -> 3']
@@ -0,0 +1,139 @@
+import io
+import json
+import os
+
+import pytest
+
+import backends
+import bulk
+import search
+import stats
+from models import Category, Post
+
+from conftest import make_post, wait_for_uploads
+
+
+def write_jsonl(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record) + '\n')
+    return str(path)
+
+
+def records(count, **extra):
+    return [dict({'title': f'Imported {n}', 'content': f'Body {n}', 'is_published': True,
+                  'timestamp': f'2024-02-01T10:{n:02d}:00Z'}, **extra) for n in range(count)]
+
+
+def test_import_writes_posts_with_counters_index_and_categories(backend, tmp_path, admin):
+    path = write_jsonl(tmp_path / 'posts.jsonl', records(5, categories=['News']))
+    assert bulk.import_posts(str(path), author=admin, batch_ops=5) == (5, 0)
+
+    posts, _ = Post.get_page(limit=10)
+    assert [post.title for post in posts] == [f'Imported {n}' for n in reversed(range(5))]
+    assert posts[0].author.username == 'admin'
+    news = Category.get(posts[0].categories[0])
+    assert news.name == 'News'
+    assert stats.get_stats()['by_category'] == {news.id: 5}
+    hits, _ = search.get_index().search('imported')
+    assert len(hits) == 5
+    assert not os.path.exists(f'{path}.import-state.json')
+
+
+def test_imported_slugs_are_normalised_and_unique(backend, tmp_path):
+    make_post(title='Taken')
+    path = write_jsonl(tmp_path / 'posts.jsonl', [
+        {'title': 'One', 'slug': 'Hello World!'},
+        {'title': 'Two', 'slug': 'hello-world'},
+        {'title': 'Taken'},
+        {'title': 'New'}
+    ])
+    bulk.import_posts(path)
+    assert sorted(data['slug'] for _, data in backend.stream_posts(fields=['slug'])) == \
+        ['hello-world', 'hello-world-2', 'new-2', 'taken', 'taken-2']
+
+
+def test_running_an_import_again_skips_what_it_wrote(backend, tmp_path):
+    path = write_jsonl(tmp_path / 'posts.jsonl', records(4))
+    assert bulk.import_posts(path) == (4, 0)
+    assert bulk.import_posts(path) == (0, 4)
+    assert stats.get_stats()['total'] == 4
+
+
+def test_the_same_source_under_another_name_is_skipped(tmp_path):
+    first = write_jsonl(tmp_path / 'upload-abc.jsonl', records(3))
+    second = write_jsonl(tmp_path / 'upload-xyz.jsonl', records(3))
+    assert bulk.import_posts(first, source=bulk.file_digest(first)) == (3, 0)
+    assert bulk.import_posts(second, source=bulk.file_digest(second)) == (0, 3)
+
+
+def test_an_interrupted_import_resumes_after_its_last_batch(backend, tmp_path, monkeypatch):
+    path = write_jsonl(tmp_path / 'posts.jsonl', records(6))
+    write_batch = bulk._Importer.write_batch
+
+    def failing(self, number, posts, attempts=3):
+        if number == 2:
+            raise bulk.BulkImportError('interrupted')
+        return write_batch(self, number, posts, attempts)
+
+    # Two posts per batch, one batch at a time
+    monkeypatch.setattr(bulk._Importer, 'write_batch', failing)
+    with pytest.raises(bulk.BulkImportError):
+        bulk.import_posts(path, workers=1, batch_ops=5)
+    with open(f'{path}.import-state.json') as f:
+        assert json.load(f)['done'] == [0, 1]
+    assert stats.get_stats()['total'] == 4
+
+    batches = []
+    monkeypatch.setattr(bulk._Importer, 'write_batch',
+                        lambda self, number, posts, attempts=3: batches.append(number) or
+                        write_batch(self, number, posts, attempts))
+    assert bulk.import_posts(path, workers=1, batch_ops=5) == (2, 0)
+    assert batches == [2]
+    assert stats.get_stats()['total'] == 6
+
+
+def test_markdown_archives(backend, tmp_path):
+    archive = tmp_path / 'posts'
+    archive.mkdir()
+    (archive / 'a.md').write_text('---\ntitle: "From Markdown"\ncategories: [one, two]\nis_published: true\n---\n\n'
+                                  '# Heading\n', encoding='utf-8')
+    assert bulk.import_posts(str(archive)) == (1, 0)
+    (post_id, data), = backend.stream_posts()
+    assert data['title'] == 'From Markdown'
+    assert data['content_html'] == '<h1>Heading</h1>'
+    assert len(data['categories']) == 2
+
+
+def test_export_round_trip(backend, tmp_path, monkeypatch):
+    news = Category.create('News')
+    make_post(title='Exported', content='Exported body', categories=[news.id])
+    make_post(title='Draft', is_published=False)
+    path = str(tmp_path / 'export.jsonl')
+    assert bulk.export_posts(path) == 2
+    assert bulk.export_posts(str(tmp_path / 'md'), format='markdown') == 2
+    assert sorted(os.listdir(tmp_path / 'md')) == ['draft.md', 'exported.md']
+
+    # Into the same site, everything is already there
+    assert bulk.import_posts(path) == (0, 2)
+
+    # Into an empty site, with the category carried over
+    monkeypatch.setenv('SQLITE_PATH', str(tmp_path / 'other.db'))
+    monkeypatch.setattr(backends, '_backend', None)
+    backends.get_backend().put_category(news.id, {'name': 'News'})
+    assert bulk.import_posts(path) == (2, 0)
+    post = Post.resolve('exported')
+    assert (post.content, post.categories, post.is_published) == ('Exported body', [news.id], True)
+
+
+def test_admin_import_runs_in_the_background(admin_client):
+    data = ''.join(json.dumps(record) + '\n' for record in records(2)).encode('utf-8')
+    response = admin_client.post('/admin/posts/import', data={'file': (io.BytesIO(data), 'posts.jsonl')},
+                                 content_type='multipart/form-data')
+    assert response.status_code == 302
+    wait_for_uploads()
+    assert stats.get_stats()['total'] == 2
+
+    response = admin_client.get('/admin/posts/export')
+    assert response.mimetype == 'application/x-ndjson'
+    assert len(response.data.splitlines()) == 2
@@ -0,0 +1,61 @@
+import sys
+import threading
+
+from models import Category, category_registry
+
+from conftest import make_posts, spy
+
+
+def test_registry_serves_categories_without_reads(backend, monkeypatch):
+    news = Category.create('News')
+    calls = spy(monkeypatch, backend, 'list_categories')
+    assert Category.get(news.id).name == 'News'
+    assert Category.get('missing') is None
+    assert [category.name for category in Category.get_all_cached()] == ['News']
+    assert len(calls) == 1
+
+
+def test_category_writes_refresh_the_registry():
+    news = Category.create('News')
+    assert Category.get(news.id) is not None
+    assert news.delete()
+    assert Category.get(news.id) is None
+
+
+def test_get_many_keeps_order_and_reports_missing():
+    first, second = Category.create('First'), Category.create('Second')
+    categories, missing = Category.get_many([second.id, 'missing', first.id, second.id])
+    assert [category.name for category in categories] == ['Second', 'First']
+    assert missing == ['missing']
+
+
+def test_snapshot_survives_concurrent_invalidation():
+    Category.create('News')
+    stop = threading.Event()
+
+    def invalidate():
+        while not stop.is_set():
+            category_registry.invalidate()
+
+    # Switch threads as often as possible to widen the race
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    thread = threading.Thread(target=invalidate)
+    thread.start()
+    try:
+        snapshots = [category_registry.snapshot() for _ in range(5000)]
+    finally:
+        stop.set()
+        thread.join()
+        sys.setswitchinterval(interval)
+    assert all(isinstance(snapshot, dict) for snapshot in snapshots)
+
+
+def test_listing_resolves_category_names_in_one_read(client, backend, monkeypatch):
+    news = Category.create('News')
+    make_posts(backend, 5, categories=[news.id])
+    calls = spy(monkeypatch, backend, 'list_categories')
+    category_registry.invalidate()
+    response = client.get('/')
+    assert b'News' in response.data
+    assert len(calls) == 1
@@ -0,0 +1,47 @@
+from models import Post, category_first_pages
+
+from conftest import make_post, make_posts, spy
+
+
+def test_category_pages_only_hold_that_category(backend):
+    news = make_posts(backend, 15, categories=['news'])
+    make_post(categories=['misc'])
+    first, cursor = Post.get_by_category('news', limit=10)
+    second, end = Post.get_by_category('news', limit=10, cursor=cursor)
+    assert [post.id for post in first + second] == news
+    assert end is None
+
+
+def test_category_pages_skip_drafts(backend):
+    make_posts(backend, 3, published=False, categories=['news'])
+    published = make_posts(backend, 2, categories=['news'])
+    posts, _ = Post.get_by_category('news')
+    assert sorted(post.id for post in posts) == sorted(published)
+
+
+def test_first_page_is_cached(backend, monkeypatch):
+    make_posts(backend, 5, categories=['news'])
+    calls = spy(monkeypatch, backend, 'list_posts')
+    Post.get_by_category('news')
+    Post.get_by_category('news')
+    assert len(calls) == 1
+
+
+def test_writing_a_post_drops_its_categories_first_pages(backend):
+    make_posts(backend, 2, categories=['news'])
+    Post.get_by_category('news')
+    assert category_first_pages.get('news') is not None
+
+    post = make_post(categories=['news'])
+    assert category_first_pages.get('news') is None
+    posts, _ = Post.get_by_category('news')
+    assert post.id in [p.id for p in posts]
+
+    # Moving a post out of a category drops the old category too
+    Post.get_by_category('news')
+    post.update(categories=['misc'])
+    posts, _ = Post.get_by_category('news')
+    assert post.id not in [p.id for p in posts]
+
+    post.delete()
+    assert category_first_pages.get('misc') is None
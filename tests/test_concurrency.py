@@ -0,0 +1,74 @@
+import contextvars
+import threading
+import time
+
+import pytest
+
+import concurrency
+
+from conftest import make_post
+
+marker = contextvars.ContextVar('marker', default=None)
+
+
+def test_results_come_back_in_call_order():
+    def slow():
+        time.sleep(0.05)
+        return 'slow'
+
+    assert concurrency.gather(slow, lambda: 'fast') == ['slow', 'fast']
+
+
+def test_calls_run_at_the_same_time():
+    barrier = threading.Barrier(3, timeout=2)
+    # Would time out on the barrier if the calls ran one after another
+    assert sorted(concurrency.gather(*[barrier.wait] * 3)) == [0, 1, 2]
+
+
+def test_the_first_error_is_raised():
+    def fail():
+        raise KeyError('boom')
+
+    with pytest.raises(KeyError):
+        concurrency.gather(lambda: 1, fail)
+
+
+def test_slow_calls_time_out():
+    release = threading.Event()
+    started = time.monotonic()
+    with pytest.raises(concurrency.TimeoutError):
+        concurrency.gather(release.wait, lambda: None, timeout=0.05)
+    release.set()
+    assert time.monotonic() - started < 1
+
+
+def test_calls_see_the_callers_context():
+    marker.set('request')
+    assert concurrency.gather(marker.get, marker.get) == ['request', 'request']
+
+
+def test_nested_gathers_run_inline():
+    def inner():
+        return threading.current_thread().name, concurrency.gather(
+            lambda: threading.current_thread().name, lambda: threading.current_thread().name)
+
+    (outer_thread, inner_threads), _ = concurrency.gather(inner, lambda: None)
+    assert inner_threads == [outer_thread, outer_thread]
+
+
+def test_backend_reads_in_the_pool_count_against_the_request(backend, admin_client):
+    # Loading the signed-in admin, then the counters, category registry and user count gathered in the pool
+    response = admin_client.get('/admin/dashboard')
+    assert 'desc="4 calls' in response.headers['Server-Timing']
+
+
+def test_edit_post_redirects_when_its_reads_time_out(admin_client, monkeypatch):
+    post = make_post()
+
+    def timing_out(*calls, **kwargs):
+        raise concurrency.TimeoutError('Backend call did not finish within 10s')
+
+    monkeypatch.setattr(concurrency, 'gather', timing_out)
+    response = admin_client.get(f'/admin/posts/{post.id}/edit')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/admin/posts')
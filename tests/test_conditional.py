@@ -0,0 +1,66 @@
+import pytest
+
+from conftest import make_post
+
+
+@pytest.fixture(params=['memory', 'off'])
+def page_cache_mode(request, monkeypatch):
+    """Run against the page cache and against the views themselves."""
+    monkeypatch.setenv('PAGE_CACHE', request.param)
+    return request.param
+
+
+def test_post_page_answers_304_for_a_current_etag(client, page_cache_mode):
+    post = make_post(content='Body.')
+    url = f'/post/{post.slug}'
+    response = client.get(url)
+    etag = response.headers['ETag']
+    assert 'Last-Modified' not in response.headers
+
+    not_modified = client.get(url, headers={'If-None-Match': etag})
+    assert not_modified.status_code == 304
+    assert not_modified.data == b''
+    assert not_modified.headers['ETag'] == etag
+
+
+def test_post_etag_changes_when_the_post_does(client, page_cache_mode):
+    post = make_post(content='Body.')
+    url = f'/post/{post.slug}'
+    etag = client.get(url).headers['ETag']
+
+    post.update(content='New body.')
+    response = client.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_listing_etag_follows_deletes(client, page_cache_mode):
+    make_post(title='Kept')
+    gone = make_post(title='Gone')
+    etag = client.get('/').headers['ETag']
+    assert 'Last-Modified' not in client.get('/').headers
+    assert client.get('/', headers={'If-None-Match': etag}).status_code == 304
+
+    gone.delete()
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert b'Gone' not in response.data
+
+
+def test_category_listing_answers_304(backend, client, page_cache_mode):
+    backend.put_category('news', {'name': 'News'})
+    make_post(categories=['news'])
+    etag = client.get('/category/news').headers['ETag']
+    assert client.get('/category/news', headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_etags_differ_per_viewer(client, admin_client):
+    post = make_post()
+    url = f'/post/{post.slug}'
+    assert client.get(url).headers['ETag'] != admin_client.get(url).headers['ETag']
+
+
+def test_if_modified_since_alone_never_answers_304(client):
+    post = make_post()
+    response = client.get(f'/post/{post.slug}', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+    assert response.status_code == 200
@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+import firebase_config
+
+from conftest import make_post
+
+
+def test_clients_are_built_once_per_process(monkeypatch):
+    monkeypatch.setattr(firebase_config, '_clients', {})
+    built = []
+    first = firebase_config._client('thing', lambda: built.append(1) or object())
+    assert firebase_config._client('thing', lambda: built.append(1) or object()) is first
+    assert built == [1]
+
+    # A forked worker sees a new pid and builds its own
+    monkeypatch.setattr(firebase_config, '_pid', -1)
+    assert firebase_config._client('thing', lambda: built.append(1) or object()) is not first
+    assert built == [1, 1]
+
+
+def test_app_serves_sqlite_without_firebase_clients(client, monkeypatch):
+    monkeypatch.setattr(firebase_config, '_clients', {})
+    make_post(title='Offline')
+    response = client.get('/')
+    assert response.status_code == 200
+    assert b'Offline' in response.data
+    assert firebase_config._clients == {}
+
+
+def test_importing_the_app_does_not_import_the_firebase_sdk(storage):
+    code = ("import sys, wsgi; "
+            "print(any(name.startswith(('firebase_admin', 'pyrebase')) for name in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(firebase_config.__file__)), env=dict(os.environ))
+    assert result.stdout.strip() == 'False', result.stderr
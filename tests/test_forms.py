@@ -0,0 +1,46 @@
+from forms import PostForm
+from models import Category, Post
+
+from conftest import make_post, spy
+
+
+def test_post_form_choices_come_from_the_registry(app, backend, monkeypatch):
+    Category.create('News')
+    Category.create('Misc')
+    reads = spy(monkeypatch, backend, 'list_categories')
+    with app.test_request_context('/'):
+        first = PostForm()
+        second = PostForm()
+        assert sorted(name for _, name in first.categories.choices) == ['Misc', 'News']
+        assert first.categories.choices == second.categories.choices
+    assert len(reads) == 1
+
+    with app.test_request_context('/'):
+        PostForm()
+    # Later requests share the registry snapshot
+    assert len(reads) == 1
+
+
+def test_new_categories_show_up_in_the_form(app):
+    Category.create('First')
+    with app.test_request_context('/'):
+        PostForm()
+    Category.create('Second')
+    with app.test_request_context('/'):
+        assert sorted(name for _, name in PostForm().categories.choices) == ['First', 'Second']
+
+
+def test_editing_a_post_validates_against_the_choices(admin_client):
+    news = Category.create('News')
+    post = make_post(title='Editable')
+    response = admin_client.post(f'/admin/posts/{post.id}/edit', data={
+        'title': 'Edited', 'content': 'Body', 'categories': [news.id], 'action': 'publish'
+    })
+    assert response.status_code == 302
+    assert Post.get(post.id).categories == [news.id]
+
+    response = admin_client.post(f'/admin/posts/{post.id}/edit', data={
+        'title': 'Edited', 'content': 'Body', 'categories': ['not-a-category'], 'action': 'publish'
+    })
+    assert response.status_code == 200
+    assert Post.get(post.id).categories == [news.id]
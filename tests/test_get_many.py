@@ -0,0 +1,55 @@
+import instrumentation
+from backends.sqlite_backend import _CHUNK
+from models import Post, User, user_cache
+
+from conftest import make_post, make_posts, spy
+
+
+def test_user_get_many_keeps_order_and_reads_the_misses_once(backend, monkeypatch):
+    for name in ('ann', 'bob', 'cy'):
+        backend.put_user(name, {'username': name, 'email': f'{name}@example.com'})
+    User.get('bob')
+    batches = spy(monkeypatch, backend, 'get_users')
+    users, missing = User.get_many(['cy', 'bob', 'ghost', 'ann', 'cy'])
+    assert [user.username for user in users] == ['cy', 'bob', 'ann']
+    assert missing == ['ghost']
+    assert batches == [(['cy', 'ghost', 'ann'],)]
+    assert 'ann' in user_cache
+
+
+def test_post_get_many_of_nothing_reads_nothing(backend, monkeypatch):
+    batches = spy(monkeypatch, backend, 'get_posts')
+    assert Post.get_many([]) == ([], [])
+    assert batches == []
+
+
+def test_batches_larger_than_the_parameter_limit(backend):
+    ids = make_posts(backend, _CHUNK + 5)
+    found = backend.get_posts(ids, fields=['title'])
+    assert len(found) == len(ids)
+    assert found[ids[-1]] == {'title': f'Post {len(ids) - 1}'}
+
+
+def test_batch_reads_count_each_document_found(backend, app):
+    ids = make_posts(backend, 3)
+    with app.test_request_context('/'):
+        instrumentation._start_request()
+        try:
+            backend.get_posts(ids + ['missing'])
+            assert instrumentation.current().counts['backend_reads'] == 3
+        finally:
+            instrumentation._end_request()
+
+
+def test_dashboard_resolves_authors_in_one_batch(backend, admin, admin_client, monkeypatch):
+    for name in ('ann', 'bob'):
+        backend.put_user(name, {'username': name, 'email': f'{name}@example.com'})
+        make_post(author=User(name, name, f'{name}@example.com'))
+    user_cache.clear()
+    single = spy(monkeypatch, backend, 'get_user')
+    batches = spy(monkeypatch, backend, 'get_users')
+    response = admin_client.get('/admin/dashboard')
+    assert response.status_code == 200
+    assert b'ann' in response.data and b'bob' in response.data
+    assert len(batches) == 1
+    assert single == [('admin',)]
@@ -0,0 +1,75 @@
+import io
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+import imaging
+import media_storage
+from imaging import make_variants, store_variants, variant_name, variant_names
+from models import Media, PostSummary
+
+from conftest import wait_for_uploads
+
+
+def save_image(path, size, mode='RGB'):
+    Image.new(mode, size).save(path, 'PNG')
+    return path
+
+
+def test_variants_are_scaled_down_never_up(tmp_path):
+    path = save_image(tmp_path / 'wide.png', (800, 400))
+    sizes = {(variant, fmt): (width, height) for variant, fmt, width, height, _, _ in make_variants(path)}
+    assert sizes[('thumb', 'webp')] == sizes[('thumb', 'jpeg')] == (160, 80)
+    assert sizes[('card', 'jpeg')] == (400, 200)
+    assert sizes[('hero', 'jpeg')] == (800, 400)
+
+
+def test_transparent_images_become_jpeg(tmp_path):
+    path = save_image(tmp_path / 'alpha.png', (50, 50), mode='RGBA')
+    for _, fmt, _, _, _, fileobj in make_variants(path):
+        with Image.open(fileobj) as image:
+            assert image.format == imaging.FORMATS[fmt][0]
+            assert image.mode == 'RGB'
+
+
+def test_variant_names():
+    assert variant_name('2024/photo.png', 'card', 'webp') == '2024/photo-card.webp'
+    assert len(variant_names('photo.png')) == len(imaging.VARIANTS) * len(imaging.FORMATS)
+
+
+def test_store_variants_returns_urls_per_size(tmp_path):
+    store = media_storage.get_media_store()
+    path = save_image(tmp_path / 'photo.png', (500, 250))
+    variants = store_variants(store, path, 'photo.png')
+    assert variants['card'] == {'width': 400, 'height': 200, 'webp': '/admin/media/photo-card.webp',
+                                'jpeg': '/admin/media/photo-card.jpeg'}
+    assert store.open('photo-thumb.jpeg') is not None
+
+
+def test_srcset_lists_sizes_in_width_order():
+    summary = PostSummary('post', 'Title', None, featured_image='/original.png', featured_image_variants={
+        'hero': {'width': 1200, 'jpeg': '/h.jpeg', 'webp': '/h.webp'},
+        'thumb': {'width': 160, 'jpeg': '/t.jpeg'}
+    })
+    assert summary.image_srcset() == '/t.jpeg 160w, /h.jpeg 1200w'
+    assert summary.image_srcset('webp') == '/h.webp 1200w'
+    assert summary.image_url('hero') == '/h.jpeg'
+    assert summary.image_url('card') == '/original.png'
+
+
+def test_uploaded_images_get_thumbnails_and_lose_them_on_delete(backend, admin_client):
+    out = io.BytesIO()
+    Image.new('RGB', (300, 300)).save(out, 'PNG')
+    out.seek(0)
+    location = admin_client.post('/admin/upload/image', data={'file': FileStorage(out, 'square.png')},
+                                 content_type='multipart/form-data').get_json()['location']
+    filename = location.rsplit('/', 1)[1]
+    wait_for_uploads()
+
+    media, _ = Media.get_page()
+    assert media[0].thumbnail_url() == '/admin/media/' + variant_name(filename, 'thumb', 'webp')
+
+    assert admin_client.delete(location).get_json() == {'success': True}
+    store = media_storage.get_media_store()
+    assert all(store.open(name) is None for name in [filename] + variant_names(filename))
+    assert backend.get_media(filename) is None
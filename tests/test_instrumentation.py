@@ -0,0 +1,80 @@
+import re
+
+import pytest
+
+import instrumentation
+from instrumentation import BACKEND_CALLS, BACKEND_ERRORS, InstrumentedBackend
+
+from conftest import make_post, make_posts
+
+
+def server_timing(response):
+    return dict(re.findall(r'(\w+);dur=([\d.]+)', response.headers['Server-Timing']))
+
+
+def test_responses_report_backend_calls_and_render_time(backend, client, monkeypatch):
+    monkeypatch.setenv('PAGE_CACHE', 'off')
+    make_posts(backend, 3)
+    response = client.get('/')
+    assert set(server_timing(response)) >= {'db', 'render', 'total'}
+    # A page of 3 posts, plus loading the (empty) category registry, which
+    # counts one read like an empty Firestore query
+    assert 'desc="2 calls, 4 reads"' in response.headers['Server-Timing']
+    assert 'desc="1 calls, 3 reads"' in client.get('/').headers['Server-Timing']
+
+
+def test_markdown_time_is_reported_when_a_body_is_rendered(client, monkeypatch):
+    monkeypatch.setenv('PAGE_CACHE', 'off')
+    post = make_post(content='*body*')
+    # Stored HTML is current, so viewing the post runs no markdown
+    assert 'markdown' not in server_timing(client.get(f'/post/{post.slug}'))
+
+
+def test_backend_calls_outside_requests_are_counted_without_failing(backend):
+    before = BACKEND_CALLS._values[('count_users',)]
+    assert backend.count_users() == 0
+    assert BACKEND_CALLS._values[('count_users',)] == before + 1
+
+
+def test_failed_backend_calls_are_counted_and_reraised():
+    class Broken:
+        def get_post(self, post_id):
+            raise OSError('unavailable')
+
+    before = BACKEND_ERRORS._values[('get_post',)]
+    with pytest.raises(OSError):
+        InstrumentedBackend(Broken()).get_post('x')
+    assert BACKEND_ERRORS._values[('get_post',)] == before + 1
+
+
+def test_streams_are_counted_when_consumed(backend):
+    make_posts(backend, 4)
+    before = BACKEND_CALLS._values[('stream_posts',)]
+    assert len(list(backend.stream_posts(fields=['title']))) == 4
+    assert BACKEND_CALLS._values[('stream_posts',)] == before + 1
+
+
+def test_metrics_are_off_without_a_token(client):
+    assert client.get('/metrics').status_code == 404
+
+
+def test_metrics_need_the_token(client, monkeypatch):
+    monkeypatch.setenv('METRICS_TOKEN', 'secret')
+    client.get('/')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert 'blog_request_duration_seconds_bucket{route="blog.index",method="GET",le="+Inf"}' in response.text
+    assert '# TYPE blog_backend_calls_total counter' in response.text
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = instrumentation.Histogram('test_seconds', 'Test', ('route',), (0.1, 1))
+    histogram.observe(('a',), 0.05)
+    histogram.observe(('a',), 0.5)
+    lines = histogram.render()
+    assert 'test_seconds_bucket{route="a",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="a",le="1"} 2' in lines
+    assert 'test_seconds_count{route="a"} 2' in lines
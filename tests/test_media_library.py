@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Media
+
+START = datetime(2024, 3, 1)
+
+
+@pytest.fixture
+def library(backend):
+    """Ten files, one a day from START; odd ones are GIFs and sizes grow with the index."""
+    for n in range(10):
+        name = f'file-{n}.{"gif" if n % 2 else "png"}'
+        backend.put_media(name, {
+            'filename': name,
+            'content_type': 'image/gif' if n % 2 else 'image/png',
+            'size': (n + 1) * 100,
+            'sha256': 'x',
+            'width': 10,
+            'height': 10,
+            'created_at': START + timedelta(days=n)
+        })
+
+
+def all_pages(**kwargs):
+    names, cursor = [], None
+    while True:
+        media, cursor = Media.get_page(limit=3, cursor=cursor, **kwargs)
+        names.extend(m.filename for m in media)
+        if cursor is None:
+            return names
+
+
+def test_pages_cover_the_library_once_in_order(library):
+    assert all_pages() == [f'file-{n}.{"gif" if n % 2 else "png"}' for n in reversed(range(10))]
+    assert all_pages(sort='oldest') == list(reversed(all_pages()))
+
+
+def test_size_and_name_sorts(library):
+    largest = all_pages(sort='largest')
+    assert largest[0] == 'file-9.gif'
+    assert largest == list(reversed(all_pages(sort='smallest')))
+    assert all_pages(sort='name') == sorted(largest)
+
+
+def test_filters_by_type_and_date(library):
+    assert all_pages(content_type='image/gif') == ['file-9.gif', 'file-7.gif', 'file-5.gif', 'file-3.gif',
+                                                   'file-1.gif']
+    assert all_pages(since=START + timedelta(days=2), until=START + timedelta(days=4),
+                     sort='largest') == ['file-3.gif', 'file-2.png']
+
+
+def test_cursor_from_another_sort_starts_over(library):
+    _, cursor = Media.get_page(limit=3, sort='largest')
+    media, _ = Media.get_page(limit=3, cursor=cursor, sort='name')
+    assert [m.filename for m in media] == ['file-0.png', 'file-1.gif', 'file-2.png']
+
+
+def test_listing_fetches_metadata_only(backend, library):
+    backend.update_media('file-9.gif', {'sha256': 'large field not listed'})
+    media, _ = Media.get_page(limit=1)
+    assert media[0].filename == 'file-9.gif'
+    assert media[0].sha256 is None
+
+
+def test_media_page_renders(admin_client, library):
+    response = admin_client.get('/admin/media?sort=largest&type=image/gif')
+    assert response.status_code == 200
+    assert b'file-9.gif' in response.data
+    assert b'file-8.png' not in response.data
@@ -0,0 +1,83 @@
+import io
+import re
+
+import pytest
+from PIL import Image
+
+import media_storage
+from media_storage import LocalMediaStore
+
+from conftest import wait_for_uploads
+
+
+def png(width=32, height=16):
+    out = io.BytesIO()
+    Image.new('RGB', (width, height), (200, 30, 30)).save(out, 'PNG')
+    out.seek(0)
+    return out
+
+
+def test_local_store_round_trip(tmp_path):
+    store = LocalMediaStore(tmp_path / 'store')
+    data = b'x' * (media_storage.CHUNK_SIZE * 2 + 5)
+    store.save('a/b.bin', io.BytesIO(data))
+
+    chunks, size = store.open('a/b.bin')
+    assert size == len(data)
+    assert b''.join(chunks) == data
+    assert store.public_url('a/b.bin') == '/admin/media/a/b.bin'
+
+    store.delete('a/b.bin')
+    store.delete('a/b.bin')
+    assert store.open('a/b.bin') is None
+
+
+def test_local_store_refuses_paths_outside_its_root(tmp_path):
+    store = LocalMediaStore(tmp_path / 'store')
+    with pytest.raises(ValueError):
+        store.open('../blog.db')
+
+
+def test_describe_reads_size_hash_and_dimensions():
+    fileobj = png(32, 16)
+    metadata = media_storage.describe(fileobj)
+    assert (metadata['width'], metadata['height']) == (32, 16)
+    assert metadata['size'] == len(fileobj.getvalue())
+    assert fileobj.tell() == 0
+
+    assert media_storage.describe(io.BytesIO(b'not an image'))['width'] is None
+
+
+def upload(client, name='photo.png'):
+    return client.post('/admin/upload/image', data={'file': (png(), name)}, content_type='multipart/form-data')
+
+
+def test_uploads_are_stored_outside_the_backend_and_streamed_back(backend, admin_client, client):
+    response = upload(admin_client)
+    assert response.status_code == 200
+    location = response.get_json()['location']
+    filename = location.rsplit('/', 1)[1]
+    wait_for_uploads()
+
+    stored = backend.get_media(filename)
+    assert 'data' not in stored
+    assert (stored['width'], stored['height']) == (32, 16)
+
+    response = client.get(location)
+    assert response.status_code == 200
+    assert response.data == png().getvalue()
+    assert response.cache_control.max_age == 31536000
+
+
+def test_uploads_with_the_same_name_never_overwrite_each_other(admin_client):
+    first = upload(admin_client).get_json()['location']
+    second = upload(admin_client).get_json()['location']
+    assert first != second
+    assert re.search(r'/\d{8}-\d{6}-[0-9a-f]{8}-photo\.png$', first)
+
+
+def test_traversal_and_missing_media_are_not_found(client):
+    assert client.get('/admin/media/missing.png').status_code == 404
+    assert client.get('/admin/media/..%2Fblog.db').status_code == 404
+    assert client.get('/admin/media/../../blog.db').status_code == 404
+
@@ -0,0 +1,94 @@
+import os
+import time
+
+from page_cache import DiskPageStore, MemoryPageStore
+
+from conftest import make_post
+
+
+def entry(*keys, stored_at=None, body='page'):
+    return {'body': body, 'status': 200, 'content_type': 'text/html', 'validators': {}, 'keys': list(keys),
+            'stored_at': time.time() if stored_at is None else stored_at}
+
+
+def test_anonymous_pages_are_cached(client):
+    make_post(title='Cached')
+    first = client.get('/')
+    assert first.headers['X-Cache'] == 'MISS'
+    assert first.headers['Surrogate-Key'] == 'posts'
+    assert first.headers['Cache-Control'].startswith('public')
+
+    second = client.get('/')
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.data == first.data
+
+
+def test_post_writes_purge_the_pages_showing_them(client):
+    post = make_post(title='Original', content='First body.')
+    url = f'/post/{post.slug}'
+    client.get(url)
+    client.get('/')
+    assert client.get(url).headers['X-Cache'] == 'HIT'
+
+    post.update(content='Second body.')
+    response = client.get(url)
+    assert response.headers['X-Cache'] == 'MISS'
+    assert b'Second body.' in response.data
+    assert client.get('/').headers['X-Cache'] == 'MISS'
+
+
+def test_unrelated_post_pages_survive_a_write(client):
+    kept = make_post(title='Kept')
+    changed = make_post(title='Changed')
+    client.get(f'/post/{kept.slug}')
+    changed.update(content='New body.')
+    assert client.get(f'/post/{kept.slug}').headers['X-Cache'] == 'HIT'
+
+
+def test_logged_in_users_bypass_the_cache(admin_client):
+    make_post()
+    response = admin_client.get('/')
+    assert 'X-Cache' not in response.headers
+    assert response.headers['Cache-Control'] == 'private, no-cache'
+
+
+def test_memory_store_drops_pages_rendered_before_a_purge():
+    store = MemoryPageStore()
+    started = time.time() - 1
+    store.purge(['post-1'])
+    store.set('/post/a', entry('post-1', stored_at=started))
+    assert store.get('/post/a') is None
+
+
+def test_memory_store_tag_index_stays_as_small_as_the_cache():
+    store = MemoryPageStore(maxsize=2)
+    for n in range(50):
+        store.set(f'/?page={n}', entry('posts', f'post-{n}'))
+    assert sum(len(keys) for keys in store._tags.values()) <= 4
+    assert set(store._tags['posts']) == {'/?page=48', '/?page=49'}
+
+    store.purge(['posts'])
+    assert store.get('/?page=49') is None
+    assert store._tags == {}
+
+
+def test_disk_store_shares_purges_between_workers(tmp_path):
+    first = DiskPageStore(tmp_path / 'pages')
+    second = DiskPageStore(tmp_path / 'pages')
+    first.set('/post/a', entry('post-1', stored_at=time.time() - 1))
+    assert second.get('/post/a')['body'] == 'page'
+
+    second.purge(['post-1'])
+    assert first.get('/post/a') is None
+
+
+def test_disk_store_sweeps_expired_and_excess_pages(tmp_path):
+    store = DiskPageStore(tmp_path / 'pages', ttl=60, maxsize=3)
+    for n in range(5):
+        store.set(f'/?page={n}', entry('posts'))
+    old = store._page_path('/?page=0')
+    os.utime(old, (time.time() - 3600, time.time() - 3600))
+
+    store.sweep()
+    assert len(os.listdir(store._pages_dir)) == 3
+    assert not os.path.exists(old)
@@ -0,0 +1,89 @@
+from datetime import datetime
+
+from models import Post
+from pagination import PageIndex, decode_cursor, encode_cursor, page_index
+
+from conftest import make_posts, spy
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(datetime(2024, 1, 1, 12, 30), 'post-1')
+    assert decode_cursor(cursor) == (datetime(2024, 1, 1, 12, 30), 'post-1')
+    assert decode_cursor('not a cursor') is None
+    assert decode_cursor(None) is None
+
+
+def test_cursor_pages_cover_every_post_once(backend):
+    ids = make_posts(backend, 25)
+    seen, cursor = [], None
+    for _ in range(3):
+        posts, cursor = Post.get_page(limit=10, cursor=cursor)
+        seen.extend(post.id for post in posts)
+    assert seen == ids
+    assert cursor is None
+
+
+def test_numbered_page_matches_cursor_page(backend):
+    make_posts(backend, 25)
+    _, cursor = Post.get_page(limit=10)
+    _, cursor = Post.get_page(limit=10, cursor=cursor)
+    by_cursor, _ = Post.get_page(limit=10, cursor=cursor)
+
+    page_index.clear()
+    by_number, _ = Post.get_page(limit=10, page=3)
+    assert [post.id for post in by_number] == [post.id for post in by_cursor]
+
+
+def test_remembered_page_costs_one_query(backend, monkeypatch):
+    make_posts(backend, 25)
+    calls = spy(monkeypatch, backend, 'list_posts')
+    Post.get_page(limit=10, page=3)
+    assert [call[0] for call in calls] == [20, 11]
+
+    calls.clear()
+    Post.get_page(limit=10, page=3)
+    assert [call[0] for call in calls] == [11]
+
+
+def test_client_cursor_is_not_remembered_as_a_page(backend):
+    ids = make_posts(backend, 45)
+    _, cursor = Post.get_page(limit=10, page=3)
+    page_index.clear()
+
+    # A request claiming page 1 while carrying page 3's cursor
+    Post.get_page(limit=10, cursor=cursor, page=1)
+    page_two, _ = Post.get_page(limit=10, page=2)
+    assert [post.id for post in page_two] == ids[10:20]
+
+
+def test_pages_past_the_end_are_empty_and_remembered(backend, monkeypatch):
+    make_posts(backend, 25)
+    calls = spy(monkeypatch, backend, 'list_posts')
+    assert Post.get_page(limit=10, page=50) == ([], None)
+    assert page_index.last_page(('posts', False, 10)) == 3
+
+    calls.clear()
+    assert Post.get_page(limit=10, page=60) == ([], None)
+    assert calls == []
+
+
+def test_walks_are_bounded_by_the_window(backend, monkeypatch):
+    make_posts(backend, 5)
+    calls = spy(monkeypatch, backend, 'list_posts')
+    assert Post.get_page(limit=10, page=page_index.window + 2) == ([], None)
+    assert calls == []
+
+
+def test_page_index_nearest():
+    index = PageIndex(window=5)
+    index.remember('listing', 3, 'cursor-3')
+    assert index.nearest('listing', 6) == (3, 'cursor-3')
+    assert index.nearest('listing', 9) == (1, None)
+    # Page 1 never needs a cursor
+    index.remember('listing', 1, 'cursor-1')
+    assert index.get('listing', 1) is None
+
+
+def test_index_route_pages(client, backend):
+    make_posts(backend, 15)
+    assert b'Post 12' in client.get('/?page=2').data
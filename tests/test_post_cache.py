@@ -0,0 +1,83 @@
+import os
+
+from models import Post, PostCache, post_cache
+
+from conftest import make_post, make_posts, spy
+
+
+def test_posts_are_read_once(backend, monkeypatch):
+    make_posts(backend, 1)
+    reads = spy(monkeypatch, backend, 'get_post')
+    assert Post.get('post-0000').title == Post.get('post-0000').title == 'Post 0'
+    assert len(reads) == 1
+
+
+def test_missing_posts_are_not_cached(backend, monkeypatch):
+    reads = spy(monkeypatch, backend, 'get_post')
+    assert Post.get('missing') is None
+    assert Post.get('missing') is None
+    assert len(reads) == 2
+
+
+def test_writes_in_this_process_invalidate_at_once(backend):
+    post = make_post(title='Before')
+    Post.get(post.id)
+    post.update(title='After')
+    assert Post.get(post.id).title == 'After'
+
+    post.delete()
+    assert Post.get(post.id) is None
+
+
+def test_changes_from_other_workers_arrive_through_the_watch(backend, monkeypatch):
+    watchers = []
+    monkeypatch.setattr(backend._backend, 'watch_posts', watchers.append, raising=False)
+    backend.__dict__.pop('watch_posts', None)
+    cache = PostCache()
+    make_posts(backend, 1)
+    assert cache.get('post-0000')['title'] == 'Post 0'
+    assert len(watchers) == 1
+
+    backend.update_post('post-0000', {'title': 'Changed elsewhere'})
+    assert cache.get('post-0000')['title'] == 'Post 0'
+    watchers[0]('post-0000')
+    assert cache.get('post-0000')['title'] == 'Changed elsewhere'
+
+
+def test_a_read_overtaken_by_an_invalidation_is_not_stored(backend, monkeypatch):
+    make_posts(backend, 1)
+    get_post = backend._backend.get_post
+
+    def racing(post_id):
+        data = get_post(post_id)
+        # Another thread writes the post while this read is in flight
+        post_cache.invalidate(post_id)
+        return data
+
+    monkeypatch.setattr(backend._backend, 'get_post', racing)
+    backend.__dict__.pop('get_post', None)
+    post_cache.get('post-0000')
+    assert 'post-0000' not in post_cache._cache
+
+
+def test_each_process_starts_empty_and_watches_again(backend, monkeypatch):
+    make_posts(backend, 1)
+    post_cache.get('post-0000')
+    assert 'post-0000' in post_cache._cache
+    # As in a forked worker
+    monkeypatch.setattr(post_cache, '_watching_pid', os.getpid() + 1)
+    reads = spy(monkeypatch, backend, 'get_post')
+    post_cache.get('post-0000')
+    assert len(reads) == 1
+
+
+def test_batch_reads_only_fetch_uncached_posts(backend, monkeypatch):
+    make_posts(backend, 3)
+    Post.get('post-0000')
+    batches = spy(monkeypatch, backend, 'get_posts')
+    posts, missing = Post.get_many(['post-0002', 'post-0000', 'missing', 'post-0001'])
+    assert [post.id for post in posts] == ['post-0002', 'post-0000', 'post-0001']
+    assert missing == ['missing']
+    # Only the uncached posts are read
+    assert batches == [(['post-0002', 'missing', 'post-0001'],)]
+    assert 'post-0002' in post_cache._cache
@@ -0,0 +1,43 @@
+from models import Post, PostSummary
+
+from conftest import make_posts, spy
+
+
+def test_listings_return_summaries_without_bodies(backend):
+    make_posts(backend, 3, categories=['news'])
+    for posts in (Post.get_page()[0], Post.get_by_category('news')[0], Post.get_all()):
+        assert len(posts) == 3
+        assert all(type(post) is PostSummary for post in posts)
+        assert not any(hasattr(post, 'content') for post in posts)
+
+
+def test_listing_queries_ask_for_summary_fields_only(backend, monkeypatch):
+    make_posts(backend, 25)
+    requested = []
+    list_posts = backend._backend.list_posts
+
+    def recording(*args, fields=None, **kwargs):
+        requested.append(fields)
+        return list_posts(*args, fields=fields, **kwargs)
+
+    monkeypatch.setattr(backend._backend, 'list_posts', recording)
+    backend.__dict__.pop('list_posts', None)
+    Post.get_page(limit=10, page=3)
+    Post.get_all(limit=5)
+    # The page walk reads timestamps only
+    assert requested == [['timestamp'], PostSummary.FIELDS, PostSummary.FIELDS]
+
+
+def test_listing_pages_never_read_post_bodies(backend, client, admin_client, monkeypatch):
+    make_posts(backend, 3)
+    fetched = spy(monkeypatch, backend, 'get_post')
+    assert b'Post 2' in client.get('/').data
+    assert b'Post 2' in admin_client.get('/admin/posts').data
+    assert fetched == []
+
+
+def test_a_single_post_is_loaded_in_full(backend):
+    make_posts(backend, 1)
+    post = Post.get('post-0000')
+    assert type(post) is Post
+    assert post.content == 'Body of post 0.'
@@ -0,0 +1,62 @@
+import markdown
+
+import rendering
+from models import Post, post_cache
+from rendering import content_hash, html_cache, render_markdown
+
+from conftest import make_post
+
+
+def count_renders(monkeypatch):
+    calls = []
+    original = markdown.markdown
+
+    def render(text, *args, **kwargs):
+        calls.append(text)
+        return original(text, *args, **kwargs)
+
+    monkeypatch.setattr(rendering.markdown, 'markdown', render)
+    return calls
+
+
+def test_same_body_renders_once(monkeypatch):
+    renders = count_renders(monkeypatch)
+    assert render_markdown('# Title') == render_markdown('# Title') == '<h1>Title</h1>'
+    assert renders == ['# Title']
+
+
+def test_hash_follows_render_version(monkeypatch):
+    digest = content_hash('body')
+    monkeypatch.setattr(rendering, 'RENDER_VERSION', rendering.RENDER_VERSION + 1)
+    assert content_hash('body') != digest
+
+
+def test_saved_posts_carry_their_html(backend, monkeypatch):
+    post = make_post(content='*hello*')
+    renders = count_renders(monkeypatch)
+    html_cache.clear()
+
+    stored = Post.get(post.id)
+    assert stored.html == '<p><em>hello</em></p>'
+    assert renders == []
+
+
+def test_stale_stored_html_is_rendered_again(backend, monkeypatch):
+    post = make_post(content='*hello*')
+    # HTML stored under an older render version no longer matches its hash
+    backend.update_post(post.id, {'content_html': '<p>old</p>', 'content_hash': 'old'})
+    post_cache.invalidate(post.id)
+    stored = Post.get(post.id)
+    assert stored.html == '<p><em>hello</em></p>'
+
+    # So is HTML whose body changed underneath it
+    backend.update_post(post.id, {'content': '**bold**'})
+    post_cache.invalidate(post.id)
+    stored = Post.get(post.id)
+    assert stored.html == '<p><strong>bold</strong></p>'
+
+
+def test_editing_the_body_renders_the_new_body(backend):
+    post = make_post(content='first')
+    post.update(content='second')
+    assert Post.get(post.id).html == '<p>second</p>'
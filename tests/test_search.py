@@ -0,0 +1,92 @@
+import pytest
+
+import search
+
+from conftest import make_post, make_posts
+
+
+def test_rebuild_indexes_post_bodies(backend):
+    make_posts(backend, 25)
+    backend.update_post('post-0007', {'content': 'Only the body mentions zeppelins.'})
+
+    assert search.rebuild() == 25
+    hits, _ = search.get_index().search('zeppelins')
+    assert [hit.id for hit in hits] == ['post-0007']
+
+
+def search_ids(query, **kwargs):
+    hits, _ = search.get_index().search(query, **kwargs)
+    return [hit.id for hit in hits]
+
+
+def test_tokenize():
+    assert search.tokenize('The Quick, quick FOX!') == ['quick', 'quick', 'fox']
+    assert search.tokenize('Привет, МИР') == ['привет', 'мир']
+    assert search.tokenize('東京 a 1') == ['東京']
+    assert search.tokenize('Ｆｕｌｌｗｉｄｔｈ') == ['fullwidth']
+
+
+def test_title_matches_outrank_body_matches():
+    body = make_post(title='Gardening', content='A note on tomatoes and more tomatoes.')
+    title = make_post(title='Tomatoes', content='A note on gardening.')
+    assert search_ids('tomatoes') == [title.id, body.id]
+
+
+def test_rarer_terms_weigh_more():
+    common = [make_post(title=f'Daily {n}', content='weather report') for n in range(5)]
+    rare = make_post(title='Daily special', content='weather eclipse')
+    assert search_ids('weather eclipse')[0] == rare.id
+    assert set(search_ids('weather', limit=10)) == {post.id for post in common} | {rare.id}
+
+
+def test_index_follows_post_writes():
+    post = make_post(title='Index me', content='Mentions zeppelins.')
+    assert search_ids('zeppelins') == [post.id]
+
+    post.update(content='Mentions airships.')
+    assert search_ids('zeppelins') == []
+    assert search_ids('airships') == [post.id]
+
+    post.update(is_published=False)
+    assert search_ids('airships') == []
+    post.update(is_published=True)
+    assert search_ids('airships') == [post.id]
+
+    post.delete()
+    assert search_ids('airships') == []
+
+
+def test_drafts_are_not_indexed():
+    make_post(title='Secret plans', is_published=False)
+    assert search_ids('secret') == []
+
+
+def test_results_page_by_cursor():
+    ids = {make_post(title=f'Match {n}', content='needle').id for n in range(25)}
+    seen, cursor = [], None
+    for _ in range(3):
+        hits, cursor = search.get_index().search('needle', limit=10, cursor=cursor)
+        seen.extend(hit.id for hit in hits)
+    assert cursor is None
+    assert len(seen) == 25 and set(seen) == ids
+
+
+def test_failed_rebuild_keeps_the_previous_index():
+    post = make_post(title='Survivor', content='still searchable')
+
+    def broken_stream():
+        yield 'other', {'title': 'Other', 'is_published': True}
+        raise OSError('backend went away')
+
+    with pytest.raises(OSError):
+        search.get_index().replace_all(broken_stream())
+    assert search_ids('survivor') == [post.id]
+    assert search_ids('other') == []
+
+
+def test_search_page(client):
+    post = make_post(title='Findable post', content='body')
+    response = client.get('/search?q=findable')
+    assert response.status_code == 200
+    assert f'/post/{post.slug}'.encode() in response.data
+    assert client.get('/search?q=').status_code == 200
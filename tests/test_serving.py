@@ -0,0 +1,76 @@
+import os
+import runpy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.serving import make_server
+
+import backends
+from benchmarks import corpus, latency
+from benchmarks.latency import LatencyBackend
+from benchmarks.serving import load
+from instrumentation import InstrumentedBackend
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def gunicorn_settings(monkeypatch, **environment):
+    for name, value in environment.items():
+        monkeypatch.setenv(name, value)
+    return runpy.run_path(os.path.join(ROOT, 'gunicorn.conf.py'))
+
+
+def test_gunicorn_uses_threads_when_asked(monkeypatch):
+    monkeypatch.delenv('WEB_THREADS', raising=False)
+    assert gunicorn_settings(monkeypatch)['worker_class'] == 'sync'
+    settings = gunicorn_settings(monkeypatch, WEB_THREADS='16', WEB_CONCURRENCY='3')
+    assert (settings['worker_class'], settings['threads'], settings['workers']) == ('gthread', 16, 3)
+
+
+def test_latency_is_added_inside_the_instrumentation(backend):
+    latency.install(20)
+    delayed = backends.get_backend()
+    assert isinstance(delayed, InstrumentedBackend)
+    assert isinstance(delayed._backend, LatencyBackend)
+
+    started = time.perf_counter()
+    delayed.count_users()
+    assert time.perf_counter() - started >= 0.02
+
+    latency.install(0)
+    assert backends.get_backend() is delayed
+
+
+def test_threads_serve_requests_side_by_side(backend, app, monkeypatch):
+    monkeypatch.setenv('PAGE_CACHE', 'off')
+    summary = corpus.seed(backend, posts=20, categories=3, images=0, paragraphs=1)
+    latency.install(20)
+    paths = [f'/post/{slug}' for slug in summary['published_slugs'][:8]] + ['/']
+
+    def get(path):
+        with app.test_client() as client:
+            return client.get(path).status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(paths)) as pool:
+        statuses = list(pool.map(get, paths))
+    elapsed = time.perf_counter() - started
+    assert statuses == [200] * len(paths)
+    # Each request waits on a few delayed calls; one at a time they would take far longer
+    assert elapsed < len(paths) * 0.04
+
+
+def test_load_drives_a_server_with_concurrent_clients(backend, app):
+    corpus.seed(backend, posts=5, categories=1, images=0, paragraphs=1)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        result = load(server.server_port, ['/', '/missing-page'], clients=4, duration=0.3)
+    finally:
+        server.shutdown()
+        thread.join()
+    assert result['requests'] > 0
+    # Every other request is a 404, which counts as an error
+    assert 0 < result['errors'] < result['requests']
@@ -0,0 +1,91 @@
+import uuid
+
+import slugs
+from models import Post, post_cache, slug_cache
+
+from conftest import make_post
+
+
+def test_slugify():
+    assert slugs.slugify('Héllo, World!') == 'hello-world'
+    assert slugs.slugify('¿¡') == 'post'
+    assert len(slugs.slugify('word ' * 40)) <= slugs.MAX_LENGTH
+    post_id = str(uuid.uuid4())
+    assert slugs.slugify(post_id) == f'post-{post_id}'
+
+
+def test_candidates_skip_reserved_slugs():
+    assert list(slugs.candidates('hello'))[:3] == ['hello', 'hello-2', 'hello-3']
+    assert next(slugs.candidates('new')) == 'new-2'
+
+
+def test_colliding_titles_get_numbered_slugs(backend):
+    assert [make_post(title='Same title').slug for _ in range(3)] == ['same-title', 'same-title-2',
+                                                                      'same-title-3']
+
+
+def test_a_post_titled_new_is_reachable(client):
+    post = make_post(title='New')
+    assert post.slug == 'new-2'
+    response = client.get('/post/new-2')
+    assert response.status_code == 200
+    assert b'New' in response.data
+
+
+def test_posts_are_served_by_slug_and_ids_redirect(client):
+    post = make_post(title='Hello world')
+    assert client.get('/post/hello-world').status_code == 200
+
+    response = client.get(f'/post/{post.id}')
+    assert response.status_code == 301
+    assert response.headers['Location'].endswith('/post/hello-world')
+
+
+def test_renamed_posts_redirect_from_their_old_slug(client):
+    post = make_post(title='First title')
+    post.update(title='Second title')
+    assert post.slug == 'second-title'
+
+    response = client.get('/post/first-title')
+    assert response.status_code == 301
+    assert response.headers['Location'].endswith('/post/second-title')
+    assert Post.resolve('first-title').id == post.id
+
+
+def test_retitling_with_the_same_slug_keeps_it(backend):
+    post = make_post(title='Hello world')
+    post.update(title='Hello, World!')
+    assert post.slug == 'hello-world'
+    assert backend.get_slugs(['hello-world-2']) == {}
+
+
+def test_deleting_a_post_frees_its_slugs_for_reuse(client):
+    old = make_post(title='Reused')
+    old.update(title='Reused again')
+    assert Post.resolve('reused').id == old.id
+    old.delete()
+    assert 'reused' not in slug_cache
+
+    new = make_post(title='Reused')
+    assert new.slug == 'reused'
+    assert Post.resolve('reused').id == new.id
+    assert Post.resolve('reused-again') is None
+    assert client.get('/post/reused').status_code == 200
+
+
+def test_a_slug_cached_before_another_worker_deleted_the_post_is_looked_up_again(backend):
+    old = make_post(title='Moved')
+    assert Post.resolve('moved').id == old.id
+    # Another worker deletes the post and a new one claims the slug
+    backend.delete_post(old.id)
+    backend.release_slugs(old.id)
+    # As the change watch would
+    post_cache.invalidate(old.id)
+    new = make_post(title='Moved')
+    assert Post.resolve('moved').id == new.id
+
+
+def test_unknown_slugs_are_not_found(client):
+    assert Post.resolve('nothing-here') is None
+    response = client.get('/post/nothing-here')
+    assert response.status_code == 302
@@ -0,0 +1,107 @@
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+import backends
+from backends.sqlite_backend import SQLiteBackend
+
+from conftest import make_posts
+
+
+def test_backend_is_chosen_by_environment(backend, monkeypatch):
+    assert isinstance(backend._backend, SQLiteBackend)
+    monkeypatch.setattr(backends, '_backend', None)
+    monkeypatch.setenv('STORAGE_BACKEND', 'carrier-pigeon')
+    with pytest.raises(ValueError):
+        backends.get_backend()
+
+
+def test_users(backend):
+    backend.put_user('u1', {'username': 'ann', 'email': 'ann@example.com', 'is_admin': False})
+    backend.update_user('u1', {'is_admin': True})
+    assert backend.get_user('u1')['is_admin'] is True
+    assert backend.find_user('email', 'ann@example.com')[0] == 'u1'
+    assert backend.find_user('username', 'bob') is None
+    assert backend.count_users() == 1
+    with pytest.raises(KeyError):
+        backend.update_user('missing', {'is_admin': True})
+
+
+def test_timestamps_round_trip_as_naive_utc(backend):
+    aware = datetime(2024, 5, 1, 14, 0, tzinfo=timezone.utc)
+    backend.create_post('p', {'title': 'T', 'timestamp': aware, 'created_at': datetime(2024, 5, 1, 12, 0)})
+    stored = backend.get_post('p')
+    assert stored['timestamp'] == datetime(2024, 5, 1, 14, 0)
+    assert stored['created_at'] == datetime(2024, 5, 1, 12, 0)
+
+
+def test_listings_project_fields_and_skip_bodies(backend):
+    make_posts(backend, 3)
+    listed = backend.list_posts(10, fields=['title', 'author.id'])
+    assert [data for _, data in listed][0] == {'title': 'Post 0',
+                                               'author': {'id': 'author', 'username': 'author',
+                                                          'email': 'a@example.com'}}
+    assert 'content' in backend.list_posts(1)[0][1]
+
+    streamed = dict(backend.stream_posts(fields=['title', 'content']))
+    assert streamed['post-0000'] == {'title': 'Post 0', 'content': 'Body of post 0.'}
+    assert all('content' not in data for _, data in backend.stream_posts(fields=['title']))
+
+
+def test_listing_filters_and_cursor(backend):
+    drafts = make_posts(backend, 2, published=False)
+    backend.update_post(drafts[0], {'categories': ['news']})
+    assert [post_id for post_id, _ in backend.list_posts(10, published_only=True)] == []
+    assert [post_id for post_id, _ in backend.list_posts(10, category_id='news')] == [drafts[0]]
+
+    first = backend.list_posts(1)
+    after = (first[0][1]['timestamp'], first[0][0])
+    assert [post_id for post_id, _ in backend.list_posts(10, after=after)] == [drafts[1]]
+
+
+def test_updates_return_the_previous_version(backend):
+    make_posts(backend, 1)
+    before = backend.update_post('post-0000', {'title': 'New'})
+    assert before['title'] == 'Post 0'
+    assert backend.get_post('post-0000')['title'] == 'New'
+    with pytest.raises(KeyError):
+        backend.update_post('missing', {'title': 'New'})
+
+
+def test_conditional_update(backend):
+    make_posts(backend, 1)
+    backend.update_post('post-0000', {'featured_image_job': 'a'})
+    assert backend.update_post_if('post-0000', {'featured_image': 'old'}, 'featured_image_job', 'b') is False
+    assert backend.update_post_if('post-0000', {'featured_image': 'new'}, 'featured_image_job', 'a') is True
+    assert backend.get_post('post-0000')['featured_image'] == 'new'
+
+
+def test_deleting_a_post_removes_its_category_rows(backend):
+    make_posts(backend, 1, categories=['news'])
+    assert backend.post_uses_category('news')
+    backend.delete_post('post-0000')
+    assert backend.get_post('post-0000') is None
+    assert not backend.post_uses_category('news')
+
+
+def test_batch_create_skips_existing_posts_and_rolls_back_on_taken_slugs(backend):
+    make_posts(backend, 1)
+    assert backend.create_posts([('post-0000', {'title': 'Again'}), ('fresh', {'title': 'Fresh'})]) == ['fresh']
+    assert backend.get_post('post-0000')['title'] == 'Post 0'
+
+    backend.claim_slug('taken', 'fresh')
+    with pytest.raises(sqlite3.IntegrityError):
+        backend.create_posts([('one', {'title': 'One'}), ('two', {'title': 'Two', 'slug': 'taken'})])
+    assert backend.get_post('one') is None
+
+
+def test_each_thread_gets_its_own_connection(backend):
+    make_posts(backend, 1)
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(backend.get_post('post-0000')['title']))
+    thread.start()
+    thread.join()
+    assert seen == ['Post 0']
+    assert backend._backend._connection().execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
@@ -0,0 +1,66 @@
+import stats
+
+from conftest import make_post, spy
+
+
+def post(published=True, categories=(), author='alice'):
+    return {'is_published': published, 'categories': list(categories), 'author': {'id': author}}
+
+
+def test_diff_of_a_new_post():
+    delta = stats.diff(None, post(categories=['news']))
+    assert (delta['total'], delta['published'], delta['drafts']) == (1, 1, 0)
+    assert delta['by_category'] == {'news': 1}
+    assert delta['by_author'] == {'alice': 1}
+
+
+def test_diff_of_an_edit_moves_counts():
+    delta = stats.diff(post(published=False, categories=['news']), post(categories=['misc']))
+    assert (delta['total'], delta['published'], delta['drafts']) == (0, 1, -1)
+    assert delta['by_category'] == {'news': -1, 'misc': 1}
+    assert delta['by_author'] == {'alice': 0}
+
+
+def test_apply_drops_groups_that_reach_zero():
+    totals = stats.apply({}, stats.diff(None, post(categories=['news'])))
+    stats.apply(totals, stats.diff(post(categories=['news']), None))
+    assert totals == {'total': 0, 'published': 0, 'drafts': 0, 'by_category': {}, 'by_author': {}}
+
+
+def test_post_writes_maintain_the_counters(backend):
+    draft = make_post(is_published=False, categories=['news'])
+    make_post(categories=['news', 'misc'])
+    counters = stats.get_stats()
+    assert (counters['total'], counters['published'], counters['drafts']) == (2, 1, 1)
+    assert counters['by_category'] == {'news': 2, 'misc': 1}
+
+    draft.update(is_published=True, categories=['misc'])
+    counters = stats.get_stats()
+    assert (counters['published'], counters['drafts']) == (2, 0)
+    assert counters['by_category'] == {'news': 1, 'misc': 2}
+
+    draft.delete()
+    counters = stats.get_stats()
+    assert (counters['total'], counters['published']) == (1, 1)
+    assert counters['by_category'] == {'news': 1, 'misc': 1}
+
+
+def test_recompute_repairs_drifted_counters(backend):
+    make_post(categories=['news'])
+    make_post(is_published=False)
+    expected = stats.get_stats()
+
+    backend.set_stats({'total': 40, 'published': 0, 'drafts': 3, 'by_category': {'gone': 7}, 'by_author': {}})
+    assert stats.recompute() == expected
+    assert stats.get_stats() == expected
+
+
+def test_dashboard_reads_the_counters_not_the_posts(backend, admin_client, monkeypatch):
+    make_post(categories=['news'])
+    make_post(is_published=False)
+    listed = spy(monkeypatch, backend, 'list_posts')
+    streamed = spy(monkeypatch, backend, 'stream_posts')
+    response = admin_client.get('/admin/dashboard')
+    assert response.status_code == 200
+    assert b'1 drafts' in response.data
+    assert listed == streamed == []
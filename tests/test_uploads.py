@@ -0,0 +1,117 @@
+import io
+import os
+import threading
+from datetime import datetime, timedelta
+
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+
+import media_storage
+import models
+import uploads
+from models import Post
+from uploads import UploadQueue
+
+from conftest import make_post, make_posts, wait_for_uploads
+
+
+def image_upload(name='cover.png', width=64, height=32):
+    out = io.BytesIO()
+    Image.new('RGB', (width, height), (20, 120, 200)).save(out, 'PNG')
+    out.seek(0)
+    return FileStorage(out, filename=name, content_type='image/png')
+
+
+def test_queue_retries_until_the_task_succeeds():
+    queue = UploadQueue(max_workers=1, max_attempts=3, backoff=0)
+    attempts, retries, results, cleaned = [], [], [], []
+
+    def task():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise OSError('flaky')
+        return 'done'
+
+    queue.submit(task, on_success=results.append, on_retry=lambda attempt, e: retries.append(attempt),
+                 cleanup=lambda: cleaned.append(True)).result()
+    assert (len(attempts), retries, results, cleaned) == (3, [1, 2], ['done'], [True])
+
+
+def test_queue_reports_failure_after_the_last_attempt():
+    queue = UploadQueue(max_workers=1, max_attempts=2, backoff=0)
+    failures, cleaned = [], []
+
+    def task():
+        raise OSError('down')
+
+    queue.submit(task, on_success=lambda result: None, on_failure=failures.append,
+                 cleanup=lambda: cleaned.append(True)).result()
+    assert [str(e) for e in failures] == ['down']
+    assert cleaned == [True]
+
+
+def test_featured_image_is_uploaded_after_the_post_is_saved(backend, tmp_path, monkeypatch):
+    spool_dir = tmp_path / 'spool'
+    spool_dir.mkdir()
+    monkeypatch.setenv('UPLOAD_SPOOL_DIR', str(spool_dir))
+    post = make_post(featured_image=image_upload())
+    assert post.featured_image_status == 'pending'
+
+    wait_for_uploads()
+    stored = Post.get(post.id)
+    assert stored.featured_image_status == 'ready'
+    assert stored.featured_image.startswith(f'/admin/media/posts/{post.id}/')
+    assert set(stored.featured_image_variants) == {'thumb', 'card', 'hero'}
+    # Images are never upscaled
+    assert stored.featured_image_variants['hero']['width'] == 64
+    assert media_storage.get_media_store().open(stored.featured_image.split('/admin/media/', 1)[1])
+    # The spooled copy is removed once the job is done
+    assert os.listdir(spool_dir) == []
+
+
+def test_failed_uploads_are_recorded(backend, monkeypatch):
+    def refuse(*args, **kwargs):
+        raise OSError('bucket unavailable')
+
+    monkeypatch.setattr(media_storage.LocalMediaStore, 'save', refuse)
+    post = make_post(featured_image=image_upload())
+    wait_for_uploads()
+    stored = Post.get(post.id)
+    assert stored.featured_image_status == 'failed'
+    assert stored.featured_image_error == 'bucket unavailable'
+
+
+def test_a_newer_image_wins_over_a_slow_upload(backend):
+    release = threading.Event()
+    # Hold the queue's only worker so the first upload waits
+    uploads.upload_queue.submit(release.wait)
+    post = make_post(featured_image=image_upload('first.png'))
+    post.update(featured_image=image_upload('second.png'))
+    release.set()
+
+    wait_for_uploads()
+    assert Post.get(post.id).featured_image.endswith('-second.png')
+
+
+def test_uploads_that_never_finish_are_reported_failed(backend):
+    ids = make_posts(backend, 2)
+    backend.update_post(ids[0], {'featured_image_status': 'pending',
+                                 'featured_image_queued_at': datetime.utcnow() - timedelta(hours=1)})
+    backend.update_post(ids[1], {'featured_image_status': 'pending', 'featured_image_queued_at': datetime.utcnow()})
+
+    stalled, running = Post.get(ids[0]), Post.get(ids[1])
+    assert stalled.featured_image_status == 'failed'
+    assert stalled.featured_image_error == models.STALLED_UPLOAD_ERROR
+    assert running.featured_image_status == 'pending'
+    assert running.featured_image_error is None
+
+
+def test_decompression_bombs_keep_the_original_only(backend, monkeypatch):
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 100)
+    assert media_storage.describe(image_upload().stream)['width'] is None
+
+    post = make_post(featured_image=image_upload())
+    wait_for_uploads()
+    stored = Post.get(post.id)
+    assert stored.featured_image_status == 'ready'
+    assert stored.featured_image_variants == {}
@@ -0,0 +1,59 @@
+from models import User
+
+from conftest import spy
+
+
+def test_users_are_cached(backend, admin, monkeypatch):
+    calls = spy(monkeypatch, backend, 'get_user')
+    assert User.get('admin').is_admin
+    assert User.get('admin').username == 'admin'
+    assert len(calls) == 1
+
+
+def test_uncached_get_reads_fresh(backend, admin):
+    User.get('admin')
+    backend.update_user('admin', {'is_admin': False})
+    assert User.get('admin').is_admin
+    assert not User.get('admin', use_cache=False).is_admin
+
+
+def test_make_admin_drops_the_cached_user(backend):
+    backend.put_user('writer', {'username': 'writer', 'email': 'w@example.com', 'is_admin': False})
+    assert not User.get('writer').is_admin
+    User.make_admin('writer')
+    assert User.get('writer').is_admin
+
+
+def test_logged_in_requests_use_the_cache(admin_client, backend, monkeypatch):
+    calls = spy(monkeypatch, backend, 'get_user')
+    for _ in range(3):
+        assert admin_client.get('/admin/posts').status_code == 200
+    assert len(calls) == 1
+
+
+def test_session_claims_skip_the_user_read(app, admin, backend, monkeypatch):
+    app.config['USER_SESSION_CLAIMS'] = True
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = admin.id
+        session['_fresh'] = True
+    client.get('/admin/posts')
+
+    User.invalidate(admin.id)
+    calls = spy(monkeypatch, backend, 'get_user')
+    assert client.get('/admin/posts').status_code == 200
+    assert calls == []
+
+
+def test_stale_session_claims_are_reloaded(app, admin, backend, monkeypatch):
+    app.config['USER_SESSION_CLAIMS'] = True
+    app.config['USER_SESSION_CLAIMS_MAX_AGE'] = 0
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = admin.id
+        session['_user_claims'] = dict(admin.to_claims(), issued_at=0)
+
+    User.invalidate(admin.id)
+    calls = spy(monkeypatch, backend, 'get_user')
+    client.get('/admin/posts')
+    assert len(calls) == 1
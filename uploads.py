@@ -0,0 +1,79 @@
+"""Background queue for uploads that should not hold a request worker.
+
+Uploads are spooled to a local temporary file during the request and then
+handed to a small thread pool, which retries failures with exponential
+backoff and reports the outcome through callbacks.
+"""
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+CHUNK_SIZE = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+def spool(file_storage):
+    """Copy an uploaded file to a temporary file and return its path.
+
+    The request's file object is closed once the response is sent, so the
+    background job needs its own copy.
+    """
+    spool_dir = os.getenv('UPLOAD_SPOOL_DIR') or None
+    file_storage.stream.seek(0)
+    with tempfile.NamedTemporaryFile(prefix='upload-', dir=spool_dir, delete=False) as f:
+        shutil.copyfileobj(file_storage.stream, f, CHUNK_SIZE)
+        return f.name
+
+
+class UploadQueue:
+    """Runs upload tasks on a bounded thread pool with retry and backoff."""
+
+    def __init__(self, max_workers=4, max_attempts=4, backoff=1.0):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload')
+
+    def submit(self, task, on_success=None, on_failure=None, on_retry=None, cleanup=None):
+        """Run ``task()`` in the background.
+
+        ``on_success(result)`` is called with the task's return value,
+        ``on_retry(attempt, error)`` after each failed attempt that will be
+        retried and ``on_failure(error)`` once all attempts are used up.
+        ``cleanup()`` always runs last.
+        """
+        return self._executor.submit(self._run, task, on_success, on_failure, on_retry, cleanup)
+
+    def _run(self, task, on_success, on_failure, on_retry, cleanup):
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    result = task()
+                except Exception as e:
+                    logger.warning("Upload attempt %s failed: %s", attempt, e)
+                    if attempt == self.max_attempts:
+                        if on_failure:
+                            on_failure(e)
+                        return
+                    if on_retry:
+                        on_retry(attempt, e)
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+                else:
+                    if on_success:
+                        on_success(result)
+                    return
+        except Exception:
+            logger.exception("Error finishing upload")
+        finally:
+            if cleanup:
+                cleanup()
+
+
+upload_queue = UploadQueue(
+    max_workers=int(os.getenv('UPLOAD_WORKERS', 4)),
+    max_attempts=int(os.getenv('UPLOAD_MAX_ATTEMPTS', 4)),
+    backoff=float(os.getenv('UPLOAD_BACKOFF', 1.0))
+)